@@ -0,0 +1,81 @@
+import os
+import json
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from app import delay_alert_key
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+MONTH_NAMES = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+
+def alert_key_from_details(employee_id, details):
+    """Reconstruir la clave de delay_alert_key desde el JSON guardado"""
+    try:
+        data = json.loads(details) if details else {}
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if data.get('subtype') != 'accumulated':
+        return None
+    month_name = data.get('month')
+    year = data.get('year')
+    if month_name not in MONTH_NAMES[1:] or not year:
+        return None
+    return delay_alert_key(employee_id, int(year), MONTH_NAMES.index(month_name))
+
+def add_alert_keys():
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        print("Agregando columna alert_key...")
+        cursor.execute("ALTER TABLE alerts ADD COLUMN IF NOT EXISTS alert_key VARCHAR(100)")
+
+        cursor.execute("""
+            SELECT id, user_id, employee_id, details
+            FROM alerts
+            WHERE alert_key IS NULL
+            ORDER BY created_at ASC, id ASC
+        """)
+        rows = cursor.fetchall()
+
+        # Claves ya asignadas (por si el script se corre dos veces)
+        cursor.execute("SELECT user_id, alert_key FROM alerts WHERE alert_key IS NOT NULL")
+        seen = {(r[0], r[1]) for r in cursor.fetchall()}
+
+        updates = []
+        duplicates = 0
+        for alert_id, user_id, employee_id, details in rows:
+            key = alert_key_from_details(employee_id, details)
+            if not key:
+                continue
+            if (user_id, key) in seen:
+                # Se conserva la alerta más antigua; las repetidas quedan sin clave
+                duplicates += 1
+                continue
+            seen.add((user_id, key))
+            updates.append((key, alert_id))
+
+        print(f"Asignando clave a {len(updates)} alertas ({duplicates} duplicadas sin clave)...")
+        psycopg2.extras.execute_batch(cursor, "UPDATE alerts SET alert_key = %s WHERE id = %s", updates)
+
+        print("Creando índice único idx_alerts_user_key...")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_user_key ON alerts(user_id, alert_key)")
+
+        conn.commit()
+        print("Migración de alert_key completada.")
+    except Exception as e:
+        print(f"Error en migración: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    add_alert_keys()
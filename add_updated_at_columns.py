@@ -0,0 +1,31 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+def add_updated_at_columns():
+    """Agregar updated_at a attendance e incidents (versión de datos de la caché de reportes)"""
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        for table in ['attendance', 'incidents']:
+            print(f"Agregando columna updated_at a {table}...")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+        conn.commit()
+        print("Columnas updated_at agregadas exitosamente.")
+    except Exception as e:
+        print(f"Error en migración: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    add_updated_at_columns()
@@ -0,0 +1,192 @@
+import os
+import threading
+import traceback
+
+
+ALERT_JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS alert_jobs (
+        id SERIAL PRIMARY KEY,
+        employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        latest_date DATE NOT NULL,
+        requested_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        locked_at TIMESTAMP,
+        last_error TEXT,
+        UNIQUE (employee_id, year, month)
+    );
+"""
+
+
+class AlertJobQueue:
+    """Cola de trabajos "evaluar colaborador/mes" respaldada por la tabla alert_jobs.
+
+    - enqueue() se llama dentro de la transacción que escribe la asistencia,
+      así el trabajo es durable aunque el proceso muera antes de procesarlo.
+    - Hay una sola fila por (employee_id, year, month): varias marcas del mismo
+      colaborador/mes se fusionan y se evalúan una vez.
+    - Hilos del proceso (start()) toman trabajos con FOR UPDATE SKIP LOCKED;
+      notify() los despierta y además revisan la tabla cada poll_interval
+      segundos.
+    - Un fallo reintenta con espera exponencial hasta max_attempts.
+    - drain() procesa todo lo pendiente en el hilo actual (scripts y pruebas).
+
+    handler(cursor, employee_id, latest_date) hace la evaluación y comparte la
+    transacción con el borrado del trabajo.
+    """
+
+    def __init__(self, get_connection, handler, threads=1, poll_interval=30,
+                 max_attempts=5, retry_delay=10, batch_size=20, lock_timeout=300):
+        self._get_connection = get_connection
+        self._handler = handler
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.batch_size = batch_size
+        self.lock_timeout = lock_timeout
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._workers = []
+        self._pid = None
+        self.processed = 0
+        self.failed = 0
+
+    # ---------- productor ----------
+
+    def enqueue(self, cursor, employee_id, day):
+        """Registrar (o refrescar) el trabajo del colaborador para el mes de day"""
+        cursor.execute("""
+            INSERT INTO alert_jobs (employee_id, year, month, latest_date)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (employee_id, year, month) DO UPDATE SET
+                latest_date = GREATEST(alert_jobs.latest_date, EXCLUDED.latest_date),
+                requested_at = CURRENT_TIMESTAMP,
+                attempts = 0,
+                next_attempt_at = CURRENT_TIMESTAMP,
+                last_error = NULL
+        """, (employee_id, day.year, day.month, day))
+
+    def notify(self):
+        """Despertar a los hilos (llamar después del commit)"""
+        self._wakeup.set()
+
+    # ---------- hilos ----------
+
+    def start(self):
+        """Levantar los hilos en este proceso; barato si ya están corriendo"""
+        if self.threads <= 0:
+            return
+        # Camino rápido sin lock: ya corren en este pid
+        if self._pid == os.getpid() and self._workers:
+            return
+        with self._lock:
+            # Los hilos no sobreviven a un fork: se crean de nuevo en el hijo
+            if self._pid == os.getpid() and any(w.is_alive() for w in self._workers):
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._workers = []
+            for i in range(self.threads):
+                worker = threading.Thread(target=self._run, name=f"alert-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.run_pending() and not self._stop.is_set():
+                    pass
+            except Exception as e:
+                print(f"Error en alert worker: {e}")
+                traceback.print_exc()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    # ---------- consumidor ----------
+
+    def _claim(self, conn, limit):
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE alert_jobs
+            SET locked_at = CURRENT_TIMESTAMP, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM alert_jobs
+                WHERE next_attempt_at <= CURRENT_TIMESTAMP
+                AND attempts < %s
+                AND (locked_at IS NULL OR locked_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second')
+                ORDER BY requested_at ASC
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, employee_id, latest_date, requested_at, attempts
+        """, (self.max_attempts, self.lock_timeout, limit))
+        jobs = [dict(row) for row in cursor.fetchall()]
+        conn.commit()
+        return jobs
+
+    def _process(self, conn, job):
+        cursor = conn.cursor()
+        try:
+            self._handler(cursor, job['employee_id'], job['latest_date'])
+            # Si llegó otra marca mientras se evaluaba, requested_at cambió:
+            # el trabajo se conserva (desbloqueado) para evaluarse otra vez.
+            cursor.execute(
+                "DELETE FROM alert_jobs WHERE id = %s AND requested_at = %s",
+                (job['id'], job['requested_at'])
+            )
+            if cursor.rowcount == 0:
+                cursor.execute("UPDATE alert_jobs SET locked_at = NULL WHERE id = %s", (job['id'],))
+            conn.commit()
+            self.processed += 1
+        except Exception as e:
+            conn.rollback()
+            self.failed += 1
+            print(f"Error evaluando retardos (job {job['id']}, intento {job['attempts']}): {e}")
+            cursor.execute("""
+                UPDATE alert_jobs
+                SET locked_at = NULL,
+                    last_error = %s,
+                    next_attempt_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE id = %s
+            """, (str(e), self.retry_delay * 2 ** (job['attempts'] - 1), job['id']))
+            conn.commit()
+
+    def run_pending(self, limit=None):
+        """Tomar y procesar un lote de trabajos vencidos; devuelve cuántos tomó"""
+        conn = self._get_connection()
+        try:
+            jobs = self._claim(conn, limit or self.batch_size)
+            for job in jobs:
+                self._process(conn, job)
+            return len(jobs)
+        finally:
+            conn.close()
+
+    def drain(self, max_batches=100):
+        """Procesar en este hilo todo lo pendiente (no espera reintentos futuros)"""
+        total = 0
+        for _ in range(max_batches):
+            taken = self.run_pending()
+            if not taken:
+                break
+            total += taken
+        return total
+
+    def stats(self):
+        return {
+            'processed': self.processed,
+            'failed': self.failed,
+            'threads': sum(1 for w in self._workers if w.is_alive()),
+        }
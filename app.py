@@ -1,11 +1,25 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, g, has_app_context
 import sqlite3
 import psycopg2
 import psycopg2.extras
 import os
+import tempfile
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import json
+import base64
+from db_pool import PooledConnection, pool_from_env
+from hierarchy_cache import HierarchyCache
+from alert_worker import AlertJobQueue
+from holidays_mx import HolidayCalendar
+from report_writer import ReportBook, ReportError, iter_query, send_report
+from report_cache import ReportCache
+from report_jobs import ReportJobQueue
+from employee_import import EmployeeImportError, import_employees
+from compliance import MonthCompliance, REPORT_GUIAS, REPORT_TABLEROS, compliance_status, empty_group_scores
+from incident_status import (
+    DEFAULT_INCIDENT_STATUS, INCIDENT_STATUSES, active_incident_clause, normalize_incident_status,
+)
 
 # Cargar variables de entorno
 load_dotenv()
@@ -23,18 +37,41 @@ print(f"🔍 Usando {'PostgreSQL' if USE_POSTGRES else 'SQLite'}")
 # Ruta de la base de datos SQLite (solo para local)
 DB_PATH = 'gestion_tutor.db'
 
-def get_db_connection():
-    """Crear conexión a PostgreSQL o SQLite según el entorno"""
+def _open_raw_connection():
+    """Abrir una conexión nueva a PostgreSQL o SQLite según el entorno"""
     if USE_POSTGRES:
         # Conexión a PostgreSQL (Railway)
-        conn = psycopg2.connect(DATABASE_URL, cursor_factory=psycopg2.extras.DictCursor)
-        return conn
+        return psycopg2.connect(DATABASE_URL, cursor_factory=psycopg2.extras.DictCursor)
     else:
-        # Conexión a SQLite (local)
-        conn = sqlite3.connect(DB_PATH)
+        # Conexión a SQLite (local). El pool la presta entre hilos.
+        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
         conn.row_factory = sqlite3.Row
         return conn
 
+# Pool compartido por todos los hilos del worker (se crea al primer uso)
+db_pool = pool_from_env(_open_raw_connection)
+
+def get_db_connection():
+    """Obtener conexión del pool.
+
+    Dentro de una petición se reutiliza una sola conexión guardada en g y se
+    devuelve al pool en el teardown (conn.close() no hace nada). Fuera de una
+    petición (scripts, hilos) conn.close() la regresa al pool.
+    """
+    if has_app_context():
+        conn = g.get('db_conn')
+        if conn is None:
+            conn = PooledConnection(db_pool, db_pool.getconn(), request_scoped=True)
+            g.db_conn = conn
+        return conn
+    return PooledConnection(db_pool, db_pool.getconn())
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.release()
+
 def dict_from_row(row):
     """Convertir fila de DB a diccionario"""
     if USE_POSTGRES:
@@ -42,39 +79,46 @@ def dict_from_row(row):
     else:
         return dict(row)
 
-def get_authorized_user_ids(user_id):
-    """Obtener IDs de usuarios autorizados según jerarquía"""
+def mexico_today():
+    """Fecha de hoy en hora de México (UTC-6)"""
+    return (datetime.utcnow() - timedelta(hours=6)).date()
+
+def month_bounds(year, month):
+    """Primer día del mes y primer día del mes siguiente (rango semiabierto)"""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+def month_range_clause(column, year, month):
+    """Filtro por mes que puede usar índices sobre la columna.
+
+    Devuelve (sql, params) con `column >= inicio AND column < inicio_mes_siguiente`
+    en lugar de EXTRACT(MONTH/YEAR FROM column), que obliga a un seq scan.
+    """
+    start, end = month_bounds(year, month)
+    return f"{column} >= %s AND {column} < %s", [start, end]
+
+def year_range_clause(column, year):
+    """Igual que month_range_clause pero para un año completo"""
+    return f"{column} >= %s AND {column} < %s", [date(year, 1, 1), date(year + 1, 1, 1)]
+
+def _load_user_hierarchy():
+    """Leer toda la jerarquía de usuarios en una sola consulta"""
     conn = get_db_connection()
     cursor = conn.cursor()
-    
     try:
-        # Obtener información del usuario
-        cursor.execute(
-            "SELECT id, role, supervisor_id FROM users WHERE id = %s",
-            (user_id,)
-        )
-        user = cursor.fetchone()
-        
-        if not user:
-            return []
-        
-        if user['role'] == 'admin':
-            # Admin ve a sus supervisados Y a sí mismo
-            cursor.execute(
-                "SELECT id FROM users WHERE supervisor_id = %s",
-                (user_id,)
-            )
-            supervised = cursor.fetchall()
-            supervised_ids = [row['id'] for row in supervised]
-            # Incluir al admin mismo en la lista
-            supervised_ids.append(user_id)
-            return supervised_ids
-        else:
-            # Usuario regular solo se ve a sí mismo
-            return [user_id]
+        cursor.execute("SELECT id, role, supervisor_id FROM users")
+        return [dict_from_row(row) for row in cursor.fetchall()]
     finally:
         conn.close()
 
+# La jerarquía casi no cambia: se cachea por proceso con TTL (HIERARCHY_CACHE_TTL)
+hierarchy_cache = HierarchyCache(_load_user_hierarchy, ttl=float(os.getenv('HIERARCHY_CACHE_TTL', 300)))
+
+def get_authorized_user_ids(user_id):
+    """Obtener IDs de usuarios autorizados según jerarquía"""
+    return hierarchy_cache.authorized_ids(user_id)
+
 # ==================== RUTAS ESTÁTICAS ====================
 
 @app.route('/')
@@ -176,6 +220,44 @@ def get_dashboard_daily_detail(status):
     finally:
         conn.close()
 
+def fetch_range_details(cursor, authorized_ids, statuses, today):
+    """Registros por rango (vacaciones, permisos, incapacidades) vigentes hoy, agrupados por status"""
+    placeholders = ','.join(['%s' for _ in authorized_ids])
+    status_placeholders = ','.join(['%s' for _ in statuses])
+    cursor.execute(f"""
+        SELECT DISTINCT a.status, e.id, e.full_name, b.name as branch_name, 
+               COALESCE(a.start_date, a.date) as start_date, 
+               COALESCE(a.end_date, a.date) as end_date, 
+               a.comment, a.permission_type
+        FROM attendance a
+        JOIN employees e ON a.employee_id = e.id
+        LEFT JOIN branches b ON e.branch_id = b.id
+        JOIN attendance_roster ar ON e.id = ar.employee_id
+        WHERE a.status IN ({status_placeholders}) 
+        AND (
+            (a.start_date <= %s AND a.end_date >= %s)
+            OR
+            (a.date = %s)
+        )
+        AND ar.added_by_user_id IN ({placeholders})
+        ORDER BY e.full_name ASC
+    """, list(statuses) + [today, today, today] + authorized_ids)
+    
+    data = {status: [] for status in statuses}
+    for row in cursor.fetchall():
+        item = dict_from_row(row)
+        status = item.pop('status')
+        data[status].append(format_range_item(item))
+    return data
+
+def format_range_item(item):
+    """Fechas de un registro por rango en ISO"""
+    if item.get('start_date'):
+        item['start_date'] = item['start_date'].isoformat() if hasattr(item['start_date'], 'isoformat') else str(item['start_date'])
+    if item.get('end_date'):
+        item['end_date'] = item['end_date'].isoformat() if hasattr(item['end_date'], 'isoformat') else str(item['end_date'])
+    return item
+
 def get_dashboard_range_detail(status):
     user_id = request.args.get('userId')
     if not user_id:
@@ -184,46 +266,12 @@ def get_dashboard_range_detail(status):
     authorized_ids = get_authorized_user_ids(int(user_id))
     if not authorized_ids:
         return jsonify({'success': True, 'data': []})
-        
-    placeholders = ','.join(['%s' for _ in authorized_ids])
-    
-    # Adjust for Mexico time (UTC-6)
-    from datetime import timedelta
-    today = (datetime.utcnow() - timedelta(hours=6)).date()
     
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute(f"""
-            SELECT DISTINCT e.id, e.full_name, b.name as branch_name, 
-                   COALESCE(a.start_date, a.date) as start_date, 
-                   COALESCE(a.end_date, a.date) as end_date, 
-                   a.comment, a.permission_type
-            FROM attendance a
-            JOIN employees e ON a.employee_id = e.id
-            LEFT JOIN branches b ON e.branch_id = b.id
-            JOIN attendance_roster ar ON e.id = ar.employee_id
-            WHERE a.status = %s 
-            AND (
-                (a.start_date <= %s AND a.end_date >= %s)
-                OR
-                (a.date = %s)
-            )
-            AND ar.added_by_user_id IN ({placeholders})
-            ORDER BY e.full_name ASC
-        """, [status, today, today, today] + authorized_ids)
-        
-        data = []
-        for row in cursor.fetchall():
-            item = dict_from_row(row)
-            # Format dates
-            if item.get('start_date'):
-                item['start_date'] = item['start_date'].isoformat() if hasattr(item['start_date'], 'isoformat') else str(item['start_date'])
-            if item.get('end_date'):
-                item['end_date'] = item['end_date'].isoformat() if hasattr(item['end_date'], 'isoformat') else str(item['end_date'])
-            data.append(item)
-            
-        return jsonify({'success': True, 'data': data})
+        data = fetch_range_details(cursor, authorized_ids, [status], mexico_today())
+        return jsonify({'success': True, 'data': data[status]})
     finally:
         conn.close()
 
@@ -247,8 +295,6 @@ def dashboard_stats():
             'incidencias_activas': 0
         }})
     
-    placeholders = ','.join(['%s' for _ in authorized_ids])
-    
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -257,17 +303,8 @@ def dashboard_stats():
         from datetime import timedelta
         today = (datetime.utcnow() - timedelta(hours=6)).date()
         
-        # Count attendances by status for today
-        cursor.execute(f"""
-            SELECT status, COUNT(*) as count
-            FROM attendance
-            WHERE date = %s
-            AND employee_id IN (
-                SELECT employee_id FROM attendance_roster
-                WHERE added_by_user_id IN ({placeholders})
-            )
-            GROUP BY status
-        """, [today] + authorized_ids)
+        # Count attendances by status for today (precomputed per tutor)
+        counts = fetch_daily_status_counts(cursor, authorized_ids, today)
         
         stats = {
             'asistencias': 0,
@@ -279,10 +316,7 @@ def dashboard_stats():
             'incidencias_activas': 0
         }
         
-        for row in cursor:
-            status = row['status']
-            count = row['count']
-            
+        for status, count in counts.items():
             if status == 'present':
                 stats['asistencias'] = count
             elif status == 'absent':
@@ -297,16 +331,7 @@ def dashboard_stats():
                 stats['retardos'] = count
         
         # Count active incidents (linked to employees in roster via reported_by)
-        cursor.execute(f"""
-            SELECT COUNT(DISTINCT i.id) as count
-            FROM incidents i
-            JOIN attendance_roster ar ON i.reported_by = ar.employee_id
-            WHERE ar.added_by_user_id IN ({placeholders})
-            AND i.status IN ('pending', 'in_progress', 'EN PROCESO')
-        """, authorized_ids)
-        result = cursor.fetchone()
-        if result:
-            stats['incidencias_activas'] = result['count']
+        stats['incidencias_activas'] = fetch_active_incidents(cursor, authorized_ids, count_only=True)
         
         return jsonify({'success': True, 'data': stats})
     finally:
@@ -332,6 +357,34 @@ def dashboard_sick_leaves():
     if request.method == 'OPTIONS': return '', 204
     return get_dashboard_range_detail('incapacity')
 
+def fetch_active_incidents(cursor, authorized_ids, count_only=False):
+    """Incidencias activas reportadas por colaboradores del roster autorizado.
+
+    Única consulta de "incidencias activas" (dashboard, resumen y stats); el
+    predicado de estatus coincide con el índice parcial idx_incidents_active.
+    Con count_only devuelve solo cuántas son.
+    """
+    scope_sql = f"""
+        {active_incident_clause('i')}
+        AND EXISTS (
+            SELECT 1 FROM attendance_roster ar
+            WHERE ar.employee_id = i.reported_by AND ar.added_by_user_id = ANY(%s)
+        )
+    """
+    if count_only:
+        cursor.execute(f"SELECT COUNT(*) AS count FROM incidents i WHERE {scope_sql}", (list(authorized_ids),))
+        return cursor.fetchone()['count']
+    
+    cursor.execute(f"""
+        SELECT {INCIDENT_COLUMNS}
+        FROM incidents i
+        JOIN employees e ON i.reported_by = e.id
+        LEFT JOIN branches b ON i.branch_id = b.id
+        WHERE {scope_sql}
+        ORDER BY i.created_at DESC, i.id DESC
+    """, (list(authorized_ids),))
+    return [serialize_incident(row) for row in cursor.fetchall()]
+
 @app.route('/api/dashboard/active-incidents', methods=['GET', 'OPTIONS'])
 def dashboard_active_incidents():
     if request.method == 'OPTIONS': return '', 204
@@ -343,35 +396,59 @@ def dashboard_active_incidents():
     authorized_ids = get_authorized_user_ids(int(user_id))
     if not authorized_ids:
         return jsonify({'success': True, 'data': []})
-        
-    placeholders = ','.join(['%s' for _ in authorized_ids])
     
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        cursor.execute(f"""
-            SELECT DISTINCT i.*, e.full_name as reported_by_name, b.name as branch_name
-            FROM incidents i
-            JOIN employees e ON i.reported_by = e.id
-            LEFT JOIN branches b ON i.branch_id = b.id
-            JOIN attendance_roster ar ON i.reported_by = ar.employee_id
-            WHERE i.status IN ('pending', 'in_progress', 'EN PROCESO')
-            AND ar.added_by_user_id IN ({placeholders})
-            ORDER BY i.created_at DESC
-        """, authorized_ids)
-        
-        data = []
-        for row in cursor.fetchall():
-            item = dict(row)
-            for k, v in item.items():
-                if hasattr(v, 'isoformat'):
-                    item[k] = v.isoformat()
-            data.append(item)
-            
-        return jsonify({'success': True, 'data': data})
+        return jsonify({'success': True, 'data': fetch_active_incidents(cursor, authorized_ids)})
     finally:
         conn.close()
 
+def fetch_birthdays(cursor, authorized_ids, today):
+    """Colaboradores activos del roster autorizado que cumplen años hoy"""
+    placeholders = ','.join(['%s' for _ in authorized_ids])
+    month = today.month
+    day = today.day
+    
+    if USE_POSTGRES:
+        # PostgreSQL: EXTRACT returns integer
+        query = f"""
+            SELECT DISTINCT e.id, e.full_name, e.birth_date, b.name as branch_name
+            FROM employees e
+            LEFT JOIN branches b ON e.branch_id = b.id
+            JOIN attendance_roster ar ON e.id = ar.employee_id
+            WHERE ar.added_by_user_id IN ({placeholders})
+            AND EXTRACT(MONTH FROM e.birth_date) = %s
+            AND EXTRACT(DAY FROM e.birth_date) = %s
+            AND e.status = 'active'
+            ORDER BY e.full_name ASC
+        """
+        params = authorized_ids + [month, day]
+    else:
+        # SQLite: strftime returns string with leading zero
+        query = f"""
+            SELECT DISTINCT e.id, e.full_name, e.birth_date, b.name as branch_name
+            FROM employees e
+            LEFT JOIN branches b ON e.branch_id = b.id
+            JOIN attendance_roster ar ON e.id = ar.employee_id
+            WHERE ar.added_by_user_id IN ({placeholders})
+            AND strftime('%%m', e.birth_date) = %s
+            AND strftime('%%d', e.birth_date) = %s
+            AND e.status = 'active'
+            ORDER BY e.full_name ASC
+        """
+        params = authorized_ids + [f"{month:02d}", f"{day:02d}"]
+        
+    cursor.execute(query, params)
+    
+    data = []
+    for row in cursor.fetchall():
+        item = dict_from_row(row)
+        if item.get('birth_date'):
+            item['birth_date'] = item['birth_date'].isoformat() if hasattr(item['birth_date'], 'isoformat') else str(item['birth_date'])
+        data.append(item)
+    return data
+
 @app.route('/api/dashboard/birthdays', methods=['GET', 'OPTIONS'])
 def dashboard_birthdays():
     if request.method == 'OPTIONS': return '', 204
@@ -383,63 +460,214 @@ def dashboard_birthdays():
     authorized_ids = get_authorized_user_ids(int(user_id))
     if not authorized_ids:
         return jsonify({'success': True, 'data': []})
-        
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        return jsonify({'success': True, 'data': fetch_birthdays(cursor, authorized_ids, mexico_today())})
+    except Exception as e:
+        print(f"Error getting birthdays: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/dashboard/summary', methods=['GET', 'OPTIONS'])
+def dashboard_summary():
+    """Todo el tablero en una sola respuesta: stats + listas del día.
+
+    Resuelve la jerarquía una vez y usa una sola conexión. Los conteos salen
+    de attendance_daily_counts (igual que /api/dashboard/stats); las listas de
+    attendance (faltas, retardos y registros por rango) salen de una sola
+    consulta UNION ALL. Incidencias y cumpleaños son otras tablas y usan las
+    mismas funciones que sus endpoints de detalle.
+    """
+    if request.method == 'OPTIONS': return '', 204
+    
+    user_id = request.args.get('userId')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'userId requerido'}), 400
+    
+    empty_stats = {
+        'asistencias': 0,
+        'faltas': 0,
+        'vacaciones': 0,
+        'permisos': 0,
+        'incapacidades': 0,
+        'retardos': 0,
+        'incidencias_activas': 0
+    }
+    
+    authorized_ids = get_authorized_user_ids(int(user_id))
+    if not authorized_ids:
+        return jsonify({'success': True, 'data': {
+            'stats': empty_stats,
+            'absences': [], 'vacations': [], 'permissions': [], 'sick_leaves': [],
+            'active_incidents': [], 'birthdays': [], 'delays': []
+        }})
+    
     placeholders = ','.join(['%s' for _ in authorized_ids])
+    today = mexico_today()
     
     conn = get_db_connection()
     cursor = conn.cursor()
     try:
-        # Adjust for Mexico time (UTC-6)
-        from datetime import timedelta
-        today = (datetime.utcnow() - timedelta(hours=6)).date()
-        month = today.month
-        day = today.day
+        # Conteos precalculados por tutor (los mismos que /api/dashboard/stats)
+        counts = fetch_daily_status_counts(cursor, authorized_ids, today)
+        stats = dict(empty_stats)
+        stat_keys = {
+            'present': 'asistencias',
+            'absent': 'faltas',
+            'vacation': 'vacaciones',
+            'permission': 'permisos',
+            'incapacity': 'incapacidades',
+            'delay': 'retardos'
+        }
+        for status, count in counts.items():
+            if status in stat_keys:
+                stats[stat_keys[status]] = count
         
-        if USE_POSTGRES:
-            # PostgreSQL: EXTRACT returns integer
-            query = f"""
-                SELECT DISTINCT e.id, e.full_name, e.birth_date, b.name as branch_name
-                FROM employees e
-                LEFT JOIN branches b ON e.branch_id = b.id
-                JOIN attendance_roster ar ON e.id = ar.employee_id
-                WHERE ar.added_by_user_id IN ({placeholders})
-                AND EXTRACT(MONTH FROM e.birth_date) = %s
-                AND EXTRACT(DAY FROM e.birth_date) = %s
-                AND e.status = 'active'
-                ORDER BY e.full_name ASC
-            """
-            params = authorized_ids + [month, day]
-        else:
-            # SQLite: strftime returns string with leading zero
-            query = f"""
-                SELECT DISTINCT e.id, e.full_name, e.birth_date, b.name as branch_name
-                FROM employees e
-                LEFT JOIN branches b ON e.branch_id = b.id
-                JOIN attendance_roster ar ON e.id = ar.employee_id
-                WHERE ar.added_by_user_id IN ({placeholders})
-                AND strftime('%%m', e.birth_date) = %s
-                AND strftime('%%d', e.birth_date) = %s
-                AND e.status = 'active'
-                ORDER BY e.full_name ASC
-            """
-            params = authorized_ids + [f"{month:02d}", f"{day:02d}"]
-            
-        cursor.execute(query, params)
+        # Listas del tablero en una sola consulta: faltas y retardos de hoy
+        # (kind 'day') + vacaciones, permisos e incapacidades vigentes (kind 'range')
+        cursor.execute(f"""
+            WITH scope AS (
+                SELECT DISTINCT employee_id FROM attendance_roster
+                WHERE added_by_user_id IN ({placeholders})
+            )
+            SELECT 'day' AS kind, a.status, e.id, e.full_name, b.name as branch_name,
+                   a.comment, a.arrival_time, NULL::date AS start_date, NULL::date AS end_date,
+                   NULL AS permission_type
+            FROM attendance a
+            JOIN scope s ON s.employee_id = a.employee_id
+            JOIN employees e ON a.employee_id = e.id
+            LEFT JOIN branches b ON e.branch_id = b.id
+            WHERE a.date = %s
+            AND a.status IN ('absent', 'delay')
+            UNION ALL
+            SELECT DISTINCT 'range' AS kind, a.status, e.id, e.full_name, b.name as branch_name,
+                   a.comment, NULL AS arrival_time,
+                   COALESCE(a.start_date, a.date) as start_date,
+                   COALESCE(a.end_date, a.date) as end_date,
+                   a.permission_type
+            FROM attendance a
+            JOIN scope s ON s.employee_id = a.employee_id
+            JOIN employees e ON a.employee_id = e.id
+            LEFT JOIN branches b ON e.branch_id = b.id
+            WHERE a.status IN ('vacation', 'permission', 'incapacity')
+            AND (
+                (a.start_date <= %s AND a.end_date >= %s)
+                OR
+                (a.date = %s)
+            )
+            ORDER BY full_name ASC
+        """, authorized_ids + [today, today, today, today])
         
-        data = []
+        absences = []
+        delays = []
+        ranges = {'vacation': [], 'permission': [], 'incapacity': []}
         for row in cursor.fetchall():
-            item = dict_from_row(row)
-            if item.get('birth_date'):
-                item['birth_date'] = item['birth_date'].isoformat() if hasattr(item['birth_date'], 'isoformat') else str(item['birth_date'])
-            data.append(item)
-            
-        return jsonify({'success': True, 'data': data})
+            if row['kind'] == 'range':
+                ranges[row['status']].append(format_range_item({
+                    'id': row['id'],
+                    'full_name': row['full_name'],
+                    'branch_name': row['branch_name'],
+                    'start_date': row['start_date'],
+                    'end_date': row['end_date'],
+                    'comment': row['comment'],
+                    'permission_type': row['permission_type']
+                }))
+            elif row['status'] == 'absent':
+                absences.append({
+                    'id': row['id'],
+                    'full_name': row['full_name'],
+                    'branch_name': row['branch_name'],
+                    'comment': row['comment']
+                })
+            else:
+                delays.append({
+                    'full_name': row['full_name'],
+                    'branch_name': row['branch_name'],
+                    'arrival_time': row['arrival_time'],
+                    'comment': row['comment']
+                })
+        
+        active_incidents = fetch_active_incidents(cursor, authorized_ids)
+        stats['incidencias_activas'] = len(active_incidents)
+        
+        return jsonify({'success': True, 'data': {
+            'stats': stats,
+            'absences': absences,
+            'vacations': ranges['vacation'],
+            'permissions': ranges['permission'],
+            'sick_leaves': ranges['incapacity'],
+            'active_incidents': active_incidents,
+            'birthdays': fetch_birthdays(cursor, authorized_ids, today),
+            'delays': delays
+        }})
     except Exception as e:
-        print(f"Error getting birthdays: {e}")
+        print(f"Error getting dashboard summary: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
     finally:
         conn.close()
 
+INCIDENT_LIST_PARAMS = ('status', 'type', 'branch_id', 'from', 'to', 'limit', 'cursor')
+INCIDENT_PAGE_SIZE = 50
+INCIDENT_PAGE_MAX = 200
+
+# Columnas de GET /api/incidents (sin i.*: solo lo que pinta la tabla)
+INCIDENT_COLUMNS = """
+    i.id, i.branch_id, i.reported_by, i.type, i.status, i.description,
+    i.start_date, i.end_date, i.created_at, i.updated_at,
+    e.full_name as reported_by_name, b.name as branch_name
+"""
+
+def incident_list_filters(args):
+    """WHERE de GET /api/incidents para status, type, branch_id y from/to (fechas de created_at, inclusivas)"""
+    clauses, params = [], []
+    status = args.get('status')
+    if status:
+        clauses.append("i.status = %s")
+        params.append(normalize_incident_status(status))
+    incident_type = args.get('type')
+    if incident_type:
+        clauses.append("i.type = %s")
+        params.append(incident_type)
+    branch_id = args.get('branch_id')
+    if branch_id:
+        try:
+            params.append(int(branch_id))
+        except ValueError:
+            raise ValueError('branch_id debe ser numérico')
+        clauses.append("i.branch_id = %s")
+    for name, op, offset in (('from', '>=', 0), ('to', '<', 1)):
+        value = args.get(name)
+        if value:
+            try:
+                day = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                raise ValueError(f'{name} debe tener formato YYYY-MM-DD')
+            clauses.append(f"i.created_at {op} %s")
+            params.append(day + timedelta(days=offset))
+    return clauses, params
+
+def encode_incident_cursor(created_at, incident_id):
+    """Cursor opaco de la última fila de una página (orden created_at DESC, id DESC)"""
+    raw = json.dumps([created_at.isoformat(), incident_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_incident_cursor(value):
+    try:
+        created_at, incident_id = json.loads(base64.urlsafe_b64decode(value.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(incident_id)
+    except Exception:
+        raise ValueError('cursor inválido')
+
+def serialize_incident(row):
+    item = dict(row)
+    for k, v in item.items():
+        if hasattr(v, 'isoformat'):
+            item[k] = v.isoformat()
+    return item
+
 @app.route('/api/incidents', methods=['GET', 'POST', 'OPTIONS'])
 def incidents_list():
     if request.method == 'OPTIONS': 
@@ -456,28 +684,55 @@ def incidents_list():
             authorized_ids = get_authorized_user_ids(int(user_id))
             if not authorized_ids:
                 return jsonify({'success': True, 'data': []})
-                
-            placeholders = ','.join(['%s' for _ in authorized_ids])
             
-            # Filter incidents by supervised employees (via roster)
+            # Sin parámetros: historial completo (compatibilidad)
+            paged = any(request.args.get(name) not in (None, '') for name in INCIDENT_LIST_PARAMS)
+            try:
+                clauses, params = incident_list_filters(request.args)
+                limit = min(max(int(request.args.get('limit') or INCIDENT_PAGE_SIZE), 1), INCIDENT_PAGE_MAX)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            
+            page_sql = ''
+            if paged:
+                after = request.args.get('cursor')
+                if after:
+                    try:
+                        clauses.append("(i.created_at, i.id) < (%s, %s)")
+                        params += list(decode_incident_cursor(after))
+                    except ValueError as e:
+                        return jsonify({'success': False, 'message': str(e)}), 400
+                # Una fila de más para saber si hay otra página
+                page_sql = "LIMIT %s"
+                params.append(limit + 1)
+            
+            # Incidencias de colaboradores del roster autorizado. EXISTS en lugar
+            # de JOIN: no duplica filas y deja recorrer idx_incidents_created_id
+            # en orden hasta juntar la página
             cursor.execute(f"""
-                SELECT i.*, e.full_name as reported_by_name, b.name as branch_name 
+                SELECT {INCIDENT_COLUMNS}
                 FROM incidents i
                 JOIN employees e ON i.reported_by = e.id
                 LEFT JOIN branches b ON i.branch_id = b.id
-                JOIN attendance_roster ar ON i.reported_by = ar.employee_id
-                WHERE ar.added_by_user_id IN ({placeholders})
-                ORDER BY i.created_at DESC
-            """, authorized_ids)
-            
-            data = []
-            for row in cursor.fetchall():
-                item = dict(row)
-                for k, v in item.items():
-                    if hasattr(v, 'isoformat'):
-                        item[k] = v.isoformat()
-                data.append(item)
-            return jsonify({'success': True, 'data': data})
+                WHERE EXISTS (
+                    SELECT 1 FROM attendance_roster ar
+                    WHERE ar.employee_id = i.reported_by AND ar.added_by_user_id = ANY(%s)
+                )
+                {''.join(' AND ' + clause for clause in clauses)}
+                ORDER BY i.created_at DESC, i.id DESC
+                {page_sql}
+            """, [list(authorized_ids)] + params)
+            rows = cursor.fetchall()
+            
+            next_cursor = None
+            if paged and len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_incident_cursor(rows[-1]['created_at'], rows[-1]['id'])
+            
+            data = [serialize_incident(row) for row in rows]
+            if not paged:
+                return jsonify({'success': True, 'data': data})
+            return jsonify({'success': True, 'data': data, 'next_cursor': next_cursor})
         
         elif request.method == 'POST':
             data = request.json
@@ -487,6 +742,10 @@ def incidents_list():
             end_date = data.get('end_date') or None
             branch_id = data.get('branch_id') or None
             reported_by = data.get('reported_by') or None
+            try:
+                status = normalize_incident_status(data.get('status') or DEFAULT_INCIDENT_STATUS)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
             
             cursor.execute("""
                 INSERT INTO incidents 
@@ -496,7 +755,7 @@ def incidents_list():
                 branch_id,
                 reported_by,
                 data.get('type'),
-                data.get('status', 'pending'),
+                status,
                 data.get('description'),
                 start_date,
                 end_date
@@ -532,8 +791,12 @@ def incident_detail(id):
             # Also handle 'branch_id' which may not be sent
             reported_by = data.get('reported_by') or data.get('employee_id') or None
             branch_id = data.get('branch_id') or None
+            try:
+                status = normalize_incident_status(data.get('status'))
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
             
-            print(f"Parsed values - branch_id: {branch_id}, reported_by: {reported_by}, type: {data.get('type')}, status: {data.get('status')}")
+            print(f"Parsed values - branch_id: {branch_id}, reported_by: {reported_by}, type: {data.get('type')}, status: {status}")
             
             cursor.execute("""
                 UPDATE incidents 
@@ -543,13 +806,14 @@ def incident_detail(id):
                     status = %s,
                     description = %s,
                     start_date = %s,
-                    end_date = %s
+                    end_date = %s,
+                    updated_at = CURRENT_TIMESTAMP
                 WHERE id = %s
             """, (
                 branch_id,
                 reported_by,
                 data.get('type'),
-                data.get('status'),
+                status,
                 data.get('description'),
                 start_date,
                 end_date,
@@ -673,6 +937,79 @@ def get_branches():
 
 # ==================== API: EMPLOYEES ====================
 
+EMPLOYEE_SEARCH_PARAMS = ('q', 'branch_id', 'status', 'limit', 'after')
+EMPLOYEE_PAGE_SIZE = 50
+EMPLOYEE_PAGE_MAX = 200
+
+def employee_search_filters(args):
+    """WHERE de GET /api/employees para q (nombre, sin acentos), branch_id y status.
+
+    La búsqueda usa immutable_unaccent(lower(full_name)), que cubre el índice
+    trigram idx_employees_name_trgm (ver create_employee_search_index.py).
+    """
+    clauses, params = ['TRUE'], []
+    q = (args.get('q') or '').strip()
+    if q:
+        pattern = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        clauses.append("immutable_unaccent(lower(e.full_name)) LIKE '%%' || immutable_unaccent(lower(%s)) || '%%'")
+        params.append(pattern)
+    branch_id = args.get('branch_id')
+    if branch_id:
+        if branch_id == 'none':
+            clauses.append("e.branch_id IS NULL")
+        else:
+            try:
+                params.append(int(branch_id))
+            except ValueError:
+                raise ValueError('branch_id debe ser numérico')
+            clauses.append("e.branch_id = %s")
+    status = args.get('status')
+    if status:
+        clauses.append("e.status = %s")
+        params.append(status)
+    return ' AND '.join(clauses), params
+
+def encode_employee_cursor(full_name, employee_id):
+    """Cursor opaco de la última fila de una página (orden full_name, id)"""
+    raw = json.dumps([full_name, employee_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_employee_cursor(value):
+    try:
+        full_name, employee_id = json.loads(base64.urlsafe_b64decode(value.encode('ascii')))
+        return str(full_name), int(employee_id)
+    except Exception:
+        raise ValueError('cursor inválido')
+
+# Días de vacaciones por años de servicio cumplidos (LFT art. 76): hasta N años -> días
+VACATION_TIERS = [(1, 15), (2, 15), (3, 16), (4, 18), (5, 20), (10, 22),
+                  (15, 24), (20, 26), (25, 28), (30, 30), (35, 32)]
+
+def vacation_entitlement(years):
+    """Días de vacaciones que corresponden a years años de servicio"""
+    if years <= 0:
+        return 0
+    for max_years, days in VACATION_TIERS:
+        if years <= max_years:
+            return days
+    return VACATION_TIERS[-1][1]
+
+def years_of_service(hire_date, today):
+    """Años cumplidos desde hire_date (0 sin fecha de ingreso)"""
+    if not hire_date:
+        return 0
+    if isinstance(hire_date, str):
+        hire_date = datetime.strptime(hire_date, '%Y-%m-%d').date()
+    return max(0, today.year - hire_date.year - ((today.month, today.day) < (hire_date.month, hire_date.day)))
+
+def service_year_sql(day):
+    """Expresión SQL con los años cumplidos de e.hire_date al día day (año de servicio).
+
+    El saldo se reinicia en cada aniversario; sin fecha de ingreso todo cae en el año 0.
+    """
+    return (f"CASE WHEN e.hire_date IS NULL OR {day} < e.hire_date THEN 0 "
+            f"ELSE date_part('year', age({day}, e.hire_date))::int END")
+
 @app.route('/api/employees', methods=['GET', 'POST', 'OPTIONS'])
 def employees():
     if request.method == 'OPTIONS':
@@ -685,60 +1022,53 @@ def employees():
         if request.method == 'GET':
             
             today = datetime.now().date()
-            current_year = today.year
-            
-            # 1. Get vacation days taken per employee for current year (excluding weekends)
-            cursor.execute("""
-                SELECT employee_id, COUNT(*) as count 
-                FROM attendance 
-                WHERE status = 'vacation' 
-                AND EXTRACT(YEAR FROM date) = %s
-                AND EXTRACT(DOW FROM date) NOT IN (0, 6)
-                GROUP BY employee_id
-            """, (current_year,))
             
-            vacations_taken_map = {row['employee_id']: row['count'] for row in cursor.fetchall()}
-
-            # 2. Get Employees
-            cursor.execute("""
-                SELECT e.id, e.full_name, e.branch_id, e.hire_date, e.birth_date, b.name as branch_name, e.status
+            # Sin parámetros: lista completa (selects de roster, incidencias, etc.)
+            paged = any(request.args.get(name) not in (None, '') for name in EMPLOYEE_SEARCH_PARAMS)
+            try:
+                where_sql, where_params = employee_search_filters(request.args)
+            except ValueError as e:
+                return jsonify({'success': False, 'message': str(e)}), 400
+            try:
+                limit = min(max(int(request.args.get('limit') or EMPLOYEE_PAGE_SIZE), 1), EMPLOYEE_PAGE_MAX)
+            except ValueError:
+                return jsonify({'success': False, 'message': 'limit debe ser numérico'}), 400
+            
+            page_sql, page_params = '', []
+            if paged:
+                after = request.args.get('after')
+                if after:
+                    try:
+                        after_name, after_id = decode_employee_cursor(after)
+                    except ValueError:
+                        return jsonify({'success': False, 'message': 'after inválido'}), 400
+                    where_sql += " AND (e.full_name, e.id) > (%s, %s)"
+                    where_params += [after_name, after_id]
+                # Una fila de más para saber si hay otra página
+                page_sql, page_params = "LIMIT %s", [limit + 1]
+            
+            # Días tomados en el año de servicio en curso (vacation_ledger), solo de la página
+            cursor.execute(f"""
+                SELECT e.id, e.full_name, e.branch_id, e.hire_date, e.birth_date, b.name as branch_name, e.status,
+                       COALESCE(vl.days_taken, 0) AS vacation_days_taken
                 FROM employees e
                 LEFT JOIN branches b ON e.branch_id = b.id
-                ORDER BY e.full_name ASC
-            """)
+                LEFT JOIN vacation_ledger vl ON vl.employee_id = e.id
+                    AND vl.service_year = {service_year_sql('%s::date')}
+                WHERE {where_sql}
+                ORDER BY e.full_name ASC, e.id ASC
+                {page_sql}
+            """, [today, today] + where_params + page_params)
+            rows = cursor.fetchall()
+            
+            next_after = None
+            if paged and len(rows) > limit:
+                rows = rows[:limit]
+                next_after = encode_employee_cursor(rows[-1]['full_name'], rows[-1]['id'])
 
             employees = []
-            for row in cursor.fetchall():
-                # Calculate years of service
-                hire_date_obj = row['hire_date']
-                years_of_service = 0
-                if hire_date_obj:
-                    # Calculate difference in years
-                    # Ensure hire_date_obj is date object
-                    if isinstance(hire_date_obj, str):
-                         hire_date_obj = datetime.strptime(hire_date_obj, '%Y-%m-%d').date()
-                    
-                    years_of_service = today.year - hire_date_obj.year - ((today.month, today.day) < (hire_date_obj.month, hire_date_obj.day))
-                
-                # Helper to calculate vacation entitlement
-                def get_vacation_days(years):
-                    if years <= 0: return 0
-                    if years == 1: return 15
-                    if years == 2: return 15
-                    if years == 3: return 16
-                    if years == 4: return 18
-                    if years == 5: return 20
-                    if years <= 10: return 22
-                    if years <= 15: return 24
-                    if years <= 20: return 26
-                    if years <= 25: return 28
-                    if years <= 30: return 30
-                    if years <= 35: return 32
-                    return 32 # Max 32 for > 35? or table ends.
-                
-                entitlement = get_vacation_days(years_of_service)
-                taken = vacations_taken_map.get(row['id'], 0)
-                pending = entitlement - taken
+            for row in rows:
+                entitlement = vacation_entitlement(years_of_service(row['hire_date'], today))
                 
                 employees.append({
                     'id': row['id'],
@@ -749,10 +1079,19 @@ def employees():
                     'branch_name': row['branch_name'],
                     'status': row['status'],
                     'vacation_days_per_year': entitlement,
-                    'pending_vacation_days': pending
+                    'pending_vacation_days': entitlement - row['vacation_days_taken']
                 })
             
-            return jsonify({'success': True, 'data': employees})
+            if not paged:
+                return jsonify({'success': True, 'data': employees})
+            
+            response = {'success': True, 'data': employees, 'next_after': next_after}
+            if not request.args.get('after'):
+                # Total de coincidencias solo en la primera página
+                base_sql, base_params = employee_search_filters(request.args)
+                cursor.execute(f"SELECT COUNT(*) AS total FROM employees e WHERE {base_sql}", base_params)
+                response['total'] = cursor.fetchone()['total']
+            return jsonify(response)
         
         elif request.method == 'POST':
             data = request.json
@@ -769,6 +1108,8 @@ def employees():
                 return jsonify({'success': True, 'message': 'Empleado creado'})
             except Exception as insert_error:
                 conn.rollback()
+                if 'idx_employees_name_lower' in str(insert_error):
+                    return jsonify({'success': False, 'message': 'Ya existe un colaborador con ese nombre'}), 409
                 # Si hay error de secuencia, intentar arreglarlo
                 if 'duplicate key' in str(insert_error) or 'unique constraint' in str(insert_error):
                     try:
@@ -795,6 +1136,50 @@ def employees():
     finally:
         conn.close()
 
+def run_employee_import(conn, fileobj, dry_run=False):
+    """Importar un XLSX de colaboradores en una transacción (dry_run la revierte)"""
+    cursor = conn.cursor()
+    try:
+        result = import_employees(cursor, fileobj)
+        # Las fechas de ingreso actualizadas cambian los años de servicio
+        rebuild_vacation_ledger(cursor, result.pop('updated_ids'))
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    result['dry_run'] = dry_run
+    return result
+
+@app.route('/api/employees/import', methods=['POST', 'OPTIONS'])
+def employees_import():
+    """Alta/actualización masiva desde un XLSX (campo file; dryRun=1 solo valida).
+
+    Columnas: NOMBRE, SUCURSAL, FECHA DE INGRESO, FECHA DE NACIMIENTO, ESTATUS.
+    Devuelve conteos y los errores por fila; las filas válidas se importan.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'success': False, 'message': 'Archivo requerido (campo file)'}), 400
+    dry_run = request.values.get('dryRun') in ('1', 'true')
+    
+    conn = get_db_connection()
+    try:
+        result = run_employee_import(conn, upload.stream, dry_run=dry_run)
+        return jsonify({'success': True, **result})
+    except EmployeeImportError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Error importando colaboradores: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
 @app.route('/api/employees/<int:id>', methods=['PUT', 'DELETE', 'OPTIONS'])
 def employee_detail(id):
     if request.method == 'OPTIONS':
@@ -805,6 +1190,11 @@ def employee_detail(id):
     
     try:
         if request.method == 'DELETE':
+            # El borrado en cascada elimina su asistencia y roster: descontarla antes
+            cursor.execute("SELECT added_by_user_id FROM attendance_roster WHERE employee_id = %s", (id,))
+            roster = cursor.fetchone()
+            if roster:
+                shift_employee_counts(cursor, id, roster['added_by_user_id'], -1)
             cursor.execute("DELETE FROM employees WHERE id = %s", (id,))
             conn.commit()
             return jsonify({'success': True, 'message': 'Empleado eliminado'})
@@ -822,6 +1212,8 @@ def employee_detail(id):
                     birth_date = %s
                 WHERE id = %s
             """, (data.get('full_name'), data.get('branch_id'), hire_date, birth_date, id))
+            # Los años de servicio dependen de hire_date
+            rebuild_vacation_ledger(cursor, [id])
             conn.commit()
             
             return jsonify({'success': True, 'message': 'Empleado actualizado'})
@@ -833,6 +1225,149 @@ def employee_detail(id):
 
 # ==================== API: ATTENDANCE ====================
 
+# attendance_daily_counts guarda cuántos registros hay por (tutor, día, status)
+# para que el dashboard no tenga que agrupar toda la tabla attendance.
+# Se actualiza en la misma transacción que cada escritura de asistencia;
+# rebuild_attendance_counts.py lo recalcula desde cero si se desincroniza.
+
+def adjust_daily_count(cursor, employee_id, day, status, delta):
+    """Sumar delta al contador del tutor que tiene al colaborador en su roster"""
+    if not status or status == 'none':
+        return
+    if status == 'vacation':
+        apply_vacation_deltas(cursor, [(employee_id, day, delta)])
+    cursor.execute("""
+        INSERT INTO attendance_daily_counts (tutor_id, date, status, count)
+        SELECT added_by_user_id, %s, %s, %s
+        FROM attendance_roster
+        WHERE employee_id = %s AND added_by_user_id IS NOT NULL
+        ON CONFLICT (tutor_id, date, status)
+        DO UPDATE SET count = attendance_daily_counts.count + EXCLUDED.count
+    """, (day, status, delta, employee_id))
+
+def record_attendance_change(cursor, employee_id, day, old_status, new_status):
+    """Reflejar en los contadores el cambio de status de un registro"""
+    if old_status == new_status:
+        return
+    adjust_daily_count(cursor, employee_id, day, old_status, -1)
+    adjust_daily_count(cursor, employee_id, day, new_status, 1)
+
+def shift_employee_counts(cursor, employee_id, tutor_id, sign):
+    """Sumar (sign=1) o restar (sign=-1) toda la asistencia de un colaborador al tutor"""
+    if not tutor_id:
+        return
+    cursor.execute("""
+        INSERT INTO attendance_daily_counts (tutor_id, date, status, count)
+        SELECT %s, date, status, %s * COUNT(*)
+        FROM attendance
+        WHERE employee_id = %s
+        GROUP BY date, status
+        ON CONFLICT (tutor_id, date, status)
+        DO UPDATE SET count = attendance_daily_counts.count + EXCLUDED.count
+    """, (tutor_id, sign, employee_id))
+
+def apply_daily_count_deltas(cursor, deltas):
+    """Aplicar en una sola sentencia {(employee_id, date, status): delta}"""
+    values = [(emp_id, day, status, delta) for (emp_id, day, status), delta in deltas.items()
+              if delta and status and status != 'none']
+    apply_vacation_deltas(cursor, [(emp_id, day, delta) for emp_id, day, status, delta in values
+                                   if status == 'vacation'])
+    if not values:
+        return
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO attendance_daily_counts (tutor_id, date, status, count)
+        SELECT ar.added_by_user_id, v.date::date, v.status, SUM(v.delta)
+        FROM (VALUES %s) AS v(employee_id, date, status, delta)
+        JOIN attendance_roster ar ON ar.employee_id = v.employee_id
+        WHERE ar.added_by_user_id IS NOT NULL
+        GROUP BY ar.added_by_user_id, v.date::date, v.status
+        ON CONFLICT (tutor_id, date, status)
+        DO UPDATE SET count = attendance_daily_counts.count + EXCLUDED.count
+    """, values, page_size=len(values))
+
+# vacation_ledger guarda los días de vacaciones (lunes a viernes) tomados por
+# colaborador y año de servicio; se actualiza junto con los contadores de
+# arriba y rebuild_vacation_ledger.py lo recalcula desde cero.
+
+def apply_vacation_deltas(cursor, values):
+    """Sumar [(employee_id, date, delta)] de vacaciones al año de servicio de cada fecha"""
+    if not values:
+        return
+    psycopg2.extras.execute_values(cursor, f"""
+        INSERT INTO vacation_ledger (employee_id, service_year, days_taken)
+        SELECT e.id, {service_year_sql('v.date::date')}, SUM(v.delta)
+        FROM (VALUES %s) AS v(employee_id, date, delta)
+        JOIN employees e ON e.id = v.employee_id
+        WHERE EXTRACT(ISODOW FROM v.date::date) < 6
+        GROUP BY 1, 2
+        ON CONFLICT (employee_id, service_year)
+        DO UPDATE SET
+            days_taken = vacation_ledger.days_taken + EXCLUDED.days_taken,
+            updated_at = CURRENT_TIMESTAMP
+    """, values, page_size=len(values))
+
+def rebuild_vacation_ledger(cursor, employee_ids):
+    """Recalcular el ledger de colaboradores (p. ej. si cambió su fecha de ingreso)"""
+    if not employee_ids:
+        return
+    employee_ids = list(employee_ids)
+    cursor.execute("DELETE FROM vacation_ledger WHERE employee_id = ANY(%s)", (employee_ids,))
+    cursor.execute(f"""
+        INSERT INTO vacation_ledger (employee_id, service_year, days_taken)
+        SELECT e.id, {service_year_sql('a.date')}, COUNT(*)
+        FROM attendance a
+        JOIN employees e ON e.id = a.employee_id
+        WHERE a.employee_id = ANY(%s) AND a.status = 'vacation'
+        AND EXTRACT(ISODOW FROM a.date) < 6
+        GROUP BY 1, 2
+    """, (employee_ids,))
+
+def fetch_daily_status_counts(cursor, authorized_ids, day):
+    """{status: count} del día para los tutores autorizados"""
+    placeholders = ','.join(['%s' for _ in authorized_ids])
+    cursor.execute(f"""
+        SELECT status, SUM(count) as count
+        FROM attendance_daily_counts
+        WHERE date = %s
+        AND tutor_id IN ({placeholders})
+        GROUP BY status
+    """, [day] + authorized_ids)
+    return {row['status']: int(row['count']) for row in cursor.fetchall()}
+
+def build_attendance_grid(employees, rows):
+    """Asignar cada registro de asistencia a las marcas de su empleado.
+
+    Usa un índice id -> marks en lugar de recorrer la lista de empleados por
+    cada registro (O(registros) en vez de O(registros x roster)).
+    """
+    marks_by_id = {emp['id']: emp['marks'] for emp in employees}
+    for row in rows:
+        marks = marks_by_id.get(row['employee_id'])
+        if marks is None:
+            continue
+        day = row['date']
+        start_date = row['start_date']
+        end_date = row['end_date']
+        marks[day.isoformat() if hasattr(day, 'isoformat') else str(day)] = {
+            'status': row['status'],
+            'comment': row['comment'],
+            'arrival_time': row['arrival_time'],
+            'permission_type': row['permission_type'],
+            'start_date': start_date.isoformat() if start_date and hasattr(start_date, 'isoformat') else start_date,
+            'end_date': end_date.isoformat() if end_date and hasattr(end_date, 'isoformat') else end_date
+        }
+    return employees
+
+def stream_json_list(items, chunk_size=100):
+    """Responder {'success': True, 'data': items} serializando por bloques"""
+    def generate():
+        yield '{"success": true, "data": ['
+        for start in range(0, len(items), chunk_size):
+            chunk = ','.join(json.dumps(item) for item in items[start:start + chunk_size])
+            yield (',' if start else '') + chunk
+        yield ']}'
+    return Response(generate(), mimetype='application/json')
+
 @app.route('/api/attendance', methods=['GET', 'POST', 'OPTIONS'])
 def attendance():
     if request.method == 'OPTIONS':
@@ -905,8 +1440,9 @@ def attendance():
                 try:
                     target_month = int(month) + 1
                     target_year = int(year)
-                    query += " AND EXTRACT(MONTH FROM a.date) = %s AND EXTRACT(YEAR FROM a.date) = %s"
-                    params.extend([target_month, target_year])
+                    month_sql, month_params = month_range_clause('a.date', target_year, target_month)
+                    query += " AND " + month_sql
+                    params.extend(month_params)
                 except ValueError:
                     pass # Ignorar si no son números válidos
             
@@ -915,27 +1451,9 @@ def attendance():
             cursor.execute(query, params)
             
             # Organizar las marcas por empleado y fecha
-            for row in cursor:
-                emp_id = row['employee_id']
-                date_str = row['date'].isoformat() if hasattr(row['date'], 'isoformat') else str(row['date'])
-                
-                # Encontrar el empleado correspondiente
-                for emp in employees:
-                    if emp['id'] == emp_id:
-                        emp['marks'][date_str] = {
-                            'status': row['status'],
-                            'comment': row['comment'],
-                            'arrival_time': row['arrival_time'],
-                            'permission_type': row['permission_type'],
-                            'start_date': row['start_date'].isoformat() if row['start_date'] and hasattr(row['start_date'], 'isoformat') else row['start_date'],
-                            'end_date': row['end_date'].isoformat() if row['end_date'] and hasattr(row['end_date'], 'isoformat') else row['end_date']
-                        }
-                        break
+            build_attendance_grid(employees, cursor)
             
-            return jsonify({
-                'success': True,
-                'data': employees
-            })
+            return stream_json_list(employees)
         
         elif request.method == 'POST':
             data = request.json
@@ -954,6 +1472,7 @@ def attendance():
                 data.get('start_date'),
                 data.get('end_date')
             ))
+            adjust_daily_count(cursor, data.get('employee_id'), data.get('date'), data.get('status'), 1)
             conn.commit()
             
             return jsonify({'success': True})
@@ -1022,7 +1541,12 @@ def add_to_roster():
             INSERT INTO attendance_roster (employee_id, added_by_user_id)
             VALUES (%s, %s)
             ON CONFLICT (employee_id) DO NOTHING
+            RETURNING added_by_user_id
         """, (employee_id, user_id))
+        inserted = cursor.fetchone()
+        if inserted:
+            # La asistencia previa del colaborador pasa a contar para este tutor
+            shift_employee_counts(cursor, employee_id, inserted['added_by_user_id'], 1)
         conn.commit()
         
         return jsonify({'success': True})
@@ -1041,7 +1565,11 @@ def delete_from_roster(employee_id):
         cursor.execute("""
             DELETE FROM attendance_roster 
             WHERE employee_id = %s
+            RETURNING added_by_user_id
         """, (employee_id,))
+        removed = cursor.fetchone()
+        if removed:
+            shift_employee_counts(cursor, employee_id, removed['added_by_user_id'], -1)
         conn.commit()
         
         return jsonify({'success': True, 'message': 'Colaborador eliminado del roster'})
@@ -1049,144 +1577,137 @@ def delete_from_roster(employee_id):
         conn.close()
 
 
+def delay_alert_key(employee_id, year, month):
+    """Clave de deduplicación de la alerta de retardos acumulados"""
+    return f"acc_delays:{employee_id}:{year}-{month:02d}"
+
 def check_accumulated_delays(cursor, employee_id, date_obj):
-    """Check for 3 accumulated delays in the current month and create alerts"""
-    try:
-        # Get start and end of the month for the given date
-        # date_obj might be a string or datetime.date
-        if isinstance(date_obj, str):
-            try:
-                date_obj = datetime.strptime(date_obj, '%Y-%m-%d').date()
-            except:
-                pass # Try to use it or fail gracefully
-                
-        if not hasattr(date_obj, 'year'):
-            return
+    """Check for 3 accumulated delays in the current month and create alerts.
+
+    Runs in the alert worker (see alert_worker.py); errors propagate so the
+    job is retried.
+    """
+    # Get start and end of the month for the given date
+    # date_obj might be a string or datetime.date
+    if isinstance(date_obj, str):
+        try:
+            date_obj = datetime.strptime(date_obj, '%Y-%m-%d').date()
+        except:
+            pass # Try to use it or fail gracefully
+            
+    if not hasattr(date_obj, 'year'):
+        return
 
-        month = date_obj.month
-        year = date_obj.year
-        
-        # Count delays in this month
-        cursor.execute("""
-            SELECT date, comment 
-            FROM attendance 
-            WHERE employee_id = %s 
-            AND status = 'delay'
-            AND EXTRACT(MONTH FROM date) = %s
-            AND EXTRACT(YEAR FROM date) = %s
-            ORDER BY date ASC
-        """, (employee_id, month, year))
-        
-        records = cursor.fetchall()
-        count = len(records)
-        
-        # Trigger on 3rd delay, 6th delay, etc? 
-        # User asked for "3 retardos". Let's trigger if count >= 3.
-        # To avoid spam, we check if alert already exists for this specific month/milestone.
+    month = date_obj.month
+    year = date_obj.year
+    
+    # Count delays in this month
+    month_sql, month_params = month_range_clause('date', year, month)
+    cursor.execute(f"""
+        SELECT date, comment 
+        FROM attendance 
+        WHERE employee_id = %s 
+        AND status = 'delay'
+        AND {month_sql}
+        ORDER BY date ASC
+    """, [employee_id] + month_params)
+    
+    records = cursor.fetchall()
+    count = len(records)
+    
+    # Trigger on 3rd delay, 6th delay, etc? 
+    # User asked for "3 retardos". Let's trigger if count >= 3.
+    # To avoid spam, we check if alert already exists for this specific month/milestone.
+    
+    if count < 3:
+        return
+
+    # Get employee info
+    cursor.execute("SELECT full_name FROM employees WHERE id = %s", (employee_id,))
+    emp_res = cursor.fetchone()
+    if not emp_res: return
+    emp_name = emp_res['full_name']
+    
+    # Get tutor and supervisor
+    cursor.execute("""
+        SELECT ar.added_by_user_id, u.supervisor_id
+        FROM attendance_roster ar
+        JOIN users u ON ar.added_by_user_id = u.id
+        WHERE ar.employee_id = %s
+    """, (employee_id,))
+    
+    roster_info = cursor.fetchone()
+    if not roster_info: return
         
-        if count < 3:
-            return
-
-        # Get employee info
-        cursor.execute("SELECT full_name FROM employees WHERE id = %s", (employee_id,))
-        emp_res = cursor.fetchone()
-        if not emp_res: return
-        emp_name = emp_res['full_name']
+    tutor_id = roster_info['added_by_user_id']
+    supervisor_id = roster_info['supervisor_id']
+    
+    # Prepare details
+    month_names = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
+    month_name = month_names[month]
+    
+    latest_date_str = date_obj.isoformat()
+    
+    alert_details = json.dumps({
+        'type': '3_delays', # Keep type for frontend compatibility or change to 'accumulated_delays'
+        'subtype': 'accumulated',
+        'employee_name': emp_name,
+        'month': month_name,
+        'year': year,
+        'count': count,
+        'latest_date': latest_date_str,
+        'delays': [
+            {
+                'date': r['date'].isoformat() if hasattr(r['date'], 'isoformat') else str(r['date']), 
+                'comment': r['comment']
+            } 
+            for r in records
+        ]
+    })
+    
+    alert_key = delay_alert_key(employee_id, year, month)
+    
+    def create_alert_for_user(uid):
+        if not uid: return
         
-        # Get tutor and supervisor
+        # One alert per recipient/employee/month: the unique index on
+        # (user_id, alert_key) makes repeated checks a no-op.
         cursor.execute("""
-            SELECT ar.added_by_user_id, u.supervisor_id
-            FROM attendance_roster ar
-            JOIN users u ON ar.added_by_user_id = u.id
-            WHERE ar.employee_id = %s
-        """, (employee_id,))
-        
-        roster_info = cursor.fetchone()
-        if not roster_info: return
-            
-        tutor_id = roster_info['added_by_user_id']
-        supervisor_id = roster_info['supervisor_id']
-        
-        # Prepare details
-        month_names = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio", "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
-        month_name = month_names[month]
-        
-        latest_date_str = date_obj.isoformat()
-        
-        alert_details = json.dumps({
-            'type': '3_delays', # Keep type for frontend compatibility or change to 'accumulated_delays'
-            'subtype': 'accumulated',
-            'employee_name': emp_name,
-            'month': month_name,
-            'year': year,
-            'count': count,
-            'latest_date': latest_date_str,
-            'delays': [
-                {
-                    'date': r['date'].isoformat() if hasattr(r['date'], 'isoformat') else str(r['date']), 
-                    'comment': r['comment']
-                } 
-                for r in records
-            ]
-        })
-        
-        unique_key = f"acc_delays_{year}_{month}_count_{count}" # Alert per count? Or just once per month?
-        # If we alert on 3, we don't want to alert on 3 again.
-        # If they delete one and add it back, maybe we do? 
-        # Let's alert if we hit 3. If they hit 4, do we alert? 
-        # User said "has 3 delays". Usually implies a threshold. 
-        # Let's target exactly count >= 3 and alert ONCE per month for "3 delays".
-        # If they reach 6, maybe another? Let's stick to >= 3 and trigger if not sent for this month.
-        
-        # Actually proper logic: Trigger whenever they hit a multiple of 3? 
-        # Or just "has 3". Let's assume threshold of 3.
-        
-        def create_alert_for_user(uid):
-            if not uid: return
-            
-            # Check if alert for this month already exists
-            # We use a unique string in 'details' to identify it essentially, or check logic.
-            # Let's look for alerts created this month for this employee with type 3_delays
-            # AND containing the specific month/year in details to be safe.
-            
-            searchTerm = f'"month": "{month_name}", "year": {year}'
-            
-            cursor.execute("""
-                SELECT id, details FROM alerts 
-                WHERE user_id = %s AND employee_id = %s AND details LIKE %s
-            """, (uid, employee_id, f'%{searchTerm}%'))
-            
-            existing = cursor.fetchall()
-            
-            # If we already have an alert for this month, do we send another?
-            # If the user asks for "3 consecutive", and we switched to "accumulated",
-            # usually you get one warning "This user reached 3 delays in Jan".
-            # You don't need one for 4, 5. 
-            # Unless they hit 6 (another 3). 
-            # Let's keep it simple: One alert per month when they hit 3+.
-            
-            if existing: 
-                return
-                
-            cursor.execute("""
-                INSERT INTO alerts (user_id, employee_id, details)
-                VALUES (%s, %s, %s)
-            """, (uid, employee_id, alert_details))
-
-        create_alert_for_user(tutor_id)
-        if supervisor_id:
-            create_alert_for_user(supervisor_id)
-            
-    except Exception as e:
-        print(f"Error checking accumulated delays: {e}")
-        import traceback
-        traceback.print_exc()
-
-@app.route('/api/attendance/mark', methods=['POST', 'OPTIONS'])
-
-def mark_attendance():
-    if request.method == 'OPTIONS':
-        return '', 204
+            INSERT INTO alerts (user_id, employee_id, details, alert_key)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (user_id, alert_key) DO NOTHING
+        """, (uid, employee_id, alert_details, alert_key))
+
+    create_alert_for_user(tutor_id)
+    if supervisor_id:
+        create_alert_for_user(supervisor_id)
+
+# La evaluación de retardos acumulados corre fuera del request (ALERT_WORKER_THREADS hilos)
+alert_queue = AlertJobQueue(
+    get_db_connection,
+    check_accumulated_delays,
+    threads=int(os.getenv('ALERT_WORKER_THREADS', 1)),
+    poll_interval=float(os.getenv('ALERT_WORKER_POLL', 30)),
+    max_attempts=int(os.getenv('ALERT_WORKER_MAX_ATTEMPTS', 5))
+)
+
+@app.before_request
+def start_alert_workers():
+    """Arrancar los hilos de alertas en el primer request de cada proceso.
+
+    No al importar app: los scripts que la importan no deben levantar hilos,
+    y con --preload los hilos del maestro no pasan a los workers. Así los
+    trabajos que quedaron en alert_jobs (reinicio, deploy, reintentos) se
+    procesan sin esperar a otra marca. En los demás requests start() regresa
+    de inmediato sin tomar el lock.
+    """
+    alert_queue.start()
+
+@app.route('/api/attendance/mark', methods=['POST', 'OPTIONS'])
+
+def mark_attendance():
+    if request.method == 'OPTIONS':
+        return '', 204
         
     data = request.json
     employee_id = data.get('employee_id')
@@ -1207,8 +1728,19 @@ def mark_attendance():
             cursor.execute("""
                 DELETE FROM attendance 
                 WHERE employee_id = %s AND date = %s
+                RETURNING status
             """, (employee_id, date))
+            removed = cursor.fetchone()
+            if removed:
+                adjust_daily_count(cursor, employee_id, date, removed['status'], -1)
         else:
+            cursor.execute("""
+                SELECT status FROM attendance
+                WHERE employee_id = %s AND date = %s
+                FOR UPDATE
+            """, (employee_id, date))
+            previous = cursor.fetchone()
+            
             # Insert or update attendance record with all fields
             cursor.execute("""
                 INSERT INTO attendance (employee_id, date, status, comment, arrival_time, permission_type, start_date, end_date)
@@ -1220,18 +1752,143 @@ def mark_attendance():
                     arrival_time = EXCLUDED.arrival_time,
                     permission_type = EXCLUDED.permission_type,
                     start_date = EXCLUDED.start_date,
-                    end_date = EXCLUDED.end_date
+                    end_date = EXCLUDED.end_date,
+                    updated_at = CURRENT_TIMESTAMP
             """, (employee_id, date, status, comment, arrival_time, permission_type, start_date, end_date))
+            record_attendance_change(cursor, employee_id, date, previous['status'] if previous else None, status)
             
-            # Check for accumulated delays if status is delay
+            # Queue the accumulated delays check if status is delay
             if status == 'delay':
-                check_accumulated_delays(cursor, employee_id, date)
+                alert_queue.enqueue(cursor, employee_id, datetime.strptime(date, '%Y-%m-%d').date())
         
         conn.commit()
+        if status == 'delay':
+            alert_queue.notify()
         return jsonify({'success': True})
     finally:
         conn.close()
 
+@app.route('/api/attendance/mark/bulk', methods=['POST', 'OPTIONS'])
+def mark_attendance_bulk():
+    """Marcar muchas celdas en una sola transacción.
+
+    Body: {"marks": [{employee_id, date, status, comment, arrival_time,
+    permission_type, start_date, end_date}, ...]}. status 'none' borra el
+    registro. Si una celda se repite gana la última. Los retardos se encolan
+    una sola vez por colaborador y mes.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    data = request.get_json(silent=True) or {}
+    marks = data.get('marks')
+    if not isinstance(marks, list) or not marks:
+        return jsonify({'success': False, 'message': 'marks requerido'}), 400
+    
+    results = []
+    pending = {}  # (employee_id, date) -> (index, mark)
+    for index, mark in enumerate(marks):
+        employee_id = mark.get('employee_id') if isinstance(mark, dict) else None
+        day = mark.get('date') if isinstance(mark, dict) else None
+        status = mark.get('status') if isinstance(mark, dict) else None
+        results.append({'index': index, 'employee_id': employee_id, 'date': day, 'success': False})
+        if not employee_id or not day or not status:
+            results[index]['message'] = 'employee_id, date y status son requeridos'
+            continue
+        try:
+            day = datetime.strptime(str(day), '%Y-%m-%d').date()
+            employee_id = int(employee_id)
+        except ValueError:
+            results[index]['message'] = 'Formato inválido (date debe ser YYYY-MM-DD)'
+            continue
+        previous = pending.get((employee_id, day))
+        if previous:
+            results[previous[0]]['message'] = 'Reemplazado por una marca posterior'
+        pending[(employee_id, day)] = (index, mark)
+    
+    if not pending:
+        return jsonify({'success': False, 'results': results}), 400
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        # Status actuales (y bloqueo de filas) para mantener los contadores
+        existing = psycopg2.extras.execute_values(cursor, """
+            SELECT a.employee_id, a.date, a.status
+            FROM attendance a
+            JOIN (VALUES %s) AS v(employee_id, date)
+              ON a.employee_id = v.employee_id AND a.date = v.date::date
+            FOR UPDATE OF a
+        """, list(pending.keys()), page_size=len(pending), fetch=True)
+        old_status = {(row['employee_id'], row['date']): row['status'] for row in existing}
+        
+        upserts = []
+        deletes = []
+        deltas = {}
+        delay_months = {}  # (employee_id, year, month) -> última fecha con retardo
+        for (employee_id, day), (index, mark) in pending.items():
+            status = mark.get('status')
+            before = old_status.get((employee_id, day))
+            if status != before:
+                deltas[(employee_id, day, before)] = deltas.get((employee_id, day, before), 0) - 1
+                deltas[(employee_id, day, status)] = deltas.get((employee_id, day, status), 0) + 1
+            if status == 'none':
+                deletes.append((employee_id, day))
+            else:
+                upserts.append((
+                    employee_id, day, status,
+                    mark.get('comment', ''),
+                    mark.get('arrival_time', ''),
+                    mark.get('permission_type', ''),
+                    mark.get('start_date') or None,
+                    mark.get('end_date') or None
+                ))
+                if status == 'delay':
+                    key = (employee_id, day.year, day.month)
+                    delay_months[key] = max(delay_months.get(key, day), day)
+        
+        if deletes:
+            psycopg2.extras.execute_values(cursor, """
+                DELETE FROM attendance a
+                USING (VALUES %s) AS v(employee_id, date)
+                WHERE a.employee_id = v.employee_id AND a.date = v.date::date
+            """, deletes, page_size=len(deletes))
+        
+        if upserts:
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO attendance (employee_id, date, status, comment, arrival_time, permission_type, start_date, end_date)
+                VALUES %s
+                ON CONFLICT (employee_id, date)
+                DO UPDATE SET 
+                    status = EXCLUDED.status,
+                    comment = EXCLUDED.comment,
+                    arrival_time = EXCLUDED.arrival_time,
+                    permission_type = EXCLUDED.permission_type,
+                    start_date = EXCLUDED.start_date,
+                    end_date = EXCLUDED.end_date,
+                    updated_at = CURRENT_TIMESTAMP
+            """, upserts, template="(%s, %s, %s, %s, %s, %s, %s::date, %s::date)", page_size=len(upserts))
+        
+        apply_daily_count_deltas(cursor, deltas)
+        
+        for (employee_id, _, _), last_day in delay_months.items():
+            alert_queue.enqueue(cursor, employee_id, last_day)
+        
+        conn.commit()
+        if delay_months:
+            alert_queue.notify()
+        
+        for index, _ in pending.values():
+            results[index]['success'] = True
+        return jsonify({'success': True, 'results': results})
+    except Exception as e:
+        conn.rollback()
+        print(f"Error en mark_attendance_bulk: {e}")
+        return jsonify({'success': False, 'message': str(e), 'results': results}), 500
+    finally:
+        conn.close()
+
 @app.route('/api/attendance/<int:id>', methods=['DELETE', 'OPTIONS'])
 def delete_attendance(id):
     if request.method == 'OPTIONS':
@@ -1241,7 +1898,10 @@ def delete_attendance(id):
     cursor = conn.cursor()
     
     try:
-        cursor.execute("DELETE FROM attendance WHERE id = %s", (id,))
+        cursor.execute("DELETE FROM attendance WHERE id = %s RETURNING employee_id, date, status", (id,))
+        removed = cursor.fetchone()
+        if removed:
+            adjust_daily_count(cursor, removed['employee_id'], removed['date'], removed['status'], -1)
         conn.commit()
         
         return jsonify({'success': True})
@@ -1270,12 +1930,12 @@ def reports_archived_months():
     try:
         cursor.execute(f"""
             SELECT 
-                r.month, r.year, COUNT(*) as record_count
-            FROM reports r
-            JOIN attendance_roster ar ON r.employee_id = ar.employee_id
+                ri.month, ri.year, COUNT(DISTINCT ri.employee_id) as record_count
+            FROM report_items ri
+            JOIN attendance_roster ar ON ri.employee_id = ar.employee_id
             WHERE ar.added_by_user_id IN ({placeholders})
-            GROUP BY r.year, r.month
-            ORDER BY r.year DESC, r.month DESC
+            GROUP BY ri.year, ri.month
+            ORDER BY ri.year DESC, ri.month DESC
         """, authorized_ids)
         
         data = []
@@ -1293,6 +1953,38 @@ def reports_archived_months():
     finally:
         conn.close()
 
+def report_items_from_data(report_data):
+    """(kind, item_key, status, comment) de un reporte en formato {faltantes: {día: {...}}, ...}"""
+    items = []
+    if not isinstance(report_data, dict):
+        return items
+    for kind, entries in report_data.items():
+        if not isinstance(entries, dict):
+            continue
+        for item_key, entry in entries.items():
+            if isinstance(entry, dict):
+                items.append((kind, str(item_key), entry.get('status'), entry.get('comment')))
+    return items
+
+def required_report_items_clause(business_days, alias='ri'):
+    """Condición SQL de los renglones que cuentan para cumplimiento: días hábiles, 2 guías, 4 tableros.
+
+    Devuelve (sql, params, total de renglones requeridos).
+    """
+    sql = f"""(
+        ({alias}.kind = 'faltantes' AND {alias}.item_key = ANY(%s))
+        OR ({alias}.kind = 'guias' AND {alias}.item_key = ANY(%s))
+        OR ({alias}.kind = 'tableros' AND {alias}.item_key = ANY(%s))
+    )"""
+    days = [str(b_day.day) for b_day in business_days]
+    return sql, [days, list(REPORT_GUIAS), list(REPORT_TABLEROS)], len(days) + len(REPORT_GUIAS) + len(REPORT_TABLEROS)
+
+def load_report_data(value):
+    """reports.data como dict (JSONB llega ya decodificado; TEXT anterior a la migración no)"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
 @app.route('/api/reports', methods=['GET', 'POST', 'OPTIONS'])
 def reports():
     if request.method == 'OPTIONS':
@@ -1327,7 +2019,7 @@ def reports():
                     e.full_name, 
                     e.branch_id, 
                     b.name as branch_name,
-                    r.data as report_data
+                    r.data::text as report_data
                 FROM attendance_roster ar
                 JOIN employees e ON ar.employee_id = e.id
                 LEFT JOIN branches b ON e.branch_id = b.id
@@ -1356,70 +2048,141 @@ def reports():
         elif request.method == 'POST':
             data = request.json
             
+            employee_id = data.get('employee_id')
+            month = data.get('month')
+            year = data.get('year')
+            
             # Check if this is a full data update or incremental update
             if 'data' in data:
-                # Full data update (old format)
-                report_data = json.dumps(data.get('data'))
-                employee_id = data.get('employee_id')
-                month = data.get('month')
-                year = data.get('year')
-            else:
-                # Incremental update (new format from frontend)
-                employee_id = data.get('employee_id')
-                month = data.get('month')
-                year = data.get('year')
-                update_type = data.get('type')  # 'faltantes', 'guias', 'tableros'
-                key = data.get('key')  # day number or quincena/semana number
-                status = data.get('status')
-                comment = data.get('comment', '')
-                
-                # Fetch existing report data
+                # Full data update (old format): reemplaza los renglones del mes
                 cursor.execute("""
-                    SELECT data FROM reports 
+                    DELETE FROM report_items
                     WHERE employee_id = %s AND month = %s AND year = %s
                 """, (employee_id, month, year))
+                items = [(employee_id, year, month, kind, item_key, status, comment)
+                         for kind, item_key, status, comment in report_items_from_data(data.get('data'))]
+                if items:
+                    psycopg2.extras.execute_values(cursor, """
+                        INSERT INTO report_items (employee_id, year, month, kind, item_key, status, comment)
+                        VALUES %s
+                    """, items)
+            else:
+                # Incremental update (new format from frontend): un solo renglón
+                update_type = data.get('type')  # 'faltantes', 'guias', 'tableros'
+                key = str(data.get('key'))  # day number or quincena/semana number
+                status = data.get('status')
                 
-                existing = cursor.fetchone()
-                if existing and existing['data'] and existing['data'].strip():
-                    try:
-                        report_obj = json.loads(existing['data'])
-                    except (json.JSONDecodeError, TypeError):
-                        report_obj = {'faltantes': {}, 'guias': {}, 'tableros': {}}
-                else:
-                    report_obj = {'faltantes': {}, 'guias': {}, 'tableros': {}}
-                
-                # Ensure report_obj is a dict
-                if not isinstance(report_obj, dict):
-                    report_obj = {'faltantes': {}, 'guias': {}, 'tableros': {}}
-                
-                # Update the specific field
-                if update_type not in report_obj:
-                    report_obj[update_type] = {}
+                if not update_type or data.get('key') is None:
+                    return jsonify({'success': False, 'message': 'type y key requeridos'}), 400
                 
                 if status == 'empty':
                     # Remove the entry
-                    if str(key) in report_obj[update_type]:
-                        del report_obj[update_type][str(key)]
+                    cursor.execute("""
+                        DELETE FROM report_items
+                        WHERE employee_id = %s AND year = %s AND month = %s AND kind = %s AND item_key = %s
+                    """, (employee_id, year, month, update_type, key))
                 else:
-                    report_obj[update_type][str(key)] = {
-                        'status': status,
-                        'comment': comment
-                    }
-                
-                report_data = json.dumps(report_obj)
-            
-            cursor.execute("""
-                INSERT INTO reports (employee_id, month, year, data)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (employee_id, month, year) 
-                DO UPDATE SET data = EXCLUDED.data
-            """, (employee_id, month, year, report_data))
+                    cursor.execute("""
+                        INSERT INTO report_items (employee_id, year, month, kind, item_key, status, comment)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (employee_id, year, month, kind, item_key)
+                        DO UPDATE SET
+                            status = EXCLUDED.status,
+                            comment = EXCLUDED.comment,
+                            updated_at = CURRENT_TIMESTAMP
+                    """, (employee_id, year, month, update_type, key, status, data.get('comment', '')))
             conn.commit()
             
             return jsonify({'success': True})
     finally:
         conn.close()
 
+@app.route('/api/reports/batch', methods=['POST', 'OPTIONS'])
+def reports_batch():
+    """Aplicar varios cambios de celdas en una transacción.
+
+    Body: {changes: [{employee_id, month, year, type, key, status, comment}, ...]}
+    en el orden en que se hicieron (si una celda se repite gana el último).
+    Devuelve los reportes resultantes de cada (employee_id, month, year) tocado.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+
+    changes = (request.json or {}).get('changes')
+    if not isinstance(changes, list) or not changes:
+        return jsonify({'success': False, 'message': 'changes requerido'}), 400
+
+    cells = {}
+    for idx, change in enumerate(changes):
+        if not isinstance(change, dict):
+            return jsonify({'success': False, 'message': f'Cambio {idx} inválido'}), 400
+        try:
+            employee_id = int(change.get('employee_id'))
+            month = int(change.get('month'))
+            year = int(change.get('year'))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': f'Cambio {idx}: employee_id, month y year requeridos'}), 400
+        if not change.get('type') or change.get('key') is None:
+            return jsonify({'success': False, 'message': f'Cambio {idx}: type y key requeridos'}), 400
+        cell = (employee_id, year, month, change['type'], str(change['key']))
+        # Reinsertar para que el orden refleje el último cambio
+        cells.pop(cell, None)
+        cells[cell] = (change.get('status'), change.get('comment') or '')
+
+    deletes = [cell for cell, (status, _) in cells.items() if status == 'empty']
+    upserts = [cell + value for cell, value in cells.items() if value[0] != 'empty']
+    touched = sorted({cell[:3] for cell in cells})
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        if deletes:
+            psycopg2.extras.execute_values(cursor, """
+                DELETE FROM report_items ri
+                USING (VALUES %s) AS d(employee_id, year, month, kind, item_key)
+                WHERE ri.employee_id = d.employee_id AND ri.year = d.year AND ri.month = d.month
+                AND ri.kind = d.kind AND ri.item_key = d.item_key
+            """, deletes)
+        if upserts:
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO report_items (employee_id, year, month, kind, item_key, status, comment)
+                VALUES %s
+                ON CONFLICT (employee_id, year, month, kind, item_key)
+                DO UPDATE SET
+                    status = EXCLUDED.status,
+                    comment = EXCLUDED.comment,
+                    updated_at = CURRENT_TIMESTAMP
+            """, upserts)
+
+        cursor.execute("""
+            SELECT employee_id, month, year, data FROM reports
+            WHERE (employee_id, year, month) IN (
+                SELECT * FROM unnest(%s::int[], %s::int[], %s::int[])
+            )
+        """, ([t[0] for t in touched], [t[1] for t in touched], [t[2] for t in touched]))
+        documents = {(r['employee_id'], r['year'], r['month']): load_report_data(r['data'])
+                     for r in cursor.fetchall()}
+        conn.commit()
+
+        return jsonify({
+            'success': True,
+            'applied': len(cells),
+            'reports': [{
+                'employee_id': employee_id,
+                'month': month,
+                'year': year,
+                # None: el reporte quedó vacío
+                'data': documents.get((employee_id, year, month))
+            } for employee_id, year, month in touched]
+        })
+    except Exception as e:
+        conn.rollback()
+        print(f"Error en /api/reports/batch: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
 @app.route('/api/reports/data', methods=['GET', 'OPTIONS'])
 def get_report_data():
     if request.method == 'OPTIONS':
@@ -1441,8 +2204,8 @@ def get_report_data():
         result = cursor.fetchone()
         
         if result and result['data']:
-            data = json.loads(result['data'])
-            return jsonify({'success': True, 'data': data})
+            # JSONB: psycopg2 ya lo entrega como dict
+            return jsonify({'success': True, 'data': load_report_data(result['data'])})
         else:
             return jsonify({'success': True, 'data': None})
     finally:
@@ -1515,423 +2278,278 @@ def mark_alert_read():
 
 # ==================== API: REPORTS ====================
 
+def _load_holiday_overrides(year):
+    """Feriados manuales (tabla holidays) de un año"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        year_sql, year_params = year_range_clause('date', year)
+        cursor.execute(f"SELECT date, name, is_holiday FROM holidays WHERE {year_sql}", year_params)
+        return [dict_from_row(row) for row in cursor.fetchall()]
+    except Exception:
+        # No dejar abortada la transacción de la petición
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# Feriados de ley calculados localmente + ajustes manuales; sin llamadas externas
+holiday_calendar = HolidayCalendar(_load_holiday_overrides, ttl=float(os.getenv('HOLIDAY_CACHE_TTL', 300)))
+
 def get_report_context(year, month):
     """Obtiene días hábiles y feriados para un mes/año dado"""
+    return holiday_calendar.business_days(year, month), holiday_calendar.holidays(year)
+
+# XLSX generados, en disco con LRU por tamaño (REPORT_CACHE_MAX_MB=0 la deshabilita)
+report_cache = ReportCache(
+    os.getenv('REPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'reportes_cache')),
+    max_bytes=int(float(os.getenv('REPORT_CACHE_MAX_MB', 200)) * 1024 * 1024)
+)
+
+def report_data_version(cursor, year, month):
+    """Token de versión de los datos que usan los reportes de un mes.
+
+    Conteo + último updated_at de attendance, report_items e incidents del mes,
+    huellas de roster, employees, users y branches, y los días hábiles.
+    Devuelve None si no se pudo calcular (p. ej. falta migrar updated_at).
+    """
+    start, end = month_bounds(year, month)
     try:
-        import urllib.request
-        import json
-        from datetime import date
-        import calendar
-
-        # Get holidays
-        url = f"https://date.nager.at/api/v3/PublicHolidays/{year}/MX"
-        req = urllib.request.Request(
-            url, 
-            headers={'User-Agent': 'Mozilla/5.0'}
-        )
-        holiday_dates = []
-        try:
-            with urllib.request.urlopen(req) as response:
-                data = json.loads(response.read().decode())
-                # Parse YYYY-MM-DD
-                for h in data:
-                    parts = h['date'].split('-')
-                    holiday_dates.append(date(int(parts[0]), int(parts[1]), int(parts[2])))
-        except:
-            pass # Si falla API, asumimos 0 feriados
-
-        num_days = calendar.monthrange(year, month)[1]
-        business_days = []
-        
-        for d in range(1, num_days + 1):
-            curr_date = date(year, month, d)
-            # 0=Monday, 5=Saturday, 6=Sunday
-            # Excluir fines de semana y feriados
-            if curr_date.weekday() < 5 and curr_date not in holiday_dates:
-                business_days.append(curr_date)
-                
-        return business_days, holiday_dates
+        cursor.execute("""
+            SELECT
+                (SELECT COUNT(*) || ':' || COALESCE(MAX(updated_at)::text, '')
+                 FROM attendance WHERE date >= %s AND date < %s) AS attendance,
+                (SELECT COUNT(*) || ':' || COALESCE(MAX(updated_at)::text, '')
+                 FROM report_items WHERE month = %s AND year = %s) AS reports,
+                (SELECT COUNT(*) || ':' || COALESCE(MAX(updated_at)::text, '')
+                 FROM incidents WHERE created_at >= %s AND created_at < %s) AS incidents,
+                (SELECT COUNT(*) || ':' || COALESCE(SUM(hashtext(employee_id || ':' || COALESCE(added_by_user_id, 0))), 0)
+                 FROM attendance_roster) AS roster,
+                (SELECT COUNT(*) || ':' || COALESCE(SUM(hashtext(id || ':' || full_name || ':' || COALESCE(branch_id, 0))), 0)
+                 FROM employees) AS employees,
+                (SELECT COUNT(*) || ':' || COALESCE(SUM(hashtext(id || ':' || username || ':' || role || ':' || COALESCE(supervisor_id, 0))), 0)
+                 FROM users) AS users,
+                (SELECT COUNT(*) || ':' || COALESCE(SUM(hashtext(id || ':' || name)), 0)
+                 FROM branches) AS branches
+        """, (start, end, month - 1, year, start, end))  # report_items.month es 0-11
+        version = dict_from_row(cursor.fetchone())
     except Exception as e:
-        print(f"Error ctx: {e}")
-        return [], []
+        print(f"No se pudo calcular la versión de datos de {month}/{year}: {e}")
+        cursor.connection.rollback()
+        return None
+    version['business_days'] = [d.isoformat() for d in holiday_calendar.business_days(year, month)]
+    return version
+
+def open_cached_report(cursor, report_type, year, month, scope, filters):
+    """(llave, archivo abierto o None); llave None si el reporte no se puede cachear"""
+    version = report_data_version(cursor, year, month)
+    if version is None:
+        return None, None
+    key = ReportCache.make_key(report_type, year, month, scope, filters, version)
+    return key, report_cache.open(key)
+
+def load_month_compliance(cursor, employee_ids, business_days, target_year, target_month):
+    """MonthCompliance de un mes: asistencia, renglones del reporte e incidencias
+    de todos los colaboradores con una consulta por tabla"""
+    matrix = MonthCompliance(employee_ids, business_days)
+    if not matrix.employee_ids:
+        return matrix
+    
+    month_sql, month_params = month_range_clause('date', target_year, target_month)
+    incident_month_sql, _ = month_range_clause('created_at', target_year, target_month)
+    
+    cursor.execute(f"""
+        SELECT employee_id, date, status FROM attendance
+        WHERE employee_id = ANY(%s) AND {month_sql}
+    """, [matrix.employee_ids] + month_params)
+    for r in cursor.fetchall():
+        matrix.set_attendance(r['employee_id'], r['date'], r['status'])
+    
+    # report_items.month es 0-11
+    required_sql, required_params, _ = required_report_items_clause(business_days)
+    cursor.execute(f"""
+        SELECT ri.employee_id, ri.kind, ri.item_key, ri.status
+        FROM report_items ri
+        WHERE ri.employee_id = ANY(%s) AND ri.year = %s AND ri.month = %s
+        AND {required_sql}
+    """, [matrix.employee_ids, target_year, target_month - 1] + required_params)
+    for r in cursor.fetchall():
+        matrix.set_item(r['employee_id'], r['kind'], r['item_key'], r['status'])
+    
+    cursor.execute(f"""
+        SELECT reported_by, COUNT(*) as count FROM incidents
+        WHERE reported_by = ANY(%s) AND {incident_month_sql}
+        GROUP BY reported_by
+    """, [matrix.employee_ids] + month_params)
+    for r in cursor.fetchall():
+        matrix.add_incidents(r['reported_by'], r['count'])
+    
+    return matrix
+
+def compute_tutor_report_rows(cursor, tutors, business_days, target_year, target_month):
+    """Métricas de cumplimiento de todos los tutores.
+
+    tutors: filas con id y username (en el orden del reporte). Devuelve una
+    lista de dicts con las mismas cifras que se escriben en el Excel.
+    """
+    if not tutors:
+        return []
+    
+    cursor.execute("""
+        SELECT employee_id, added_by_user_id FROM attendance_roster
+        WHERE added_by_user_id = ANY(%s)
+    """, ([t['id'] for t in tutors],))
+    tutor_of = {r['employee_id']: r['added_by_user_id'] for r in cursor.fetchall()}
+    
+    matrix = load_month_compliance(cursor, list(tutor_of), business_days, target_year, target_month)
+    _, by_group = matrix.score({'tutor': tutor_of})
+    
+    rows = []
+    for tutor in tutors:
+        scores = by_group['tutor'].get(tutor['id']) or empty_group_scores()
+        rows.append({
+            'tutor_id': tutor['id'],
+            'tutor_name': tutor['username'],
+            'num_collabs': scores['num_collabs'],
+            'filled_slots': scores['filled_slots'],
+            'incidents': scores['incidents'],
+            'complete_reports': scores['complete_reports'],
+            'attendance_score': scores['attendance_score'],
+            'report_score': scores['report_score'],
+            'cumplimiento': scores['cumplimiento']
+        })
+    return rows
+
+def build_tutor_report(conn, cursor, user_id, target_year, target_month, filters):
+    """Libro del reporte de cumplimiento por tutor"""
+    tutor_id = filters.get('tutorId')
+    business_days, holidays = get_report_context(target_year, target_month)
+    
+    if tutor_id and tutor_id != 'all':
+        cursor.execute("SELECT id, username FROM users WHERE id = %s AND supervisor_id = %s AND role = 'tutor_analista'", (tutor_id, user_id))
+    else:
+        cursor.execute("SELECT id, username FROM users WHERE supervisor_id = %s AND role = 'tutor_analista' ORDER BY username ASC", (user_id,))
+    
+    tutors = cursor.fetchall()
+    
+    book = ReportBook()
+    sheet = book.sheet(
+        f"Reporte Tutores {target_month}-{target_year}",
+        ['Tutor', 'Colaboradores', 'Asistencias (Slots)', 'Incidencias', 'Reportes Completos',
+         'Score Asistencia (50%)', 'Score Reportes (50%)', 'Cumplimiento %', 'Estado'],
+        "4F46E5",
+        widths=[25, 15, 18, 18, 18, 18, 18, 18, 15],
+        banner=f'REPORTE DE CUMPLIMIENTO POR TUTOR - {target_month}/{target_year}'
+    )
+    
+    for metrics in compute_tutor_report_rows(cursor, tutors, business_days, target_year, target_month):
+        cumplimiento = metrics['cumplimiento']
+        estado, ecolor = compliance_status(cumplimiento)
+        
+        sheet.append([metrics['tutor_name'], metrics['num_collabs'], metrics['filled_slots'],
+                      metrics['incidents'], metrics['complete_reports'],
+                      f"{metrics['attendance_score']:.1f}%", f"{metrics['report_score']:.1f}%",
+                      f"{cumplimiento:.2f}%", estado],
+                     styles={9: book.badge_style(ecolor)})
+    
+    return book
 
 @app.route('/api/reports/tutors', methods=['GET', 'OPTIONS'])
 def generate_tutor_report():
     """Generar reporte de resumen por tutor"""
     if request.method == 'OPTIONS':
         return '', 204
+    return report_download('tutors')
+
+def compute_collaborator_report_rows(cursor, collaborators, business_days, target_year, target_month):
+    """Métricas de cumplimiento por colaborador.
+
+    collaborators: filas con id, full_name y branch_name (en el orden del reporte).
+    """
+    if not collaborators:
+        return []
     
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from io import BytesIO
-        from flask import send_file
-        import json
-        
-        user_id = request.args.get('userId')
-        month = request.args.get('month') 
-        year = request.args.get('year')
-        tutor_id = request.args.get('tutorId')
-        
-        if not user_id or not month or not year:
-            return jsonify({'success': False, 'message': 'Parámetros requeridos: userId, month, year'}), 400
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT username, role FROM users WHERE id = %s", (user_id,))
-        user_data = cursor.fetchone()
-        
-        if not user_data or user_data['role'] != 'admin':
-            return jsonify({'success': False, 'message': 'No autorizado'}), 403
-        
-        allowed_users = ['helder mora', 'esthfania ramos']
-        if user_data['username'].lower() not in allowed_users:
-            return jsonify({'success': False, 'message': 'Solo Helder Mora y Esthfania Ramos pueden generar este reporte'}), 403
-        
-        target_month = int(month) + 1
-        target_year = int(year)
-        
-        business_days, holidays = get_report_context(target_year, target_month)
-        num_business_days = len(business_days)
-        
-        if tutor_id and tutor_id != 'all':
-            cursor.execute("SELECT id, username FROM users WHERE id = %s AND supervisor_id = %s AND role = 'tutor_analista'", (tutor_id, user_id))
-        else:
-            cursor.execute("SELECT id, username FROM users WHERE supervisor_id = %s AND role = 'tutor_analista' ORDER BY username ASC", (user_id,))
-        
-        tutors = cursor.fetchall()
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"Reporte Tutores {target_month}-{target_year}"
-        
-        header_fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True, size=12)
-        border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        
-        ws.merge_cells('A1:I1')
-        ws['A1'] = f'REPORTE DE CUMPLIMIENTO POR TUTOR - {target_month}/{target_year}'
-        ws['A1'].font = Font(bold=True, size=14); ws['A1'].alignment = Alignment(horizontal='center')
-        
-        headers = ['Tutor', 'Colaboradores', 'Asistencias (Slots)', 'Incidencias', 'Reportes Completos', 
-                   'Score Asistencia (50%)', 'Score Reportes (50%)', 'Cumplimiento %', 'Estado']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col, value=header)
-            cell.fill = header_fill; cell.font = header_font; cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        row = 4
-        for tutor in tutors:
-            tutor_id_val = tutor['id']
-            tutor_name = tutor['username']
-            
-            cursor.execute("SELECT employee_id FROM attendance_roster WHERE added_by_user_id = %s", (tutor_id_val,))
-            collabs = [r['employee_id'] for r in cursor.fetchall()]
-            num_collabs = len(collabs)
-            
-            # --- 1. Asistencia Tutores (50%) ---
-            total_attendance_slots_expected = num_business_days * num_collabs
-            filled_slots = 0
-            
-            if collabs:
-                placeholders = ','.join(['%s' for _ in collabs])
-                cursor.execute(f"""
-                    SELECT employee_id, date, status FROM attendance 
-                    WHERE employee_id IN ({placeholders})
-                    AND EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s
-                """, collabs + [target_month, target_year])
-                
-                att_map = {}
-                for rec in cursor.fetchall():
-                    att_map[(rec['employee_id'], rec['date'])] = rec['status']
-                
-                for cid in collabs:
-                    for b_day in business_days:
-                        # Any non-empty status counts
-                        st = att_map.get((cid, b_day))
-                        if st: # Not None/Empty
-                            filled_slots += 1
-
-            attendance_score = (filled_slots / total_attendance_slots_expected * 50) if total_attendance_slots_expected > 0 else 0
-            
-            # --- 2. Reportes Tutores (50%) ---
-            complete_reports_count = 0
-            
-            if collabs:
-                placeholders = ','.join(['%s' for _ in collabs])
-                cursor.execute(f"""
-                    SELECT employee_id, data as report_data FROM reports 
-                    WHERE employee_id IN ({placeholders})
-                    AND month = %s AND year = %s
-                """, collabs + [target_month - 1, target_year]) # month 0-11
-                
-                report_records = {r['employee_id']: r['report_data'] for r in cursor.fetchall()}
-                
-                for cid in collabs:
-                    rep_data_str = report_records.get(cid)
-                    if rep_data_str:
-                        try:
-                            # Verify Completely Full (Any status for all requirements)
-                            data = json.loads(rep_data_str)
-                            is_full = True
-                            
-                            # Check Faltantes (All business days must have something)
-                            faltantes = data.get('faltantes', {})
-                            for b_day in business_days:
-                                if not faltantes.get(str(b_day.day), {}).get('status'):
-                                    is_full = False; break
-                            
-                            # Check Guias (2)
-                            guias = data.get('guias', {})
-                            for k in ['1', '2']:
-                                if not guias.get(k, {}).get('status'):
-                                    is_full = False; break
-                                    
-                            # Check Tableros (4)
-                            tableros = data.get('tableros', {})
-                            for k in ['1', '2', '3', '4']:
-                                if not tableros.get(k, {}).get('status'):
-                                    is_full = False; break
-                                    
-                            if is_full:
-                                complete_reports_count += 1
-                        except: pass
-            
-            report_score = (complete_reports_count / num_collabs * 50) if num_collabs > 0 else 0
-            
-            # --- Total ---
-            cumplimiento = attendance_score + report_score
-            
-            cursor.execute("""
-                SELECT COUNT(*) as count FROM incidents i
-                JOIN attendance_roster ar ON i.reported_by = ar.employee_id
-                WHERE ar.added_by_user_id = %s
-                AND EXTRACT(MONTH FROM i.created_at) = %s AND EXTRACT(YEAR FROM i.created_at) = %s
-            """, (tutor_id_val, target_month, target_year))
-            tutor_incidencias = cursor.fetchone()['count']
-            
-            if cumplimiento >= 90: estado = "Excelente"; ecolor = "22C55E"
-            elif cumplimiento >= 70: estado = "Bueno"; ecolor = "3B82F6"
-            elif cumplimiento >= 50: estado = "Regular"; ecolor = "F59E0B"
-            else: estado = "Bajo"; ecolor = "EF4444"
-            
-            vals = [tutor_name, num_collabs, filled_slots, tutor_incidencias, complete_reports_count,
-                    f"{attendance_score:.1f}%", f"{report_score:.1f}%", f"{cumplimiento:.2f}%"]
-            
-            for c_idx, val in enumerate(vals, 1):
-                ws.cell(row, c_idx, val).border = border
-            
-            ecell = ws.cell(row, 9, estado)
-            ecell.border = border; ecell.fill = PatternFill(start_color=ecolor, end_color=ecolor, fill_type="solid")
-            ecell.font = Font(color="FFFFFF", bold=True); ecell.alignment = Alignment(horizontal='center')
-            
-            row += 1
-        
-        ws.column_dimensions['A'].width = 25; ws.column_dimensions['B'].width = 15
-        for c in ['C','D','E','F','G','H']: ws.column_dimensions[c].width = 18
-        ws.column_dimensions['I'].width = 15
-        
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        conn.close()
-        
-        return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=f'reporte_tutores_{target_month}_{target_year}.xlsx')
+    matrix = load_month_compliance(cursor, [c['id'] for c in collaborators],
+                                   business_days, target_year, target_month)
+    scores, _ = matrix.score()
+    
+    rows = []
+    for collab, metrics in zip(collaborators, scores):
+        rows.append({
+            'employee_id': collab['id'],
+            'full_name': collab['full_name'],
+            'branch_name': collab['branch_name'],
+            'asistencias': metrics['asistencias'],
+            'faltas': metrics['faltas'],
+            'vacaciones': metrics['vacaciones'],
+            'permisos': metrics['permisos'],
+            'incapacidades': metrics['incapacidades'],
+            'incidents': metrics['incidents'],
+            'report_items': metrics['report_items'],
+            'attendance_score': metrics['attendance_score'],
+            'report_score': metrics['report_score'],
+            'cumplimiento': metrics['cumplimiento']
+        })
+    return rows
+
+def build_collaborator_report(conn, cursor, user_id, target_year, target_month, filters):
+    """Libro del reporte de cumplimiento por colaborador"""
+    collaborator_id = filters.get('collaboratorId')
+    
+    # Contexto (Días hábiles)
+    business_days, holidays = get_report_context(target_year, target_month)
+    
+    # Obtener tutores
+    cursor.execute("SELECT id FROM users WHERE supervisor_id = %s AND role = 'tutor_analista'", (user_id,))
+    tutor_ids = [row['id'] for row in cursor.fetchall()]
+    
+    if not tutor_ids:
+        raise ReportError('No se encontraron tutores supervisados', 404)
+    
+    placeholders = ','.join(['%s' for _ in tutor_ids])
+    
+    sql_collabs = f"SELECT DISTINCT e.id, e.full_name, b.name as branch_name FROM employees e LEFT JOIN branches b ON e.branch_id = b.id JOIN attendance_roster ar ON e.id = ar.employee_id WHERE ar.added_by_user_id IN ({placeholders})"
+    params = list(tutor_ids)
+    
+    if collaborator_id and collaborator_id != 'all':
+        sql_collabs += " AND e.id = %s"
+        params.append(collaborator_id)
         
-    except Exception as e:
-        print(f"Error generating tutor report: {e}")
-        import traceback; traceback.print_exc()
-        return jsonify({'success': False, 'message': str(e)}), 500
+    sql_collabs += " ORDER BY e.full_name ASC"
+    cursor.execute(sql_collabs, params)
+    collaborators = cursor.fetchall()
+    
+    if not collaborators:
+        raise ReportError('No se encontraron colaboradores', 404)
+    
+    book = ReportBook()
+    sheet = book.sheet(
+        f"Reporte Colaboradores {target_month}-{target_year}",
+        ['Colaborador', 'Sucursal', 'Asistencias', 'Faltas', 'Vacaciones', 'Permisos', 'Incapacidades', 'Incidencias', 'Reportes (pts)', 'Cumplimiento %', 'Estado'],
+        "8B5CF6",
+        widths=[30, 20],
+        banner=f'REPORTE DE CUMPLIMIENTO POR COLABORADOR - {target_month}/{target_year}',
+        header_size=11
+    )
+    
+    for metrics in compute_collaborator_report_rows(cursor, collaborators, business_days, target_year, target_month):
+        cumplimiento = metrics['cumplimiento']
+        estado, ecolor = compliance_status(cumplimiento)
+        
+        sheet.append([metrics['full_name'], metrics['branch_name'] or 'Sin sucursal',
+                      metrics['asistencias'], metrics['faltas'], metrics['vacaciones'],
+                      metrics['permisos'], metrics['incapacidades'], metrics['incidents'],
+                      metrics['report_items'], f"{cumplimiento:.2f}%", estado],
+                     styles={11: book.badge_style(ecolor)})
+    
+    return book
 
 @app.route('/api/reports/collaborators', methods=['GET', 'OPTIONS'])
 def generate_collaborator_report():
     """Generar reporte de resumen por colaborador"""
     if request.method == 'OPTIONS':
         return '', 204
-    
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from io import BytesIO
-        from flask import send_file
-        import json 
-        
-        user_id = request.args.get('userId')
-        month = request.args.get('month') 
-        year = request.args.get('year')
-        collaborator_id = request.args.get('collaboratorId')
-        
-        if not user_id or not month or not year:
-            return jsonify({'success': False, 'message': 'Parámetros requeridos: userId, month, year'}), 400
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT username, role FROM users WHERE id = %s", (user_id,))
-        user_data = cursor.fetchone()
-        
-        if not user_data or user_data['role'] != 'admin':
-            return jsonify({'success': False, 'message': 'No autorizado'}), 403
-        
-        allowed_users = ['helder mora', 'esthfania ramos']
-        if user_data['username'].lower() not in allowed_users:
-            return jsonify({'success': False, 'message': 'Solo Helder Mora y Esthfania Ramos pueden generar este reporte'}), 403
-        
-        target_month = int(month) + 1
-        target_year = int(year)
-        
-        # Contexto (Días hábiles)
-        business_days, holidays = get_report_context(target_year, target_month)
-        num_business_days = len(business_days)
-        
-        # Obtener tutores
-        cursor.execute("SELECT id FROM users WHERE supervisor_id = %s AND role = 'tutor_analista'", (user_id,))
-        tutor_ids = [row['id'] for row in cursor.fetchall()]
-        
-        if not tutor_ids:
-            return jsonify({'success': False, 'message': 'No se encontraron tutores supervisados'}), 404
-        
-        placeholders = ','.join(['%s' for _ in tutor_ids])
-        
-        sql_collabs = f"SELECT DISTINCT e.id, e.full_name, b.name as branch_name FROM employees e LEFT JOIN branches b ON e.branch_id = b.id JOIN attendance_roster ar ON e.id = ar.employee_id WHERE ar.added_by_user_id IN ({placeholders})"
-        params = list(tutor_ids)
-        
-        if collaborator_id and collaborator_id != 'all':
-            sql_collabs += " AND e.id = %s"
-            params.append(collaborator_id)
-            
-        sql_collabs += " ORDER BY e.full_name ASC"
-        cursor.execute(sql_collabs, params)
-        collaborators = cursor.fetchall()
-        
-        if not collaborators:
-            return jsonify({'success': False, 'message': 'No se encontraron colaboradores'}), 404
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"Reporte Colaboradores {target_month}-{target_year}"
-        
-        header_fill = PatternFill(start_color="8B5CF6", end_color="8B5CF6", fill_type="solid")
-        header_font = Font(color="FFFFFF", bold=True, size=11)
-        border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        
-        ws.merge_cells('A1:K1')
-        ws['A1'] = f'REPORTE DE CUMPLIMIENTO POR COLABORADOR - {target_month}/{target_year}'
-        ws['A1'].font = Font(bold=True, size=14); ws['A1'].alignment = Alignment(horizontal='center')
-        
-        headers = ['Colaborador', 'Sucursal', 'Asistencias', 'Faltas', 'Vacaciones', 'Permisos', 'Incapacidades', 'Incidencias', 'Reportes (pts)', 'Cumplimiento %', 'Estado']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=3, column=col, value=header)
-            cell.fill = header_fill; cell.font = header_font; cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-            
-        row = 4
-        for collab in collaborators:
-            cid = collab['id']
-            cname = collab['full_name']
-            bname = collab['branch_name'] or 'Sin sucursal'
-            
-            # --- 1. Asistencia (50%) ---
-            cursor.execute("SELECT date, status FROM attendance WHERE employee_id = %s AND EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s", (cid, target_month, target_year))
-            att_records = {r['date']: r['status'] for r in cursor.fetchall()}
-            
-            valid_attendance_count = 0
-            c_asist = 0; c_faltas = 0; c_vac = 0; c_perm = 0; c_incap = 0
-            
-            for b_day in business_days:
-                st = att_records.get(b_day)
-                if st == 'present' or st == 'delay':
-                    valid_attendance_count += 1; c_asist += 1
-                elif st == 'vacation':
-                    valid_attendance_count += 1; c_vac += 1
-                elif st == 'permission':
-                    valid_attendance_count += 1; c_perm += 1
-                elif st == 'absent':
-                    c_faltas += 1
-                elif st == 'incapacity':
-                    c_incap += 1
-            
-            attendance_score = (valid_attendance_count / num_business_days * 50) if num_business_days > 0 else 0
-            
-            # --- 2. Reportes (50%) ---
-            cursor.execute("SELECT data as report_data FROM reports WHERE employee_id=%s AND month=%s AND year=%s", (cid, target_month-1, target_year))
-            rep_row = cursor.fetchone()
-            
-            valid_report_items = 0
-            expected_report_items = num_business_days + 2 + 4 # Dias + 2 Guias + 4 Tableros
-            
-            if rep_row and rep_row['report_data']:
-                try:
-                    data = json.loads(rep_row['report_data'])
-                    
-                    # Faltantes (Dias habiles)
-                    faltantes = data.get('faltantes', {})
-                    for b_day in business_days:
-                         st = faltantes.get(str(b_day.day), {}).get('status')
-                         if st == 'check' or st == 'pending':
-                             valid_report_items += 1
-                    
-                    # Guias (2 envios) - Keys '1', '2'
-                    guias = data.get('guias', {})
-                    for k in ['1', '2']:
-                         st = guias.get(k, {}).get('status')
-                         if st == 'check' or st == 'pending':
-                             valid_report_items += 1
-
-                    # Tableros (4 evidencias) - Keys '1', '2', '3', '4'
-                    tableros = data.get('tableros', {})
-                    for k in ['1', '2', '3', '4']:
-                         st = tableros.get(k, {}).get('status')
-                         if st == 'check' or st == 'pending':
-                             valid_report_items += 1
-                             
-                except: pass
-            
-            report_score = (valid_report_items / expected_report_items * 50) if expected_report_items > 0 else 0
-            
-            # --- Total ---
-            cumplimiento = attendance_score + report_score
-            
-            # Incidencias (Solo contar)
-            cursor.execute("SELECT COUNT(*) as count FROM incidents WHERE reported_by = %s AND EXTRACT(MONTH FROM created_at) = %s AND EXTRACT(YEAR FROM created_at) = %s", (cid, target_month, target_year))
-            c_incidencias = cursor.fetchone()['count']
-            
-            if cumplimiento >= 90: estado = "Excelente"; ecolor = "22C55E"
-            elif cumplimiento >= 70: estado = "Bueno"; ecolor = "3B82F6"
-            elif cumplimiento >= 50: estado = "Regular"; ecolor = "F59E0B"
-            else: estado = "Bajo"; ecolor = "EF4444"
-            
-            ws.cell(row, 1, cname).border = border
-            ws.cell(row, 2, bname).border = border
-            ws.cell(row, 3, c_asist).border = border
-            ws.cell(row, 4, c_faltas).border = border
-            ws.cell(row, 5, c_vac).border = border
-            ws.cell(row, 6, c_perm).border = border
-            ws.cell(row, 7, c_incap).border = border
-            ws.cell(row, 8, c_incidencias).border = border
-            ws.cell(row, 9, valid_report_items).border = border
-            ws.cell(row, 10, f"{cumplimiento:.2f}%").border = border
-            
-            ecell = ws.cell(row, 11, estado)
-            ecell.border = border; ecell.fill = PatternFill(start_color=ecolor, end_color=ecolor, fill_type="solid")
-            ecell.font = Font(color="FFFFFF", bold=True); ecell.alignment = Alignment(horizontal='center')
-            
-            row += 1
-            
-        ws.column_dimensions['A'].width = 30; ws.column_dimensions['B'].width = 20
-        
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        conn.close()
-        
-        return send_file(output, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name=f'reporte_colaboradores_{target_month}_{target_year}.xlsx')
-        
-    except Exception as e:
-        print(f"Error generating collaborator report: {e}")
-        import traceback; traceback.print_exc()
-        return jsonify({'success': False, 'message': str(e)}), 500
+    return report_download('collaborators')
 
 @app.route('/api/reports/available-months', methods=['GET', 'OPTIONS'])
 def get_available_report_months():
@@ -1980,6 +2598,62 @@ def get_available_report_months():
         print(f"Error getting available months: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
+# ==================== API: CACHE ====================
+
+@app.route('/api/cache/stats', methods=['GET', 'OPTIONS'])
+def cache_stats():
+    if request.method == 'OPTIONS':
+        return '', 204
+    return jsonify({'success': True, 'data': {
+        'hierarchy': hierarchy_cache.stats(),
+        'alert_worker': alert_queue.stats(),
+        'reports': report_cache.stats(),
+        'report_jobs': report_jobs.stats()
+    }})
+
+def cache_admin_error():
+    """Respuesta de error si quien llama (userId) no es usuario de reportes; None si sí"""
+    user_id = request.args.get('userId') or (request.get_json(silent=True) or {}).get('userId')
+    if not user_id:
+        return jsonify({'success': False, 'message': 'userId requerido'}), 400
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        check_report_user(cursor, user_id)
+    except ReportError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status
+    finally:
+        conn.close()
+    return None
+
+@app.route('/api/cache/hierarchy/invalidate', methods=['POST', 'OPTIONS'])
+def invalidate_hierarchy_cache():
+    """Forzar recarga de la jerarquía (llamar después de modificar users); solo admins de reportes.
+
+    Solo limpia la caché del proceso que atiende la petición: los demás
+    workers de gunicorn siguen con la jerarquía anterior hasta que vence
+    HIERARCHY_CACHE_TTL.
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    error = cache_admin_error()
+    if error:
+        return error
+    hierarchy_cache.invalidate()
+    return jsonify({'success': True})
+
+@app.route('/api/cache/reports/clear', methods=['POST', 'OPTIONS'])
+def clear_report_cache():
+    """Borrar los reportes XLSX guardados en disco; solo admins de reportes"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    error = cache_admin_error()
+    if error:
+        return error
+    report_cache.clear()
+    return jsonify({'success': True})
+
 # ==================== CORS Headers ====================
 
 @app.after_request
@@ -1991,419 +2665,507 @@ def after_request(response):
 
 # ==================== REPORTES ESPECÍFICOS ====================
 
+def build_absences_report(conn, cursor, user_id, target_year, target_month, filters):
+    """Libro del reporte de faltas por colaborador"""
+    collaborator_id = filters.get('collaboratorId')
+    
+    # Query para obtener faltas
+    month_sql, month_params = month_range_clause('a.date', target_year, target_month)
+    collaborator_sql = ""
+    params = list(month_params)
+    if collaborator_id and collaborator_id != 'all':
+        collaborator_sql = "AND e.id = %s"
+        params.append(collaborator_id)
+    
+    book = ReportBook()
+    sheet = book.sheet("Reporte de Faltas", ['Colaborador', 'Sucursal', 'Total Faltas', 'Fechas'], "DC2626", widths=[30, 20, 15, 50])
+    
+    for row in iter_query(conn, f"""
+        SELECT 
+            e.full_name,
+            b.name as branch_name,
+            COUNT(*) as total_faltas,
+            STRING_AGG(TO_CHAR(a.date, 'DD/MM/YYYY'), ', ') as fechas
+        FROM attendance a
+        JOIN employees e ON a.employee_id = e.id
+        LEFT JOIN branches b ON e.branch_id = b.id
+        WHERE a.status = 'absent'
+            AND {month_sql}
+            {collaborator_sql}
+        GROUP BY e.id, e.full_name, b.name
+        ORDER BY e.full_name
+    """, params):
+        sheet.append([row['full_name'], row['branch_name'] or 'N/A', row['total_faltas'], row['fechas']])
+    
+    return book
+
 @app.route('/api/reports/absences', methods=['GET', 'OPTIONS'])
 def generate_absences_report():
     """Generar reporte de faltas por colaborador"""
     if request.method == 'OPTIONS':
         return '', 204
+    return report_download('absences')
+
+def build_vacations_report(conn, cursor, user_id, target_year, target_month, filters):
+    """Libro del reporte de vacaciones por colaborador"""
+    collaborator_id = filters.get('collaboratorId')
+    
+    # Query para obtener vacaciones
+    month_sql, month_params = month_range_clause('a.date', target_year, target_month)
+    collaborator_sql = ""
+    params = list(month_params)
+    if collaborator_id and collaborator_id != 'all':
+        collaborator_sql = "AND e.id = %s"
+        params.append(collaborator_id)
+    
+    book = ReportBook()
+    sheet = book.sheet("Reporte de Vacaciones", ['Colaborador', 'Sucursal', 'Total Días', 'Fechas'], "3B82F6", widths=[30, 20, 15, 50])
+    
+    for row in iter_query(conn, f"""
+        SELECT 
+            e.full_name,
+            b.name as branch_name,
+            COUNT(*) as total_dias_vacaciones,
+            STRING_AGG(TO_CHAR(a.date, 'DD/MM/YYYY'), ', ') as fechas
+        FROM attendance a
+        JOIN employees e ON a.employee_id = e.id
+        LEFT JOIN branches b ON e.branch_id = b.id
+        WHERE a.status = 'vacation'
+            AND {month_sql}
+            {collaborator_sql}
+        GROUP BY e.id, e.full_name, b.name
+        ORDER BY e.full_name
+    """, params):
+        sheet.append([row['full_name'], row['branch_name'] or 'N/A', row['total_dias_vacaciones'], row['fechas']])
+    
+    return book
+
+@app.route('/api/reports/vacations', methods=['GET', 'OPTIONS'])
+def generate_vacations_report():
+    """Generar reporte de vacaciones por colaborador"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    return report_download('vacations')
+
+def build_incidents_report(conn, cursor, user_id, target_year, target_month, filters):
+    """Libro del reporte de incidencias por sucursal"""
+    branch_id = filters.get('branchId')
+    
+    # Query para obtener incidencias (las incidencias son por sucursal, no por colaborador)
+    month_sql, month_params = month_range_clause('i.created_at', target_year, target_month)
+    branch_sql = ""
+    params = list(month_params)
+    if branch_id and branch_id != 'all':
+        branch_sql = "AND i.branch_id = %s"
+        params.append(branch_id)
+    
+    book = ReportBook()
+    # Encabezados (sin columna de colaborador)
+    sheet = book.sheet("Reporte de Incidencias",
+                       ['ID', 'Sucursal', 'Tipo', 'Descripción', 'Estatus', 'Fecha Registro', 'Reportado Por'],
+                       "F59E0B", widths=[8, 30, 20, 40, 15, 18, 20])
+    # Color según estatus (pendientes en rojo)
+    status_styles = {
+        'en_proceso': {5: book.fill_style("FEE2E2")},
+        'sin_respuesta': {5: book.fill_style("FEE2E2")},
+        'concluido': {5: book.fill_style("D1FAE5")},
+    }
+    
+    for incident in iter_query(conn, f"""
+        SELECT 
+            i.id,
+            b.name as sucursal,
+            i.type as tipo,
+            i.description as descripcion,
+            i.status as estatus,
+            TO_CHAR(i.created_at, 'DD/MM/YYYY HH24:MI') as fecha_registro,
+            u.username as reportado_por
+        FROM incidents i
+        LEFT JOIN branches b ON i.branch_id = b.id
+        LEFT JOIN users u ON i.reported_by = u.id
+        WHERE {month_sql}
+            {branch_sql}
+        ORDER BY i.created_at DESC
+    """, params):
+        sheet.append([incident['id'], incident['sucursal'] or 'N/A', incident['tipo'], incident['descripcion'],
+                      INCIDENT_STATUSES.get(incident['estatus'], incident['estatus']),
+                      incident['fecha_registro'], incident['reportado_por'] or 'N/A'],
+                     styles=status_styles.get(incident['estatus']))
+    
+    return book
+
+@app.route('/api/reports/incidents', methods=['GET', 'OPTIONS'])
+def generate_incidents_report():
+    """Generar reporte de incidencias por sucursal"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    return report_download('incidents')
+
+# Tipos de reporte XLSX: builder, filtros aceptados, si depende del usuario que lo pide
+REPORT_TYPES = {
+    'tutors': {'build': build_tutor_report, 'filters': ['tutorId'], 'scoped': True,
+               'file': 'reporte_tutores', 'label': 'tutor'},
+    'collaborators': {'build': build_collaborator_report, 'filters': ['collaboratorId'], 'scoped': True,
+                      'file': 'reporte_colaboradores', 'label': 'collaborator'},
+    'absences': {'build': build_absences_report, 'filters': ['collaboratorId'], 'scoped': False,
+                 'file': 'reporte_faltas', 'label': 'absences'},
+    'vacations': {'build': build_vacations_report, 'filters': ['collaboratorId'], 'scoped': False,
+                  'file': 'reporte_vacaciones', 'label': 'vacations'},
+    'incidents': {'build': build_incidents_report, 'filters': ['branchId'], 'scoped': False,
+                  'file': 'reporte_incidencias', 'label': 'incidents'},
+}
+
+def parse_report_params(report_type, source):
+    """Validar userId, month (0-11), year y filtros del tipo de reporte"""
+    user_id = source.get('userId')
+    month = source.get('month')
+    year = source.get('year')
+    
+    if not user_id or month in (None, '') or not year:
+        raise ReportError('Parámetros requeridos: userId, month, year', 400)
     
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from io import BytesIO
-        from flask import send_file
-        
-        user_id = request.args.get('userId')
-        month = request.args.get('month')  # 0-11
-        year = request.args.get('year')
-        collaborator_id = request.args.get('collaboratorId')  # Optional
-        
-        if not user_id or not month or not year:
-            return jsonify({'success': False, 'message': 'Parámetros requeridos: userId, month, year'}), 400
-        
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Verificar que el usuario es administrador
-        cursor.execute("SELECT username, role FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'admin':
-            return jsonify({'success': False, 'message': 'No autorizado'}), 403
-        
-        # Verificar que es Helder Mora o Esthfania Ramos (case-insensitive)
-        allowed_users = ['helder mora', 'esthfania ramos']
-        if user['username'].lower() not in allowed_users:
-            return jsonify({'success': False, 'message': 'Solo Helder Mora y Esthfania Ramos pueden generar este reporte'}), 403
-        
         # Convertir mes de JS (0-11) a SQL (1-12)
         target_month = int(month) + 1
         target_year = int(year)
+    except (TypeError, ValueError):
+        raise ReportError('month y year deben ser numéricos', 400)
+    
+    filters = {name: source.get(name) for name in REPORT_TYPES[report_type]['filters']}
+    return {'user_id': user_id, 'target_year': target_year, 'target_month': target_month, 'filters': filters}
+
+def check_report_user(cursor, user_id):
+    """Solo Helder Mora y Esthfania Ramos (admins) generan reportes"""
+    cursor.execute("SELECT username, role FROM users WHERE id = %s", (user_id,))
+    user = cursor.fetchone()
+    
+    if not user or user['role'] != 'admin':
+        raise ReportError('No autorizado', 403)
+    
+    # Verificar que es Helder Mora o Esthfania Ramos (case-insensitive)
+    allowed_users = ['helder mora', 'esthfania ramos']
+    if user['username'].lower() not in allowed_users:
+        raise ReportError('Solo Helder Mora y Esthfania Ramos pueden generar este reporte', 403)
+
+def generate_report_file(conn, report_type, user_id, target_year, target_month, filters, progress=None):
+    """Generar (o tomar de caché) un reporte; devuelve (archivo abierto, nombre de descarga)"""
+    spec = REPORT_TYPES[report_type]
+    cursor = conn.cursor()
+    download_name = f"{spec['file']}_{target_month}_{target_year}.xlsx"
+    
+    scope = user_id if spec['scoped'] else None
+    cache_key, cached = open_cached_report(cursor, report_type, target_year, target_month, scope, filters)
+    if cached:
+        return cached, download_name
+    
+    if progress:
+        progress(20)
+    book = spec['build'](conn, cursor, user_id, target_year, target_month, filters)
+    if progress:
+        progress(80)
+    return report_cache.store(cache_key, book.save), download_name
+
+def report_download(report_type):
+    """Responder una descarga síncrona de /api/reports/<tipo>"""
+    try:
+        params = parse_report_params(report_type, request.args)
         
-        # Query para obtener faltas
-        if collaborator_id and collaborator_id != 'all':
-            cursor.execute("""
-                SELECT 
-                    e.full_name,
-                    b.name as branch_name,
-                    COUNT(*) as total_faltas,
-                    STRING_AGG(TO_CHAR(a.date, 'DD/MM/YYYY'), ', ') as fechas
-                FROM attendance a
-                JOIN employees e ON a.employee_id = e.id
-                LEFT JOIN branches b ON e.branch_id = b.id
-                WHERE a.status = 'absent'
-                    AND EXTRACT(MONTH FROM a.date) = %s
-                    AND EXTRACT(YEAR FROM a.date) = %s
-                    AND e.id = %s
-                GROUP BY e.id, e.full_name, b.name
-                ORDER BY e.full_name
-            """, (target_month, target_year, collaborator_id))
-        else:
-            cursor.execute("""
-                SELECT 
-                    e.full_name,
-                    b.name as branch_name,
-                    COUNT(*) as total_faltas,
-                    STRING_AGG(TO_CHAR(a.date, 'DD/MM/YYYY'), ', ') as fechas
-                FROM attendance a
-                JOIN employees e ON a.employee_id = e.id
-                LEFT JOIN branches b ON e.branch_id = b.id
-                WHERE a.status = 'absent'
-                    AND EXTRACT(MONTH FROM a.date) = %s
-                    AND EXTRACT(YEAR FROM a.date) = %s
-                GROUP BY e.id, e.full_name, b.name
-                ORDER BY e.full_name
-            """, (target_month, target_year))
-        
-        absences = cursor.fetchall()
-        
-        # Crear Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Faltas"
-        
-        # Estilos
-        header_fill = PatternFill(start_color="DC2626", end_color="DC2626", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Encabezados
-        headers = ['Colaborador', 'Sucursal', 'Total Faltas', 'Fechas']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Datos
-        for row_idx, absence in enumerate(absences, 2):
-            ws.cell(row=row_idx, column=1, value=absence['full_name']).border = border
-            ws.cell(row=row_idx, column=2, value=absence['branch_name'] or 'N/A').border = border
-            ws.cell(row=row_idx, column=3, value=absence['total_faltas']).border = border
-            ws.cell(row=row_idx, column=4, value=absence['fechas']).border = border
-        
-        # Ajustar anchos
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 20
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 50
-        
-        # Guardar
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        check_report_user(cursor, params['user_id'])
         
+        fileobj, download_name = generate_report_file(conn, report_type, **params)
         conn.close()
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'reporte_faltas_{target_month}_{target_year}.xlsx'
-        )
+        return send_report(fileobj, download_name)
         
+    except ReportError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status
     except Exception as e:
-        print(f"Error generating absences report: {e}")
+        print(f"Error generating {REPORT_TYPES[report_type]['label']} report: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/reports/vacations', methods=['GET', 'OPTIONS'])
-def generate_vacations_report():
-    """Generar reporte de vacaciones por colaborador"""
+# ==================== API: COMPLIANCE TREND ====================
+
+MONTH_ABBR = ["", "Ene", "Feb", "Mar", "Abr", "May", "Jun", "Jul", "Ago", "Sep", "Oct", "Nov", "Dic"]
+COMPLIANCE_TREND_MAX_MONTHS = 24
+
+def parse_year_month(value, name):
+    """'YYYY-MM' (mes 1-12) -> (año, mes)"""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        date(year, month, 1)
+    except (AttributeError, ValueError):
+        raise ReportError(f'{name} debe tener formato YYYY-MM', 400)
+    return year, month
+
+def trend_months(start, end):
+    """Lista de (año, mes) de start a end inclusive"""
+    year, month = start
+    months = []
+    while (year, month) <= end:
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def load_trend_compliance(conn, cursor, employee_ids, months):
+    """Un MonthCompliance por mes con un solo recorrido por rango de cada tabla"""
+    matrices = {(y, m): MonthCompliance(employee_ids, holiday_calendar.business_days(y, m)) for y, m in months}
+    if not employee_ids:
+        return matrices
+    start, _ = month_bounds(*months[0])
+    _, end = month_bounds(*months[-1])
+    
+    for r in iter_query(conn, """
+        SELECT employee_id, date, status FROM attendance
+        WHERE employee_id = ANY(%s) AND date >= %s AND date < %s
+    """, (employee_ids, start, end)):
+        matrices[(r['date'].year, r['date'].month)].set_attendance(r['employee_id'], r['date'], r['status'])
+    
+    # report_items.month es 0-11; los renglones no requeridos los ignora cada matriz
+    for r in iter_query(conn, """
+        SELECT employee_id, year, month, kind, item_key, status FROM report_items
+        WHERE employee_id = ANY(%s)
+        AND (year, month) >= (%s, %s) AND (year, month) <= (%s, %s)
+    """, (employee_ids, months[0][0], months[0][1] - 1, months[-1][0], months[-1][1] - 1)):
+        matrices[(r['year'], r['month'] + 1)].set_item(r['employee_id'], r['kind'], r['item_key'], r['status'])
+    
+    cursor.execute("""
+        SELECT reported_by, date_trunc('month', created_at)::date AS month, COUNT(*) AS count
+        FROM incidents
+        WHERE reported_by = ANY(%s) AND created_at >= %s AND created_at < %s
+        GROUP BY reported_by, date_trunc('month', created_at)
+    """, (employee_ids, start, end))
+    for r in cursor.fetchall():
+        matrices[(r['month'].year, r['month'].month)].add_incidents(r['reported_by'], r['count'])
+    
+    return matrices
+
+def build_compliance_trend_report(conn, cursor, user_id, months):
+    """Libro con el cumplimiento mensual por tutor, colaborador y sucursal"""
+    cursor.execute("SELECT id, username FROM users WHERE supervisor_id = %s AND role = 'tutor_analista' ORDER BY username ASC", (user_id,))
+    tutors = cursor.fetchall()
+    if not tutors:
+        raise ReportError('No se encontraron tutores supervisados', 404)
+    
+    cursor.execute("""
+        SELECT e.id, e.full_name, b.name AS branch_name, ar.added_by_user_id
+        FROM attendance_roster ar
+        JOIN employees e ON ar.employee_id = e.id
+        LEFT JOIN branches b ON e.branch_id = b.id
+        WHERE ar.added_by_user_id = ANY(%s)
+        ORDER BY e.full_name ASC
+    """, ([t['id'] for t in tutors],))
+    collaborators = cursor.fetchall()
+    groups = {
+        'tutor': {c['id']: c['added_by_user_id'] for c in collaborators},
+        'branch': {c['id']: c['branch_name'] or 'Sin sucursal' for c in collaborators},
+    }
+    
+    matrices = load_trend_compliance(conn, cursor, [c['id'] for c in collaborators], months)
+    by_collab = {}
+    by_group = {'tutor': {}, 'branch': {}}
+    for ym in months:
+        collab_scores, group_scores = matrices[ym].score(groups)
+        for metrics in collab_scores:
+            by_collab.setdefault(metrics['employee_id'], {})[ym] = metrics['cumplimiento']
+        by_group['tutor'].update({(key, ym): g['cumplimiento'] for key, g in group_scores['tutor'].items()})
+        by_group['branch'].update({(key, ym): g['promedio_colaboradores'] for key, g in group_scores['branch'].items()})
+    
+    labels = [f"{MONTH_ABBR[m]} {y}" for y, m in months]
+    period = f"{labels[0]} - {labels[-1]}"
+    book = ReportBook()
+    
+    def write_matrix(sheet, lead, scores):
+        """Fila: columnas fijas + cumplimiento por mes + promedio con color de estado"""
+        values = [round(s, 2) if s is not None else None for s in scores]
+        present = [v for v in values if v is not None]
+        average = round(sum(present) / len(present), 2) if present else None
+        styles = {len(lead) + len(values) + 1: book.badge_style(compliance_status(average)[1])} if present else None
+        sheet.append(lead + values + [average], styles=styles)
+    
+    sheet = book.sheet("Tutores", ['Tutor'] + labels + ['Promedio'], "4F46E5",
+                       widths=[25] + [11] * len(labels) + [12],
+                       banner=f'CUMPLIMIENTO POR TUTOR (%) - {period}')
+    for tutor in tutors:
+        write_matrix(sheet, [tutor['username']],
+                     [by_group['tutor'].get((tutor['id'], ym)) for ym in months])
+    
+    sheet = book.sheet("Colaboradores", ['Colaborador', 'Sucursal'] + labels + ['Promedio'], "0EA5E9",
+                       widths=[30, 20] + [11] * len(labels) + [12],
+                       banner=f'CUMPLIMIENTO POR COLABORADOR (%) - {period}')
+    for collab in collaborators:
+        write_matrix(sheet, [collab['full_name'], collab['branch_name'] or 'Sin sucursal'],
+                     [by_collab.get(collab['id'], {}).get(ym) for ym in months])
+    
+    sheet = book.sheet("Sucursales", ['Sucursal'] + labels + ['Promedio'], "10B981",
+                       widths=[25] + [11] * len(labels) + [12],
+                       banner=f'CUMPLIMIENTO PROMEDIO POR SUCURSAL (%) - {period}')
+    for branch in sorted(set(groups['branch'].values())):
+        write_matrix(sheet, [branch], [by_group['branch'].get((branch, ym)) for ym in months])
+    
+    return book
+
+@app.route('/api/reports/compliance-trend', methods=['GET', 'OPTIONS'])
+def generate_compliance_trend_report():
+    """Cumplimiento mes a mes de from a to (YYYY-MM, por omisión enero a mes actual)"""
     if request.method == 'OPTIONS':
         return '', 204
     
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from io import BytesIO
-        from flask import send_file
-        
         user_id = request.args.get('userId')
-        month = request.args.get('month')  # 0-11
-        year = request.args.get('year')
-        collaborator_id = request.args.get('collaboratorId')  # Optional
+        if not user_id:
+            raise ReportError('Parámetros requeridos: userId', 400)
         
-        if not user_id or not month or not year:
-            return jsonify({'success': False, 'message': 'Parámetros requeridos: userId, month, year'}), 400
+        today = mexico_today()
+        end = parse_year_month(request.args['to'], 'to') if request.args.get('to') else (today.year, today.month)
+        start = parse_year_month(request.args['from'], 'from') if request.args.get('from') else (end[0], 1)
+        months = trend_months(start, end)
+        if not months:
+            raise ReportError('from debe ser anterior o igual a to', 400)
+        if len(months) > COMPLIANCE_TREND_MAX_MONTHS:
+            raise ReportError(f'El rango máximo es de {COMPLIANCE_TREND_MAX_MONTHS} meses', 400)
         
         conn = get_db_connection()
         cursor = conn.cursor()
+        check_report_user(cursor, user_id)
         
-        # Verificar que el usuario es administrador
-        cursor.execute("SELECT username, role FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'admin':
-            return jsonify({'success': False, 'message': 'No autorizado'}), 403
-        
-        # Verificar que es Helder Mora o Esthfania Ramos (case-insensitive)
-        allowed_users = ['helder mora', 'esthfania ramos']
-        if user['username'].lower() not in allowed_users:
-            return jsonify({'success': False, 'message': 'Solo Helder Mora y Esthfania Ramos pueden generar este reporte'}), 403
-        
-        # Convertir mes de JS (0-11) a SQL (1-12)
-        target_month = int(month) + 1
-        target_year = int(year)
-        
-        # Query para obtener vacaciones
-        if collaborator_id and collaborator_id != 'all':
-            cursor.execute("""
-                SELECT 
-                    e.full_name,
-                    b.name as branch_name,
-                    COUNT(*) as total_dias_vacaciones,
-                    STRING_AGG(TO_CHAR(a.date, 'DD/MM/YYYY'), ', ') as fechas
-                FROM attendance a
-                JOIN employees e ON a.employee_id = e.id
-                LEFT JOIN branches b ON e.branch_id = b.id
-                WHERE a.status = 'vacation'
-                    AND EXTRACT(MONTH FROM a.date) = %s
-                    AND EXTRACT(YEAR FROM a.date) = %s
-                    AND e.id = %s
-                GROUP BY e.id, e.full_name, b.name
-                ORDER BY e.full_name
-            """, (target_month, target_year, collaborator_id))
-        else:
-            cursor.execute("""
-                SELECT 
-                    e.full_name,
-                    b.name as branch_name,
-                    COUNT(*) as total_dias_vacaciones,
-                    STRING_AGG(TO_CHAR(a.date, 'DD/MM/YYYY'), ', ') as fechas
-                FROM attendance a
-                JOIN employees e ON a.employee_id = e.id
-                LEFT JOIN branches b ON e.branch_id = b.id
-                WHERE a.status = 'vacation'
-                    AND EXTRACT(MONTH FROM a.date) = %s
-                    AND EXTRACT(YEAR FROM a.date) = %s
-                GROUP BY e.id, e.full_name, b.name
-                ORDER BY e.full_name
-            """, (target_month, target_year))
-        
-        vacations = cursor.fetchall()
-        
-        # Crear Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Vacaciones"
-        
-        # Estilos
-        header_fill = PatternFill(start_color="3B82F6", end_color="3B82F6", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Encabezados
-        headers = ['Colaborador', 'Sucursal', 'Total Días', 'Fechas']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Datos
-        for row_idx, vacation in enumerate(vacations, 2):
-            ws.cell(row=row_idx, column=1, value=vacation['full_name']).border = border
-            ws.cell(row=row_idx, column=2, value=vacation['branch_name'] or 'N/A').border = border
-            ws.cell(row=row_idx, column=3, value=vacation['total_dias_vacaciones']).border = border
-            ws.cell(row=row_idx, column=4, value=vacation['fechas']).border = border
-        
-        # Ajustar anchos
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 20
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 50
-        
-        # Guardar
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
+        book = build_compliance_trend_report(conn, cursor, user_id, months)
         conn.close()
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'reporte_vacaciones_{target_month}_{target_year}.xlsx'
-        )
-        
+        return book.to_response(
+            f"reporte_cumplimiento_{start[0]}-{start[1]:02d}_{end[0]}-{end[1]:02d}.xlsx")
+    
+    except ReportError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status
     except Exception as e:
-        print(f"Error generating vacations report: {e}")
+        print(f"Error generating compliance trend report: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': str(e)}), 500
 
-@app.route('/api/reports/incidents', methods=['GET', 'OPTIONS'])
-def generate_incidents_report():
-    """Generar reporte de incidencias por sucursal"""
+# ==================== API: REPORT JOBS ====================
+
+def _run_report_job(conn, report_type, params, progress):
+    return generate_report_file(conn, report_type, progress=progress, **params)
+
+# Reportes en segundo plano (REPORT_JOB_WORKERS hilos); el archivo dura REPORT_JOB_TTL segundos
+report_jobs = ReportJobQueue(
+    get_db_connection,
+    _run_report_job,
+    os.getenv('REPORT_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'reportes_jobs')),
+    workers=int(os.getenv('REPORT_JOB_WORKERS', 2)),
+    ttl=float(os.getenv('REPORT_JOB_TTL', 3600))
+)
+
+def report_job_json(job):
+    """Estado público de un trabajo de reporte"""
+    data = {
+        'id': job['id'],
+        'type': job['report_type'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'error': job['error'],
+        'created_at': job['created_at'].isoformat() if job['created_at'] else None,
+        'finished_at': job['finished_at'].isoformat() if job['finished_at'] else None,
+        'expires_at': job['expires_at'].isoformat() if job['expires_at'] else None,
+    }
+    if job['status'] == 'done':
+        data['file_name'] = job['file_name']
+        data['download_url'] = f"/api/report-jobs/{job['id']}/download"
+    return data
+
+@app.route('/api/report-jobs', methods=['POST', 'OPTIONS'])
+def create_report_job():
+    """Encolar un reporte XLSX: {userId, type, month (0-11), year, filters}"""
     if request.method == 'OPTIONS':
         return '', 204
     
     try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        from io import BytesIO
-        from flask import send_file
-        
-        user_id = request.args.get('userId')
-        month = request.args.get('month')  # 0-11
-        year = request.args.get('year')
-        branch_id = request.args.get('branchId')  # Optional
+        data = request.json or {}
+        report_type = data.get('type')
+        if report_type not in REPORT_TYPES:
+            return jsonify({'success': False, 'message': f"type debe ser uno de: {', '.join(REPORT_TYPES)}"}), 400
         
-        if not user_id or not month or not year:
-            return jsonify({'success': False, 'message': 'Parámetros requeridos: userId, month, year'}), 400
+        source = dict(data.get('filters') or {})
+        source.update({'userId': data.get('userId'), 'month': data.get('month'), 'year': data.get('year')})
+        params = parse_report_params(report_type, source)
         
         conn = get_db_connection()
         cursor = conn.cursor()
+        check_report_user(cursor, params['user_id'])
+        conn.close()
         
-        # Verificar que el usuario es administrador
-        cursor.execute("SELECT username, role FROM users WHERE id = %s", (user_id,))
-        user = cursor.fetchone()
-        
-        if not user or user['role'] != 'admin':
-            return jsonify({'success': False, 'message': 'No autorizado'}), 403
-        
-        # Verificar que es Helder Mora o Esthfania Ramos (case-insensitive)
-        allowed_users = ['helder mora', 'esthfania ramos']
-        if user['username'].lower() not in allowed_users:
-            return jsonify({'success': False, 'message': 'Solo Helder Mora y Esthfania Ramos pueden generar este reporte'}), 403
-        
-        # Convertir mes de JS (0-11) a SQL (1-12)
-        target_month = int(month) + 1
-        target_year = int(year)
-        
-        # Query para obtener incidencias (las incidencias son por sucursal, no por colaborador)
-        if branch_id and branch_id != 'all':
-            cursor.execute("""
-                SELECT 
-                    i.id,
-                    b.name as sucursal,
-                    i.type as tipo,
-                    i.description as descripcion,
-                    i.status as estatus,
-                    TO_CHAR(i.created_at, 'DD/MM/YYYY HH24:MI') as fecha_registro,
-                    u.username as reportado_por
-                FROM incidents i
-                LEFT JOIN branches b ON i.branch_id = b.id
-                LEFT JOIN users u ON i.reported_by = u.id
-                WHERE EXTRACT(MONTH FROM i.created_at) = %s
-                    AND EXTRACT(YEAR FROM i.created_at) = %s
-                    AND i.branch_id = %s
-                ORDER BY i.created_at DESC
-            """, (target_month, target_year, branch_id))
-        else:
-            cursor.execute("""
-                SELECT 
-                    i.id,
-                    b.name as sucursal,
-                    i.type as tipo,
-                    i.description as descripcion,
-                    i.status as estatus,
-                    TO_CHAR(i.created_at, 'DD/MM/YYYY HH24:MI') as fecha_registro,
-                    u.username as reportado_por
-                FROM incidents i
-                LEFT JOIN branches b ON i.branch_id = b.id
-                LEFT JOIN users u ON i.reported_by = u.id
-                WHERE EXTRACT(MONTH FROM i.created_at) = %s
-                    AND EXTRACT(YEAR FROM i.created_at) = %s
-                ORDER BY i.created_at DESC
-            """, (target_month, target_year))
-        
-        incidents = cursor.fetchall()
-        
-        # Crear Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Reporte de Incidencias"
-        
-        # Estilos
-        header_fill = PatternFill(start_color="F59E0B", end_color="F59E0B", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        # Mismos parámetros => mismo trabajo mientras siga en cola o corriendo
+        scope = params['user_id'] if REPORT_TYPES[report_type]['scoped'] else None
+        params_key = ReportCache.make_key(report_type, params['target_year'], params['target_month'],
+                                          scope, params['filters'], None)
+        job, created = report_jobs.submit(report_type, params, params_key, params['user_id'])
         
-        # Encabezados (sin columna de colaborador)
-        headers = ['ID', 'Sucursal', 'Tipo', 'Descripción', 'Estatus', 'Fecha Registro', 'Reportado Por']
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Datos
-        for row_idx, incident in enumerate(incidents, 2):
-            ws.cell(row=row_idx, column=1, value=incident['id']).border = border
-            ws.cell(row=row_idx, column=2, value=incident['sucursal'] or 'N/A').border = border
-            ws.cell(row=row_idx, column=3, value=incident['tipo']).border = border
-            ws.cell(row=row_idx, column=4, value=incident['descripcion']).border = border
-            
-            # Color según estatus
-            status_cell = ws.cell(row=row_idx, column=5, value=incident['estatus'])
-            status_cell.border = border
-            if incident['estatus'] == 'activa':
-                status_cell.fill = PatternFill(start_color="FEE2E2", end_color="FEE2E2", fill_type="solid")
-            elif incident['estatus'] == 'resuelta':
-                status_cell.fill = PatternFill(start_color="D1FAE5", end_color="D1FAE5", fill_type="solid")
-            
-            ws.cell(row=row_idx, column=6, value=incident['fecha_registro']).border = border
-            ws.cell(row=row_idx, column=7, value=incident['reportado_por'] or 'N/A').border = border
-        
-        # Ajustar anchos
-        ws.column_dimensions['A'].width = 8
-        ws.column_dimensions['B'].width = 30
-        ws.column_dimensions['C'].width = 20
-        ws.column_dimensions['D'].width = 40
-        ws.column_dimensions['E'].width = 15
-        ws.column_dimensions['F'].width = 18
-        ws.column_dimensions['G'].width = 20
-        
-        # Guardar
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+        return jsonify({'success': True, 'data': report_job_json(job), 'deduplicated': not created}), 202 if created else 200
         
+    except ReportError as e:
+        return jsonify({'success': False, 'message': e.message}), e.status
+    except Exception as e:
+        print(f"Error creating report job: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def _get_report_job_for_user(job_id):
+    """(trabajo, None) o (None, respuesta de error); solo usuarios de reportes"""
+    user_id = request.args.get('userId')
+    if not user_id:
+        return None, (jsonify({'success': False, 'message': 'userId requerido'}), 400)
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        check_report_user(cursor, user_id)
+    except ReportError as e:
+        return None, (jsonify({'success': False, 'message': e.message}), e.status)
+    finally:
         conn.close()
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f'reporte_incidencias_{target_month}_{target_year}.xlsx'
-        )
-        
+    
+    job = report_jobs.get(job_id)
+    if not job:
+        return None, (jsonify({'success': False, 'message': 'Trabajo no encontrado o caducado'}), 404)
+    return job, None
+
+@app.route('/api/report-jobs/<job_id>', methods=['GET', 'OPTIONS'])
+def get_report_job(job_id):
+    """Estado y progreso de un trabajo de reporte"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        job, error = _get_report_job_for_user(job_id)
+        if error:
+            return error
+        return jsonify({'success': True, 'data': report_job_json(job)})
     except Exception as e:
-        print(f"Error generating incidents report: {e}")
-        import traceback
-        traceback.print_exc()
+        print(f"Error getting report job: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/report-jobs/<job_id>/download', methods=['GET', 'OPTIONS'])
+def download_report_job(job_id):
+    """Descargar el XLSX de un trabajo terminado"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        job, error = _get_report_job_for_user(job_id)
+        if error:
+            return error
+        if job['status'] != 'done':
+            return jsonify({'success': False, 'message': 'El reporte aún no está listo', 'data': report_job_json(job)}), 409
+        
+        fileobj = report_jobs.open_file(job)
+        if fileobj is None:
+            return jsonify({'success': False, 'message': 'El archivo del reporte ya no existe'}), 410
+        return send_report(fileobj, job['file_name'])
+    except Exception as e:
+        print(f"Error downloading report job: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/branches', methods=['GET', 'OPTIONS'])
@@ -2546,8 +3308,6 @@ def get_dashboard_stats():
         return jsonify({'success': True, 'data': {
             'asistencias': 0, 'faltas': 0, 'vacaciones': 0, 'permisos': 0, 'incapacidades': 0, 'incidencias_activas': 0, 'retardos': 0
         }})
-        
-    placeholders = ','.join(['%s' for _ in authorized_ids])
     
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -2556,32 +3316,10 @@ def get_dashboard_stats():
         today = datetime.now().strftime('%Y-%m-%d')
         
         # Stats de asistencia de HOY
-        sql_base = f"""
-            SELECT a.status, COUNT(*) as count
-            FROM attendance a
-            JOIN attendance_roster ar ON a.employee_id = ar.employee_id
-            WHERE ar.added_by_user_id IN ({placeholders})
-            AND a.date = %s
-            GROUP BY a.status
-        """
-        
-        cursor.execute(sql_base, authorized_ids + [today])
-        
-        counts = {row['status']: row['count'] for row in cursor.fetchall()}
+        counts = fetch_daily_status_counts(cursor, authorized_ids, today)
         
         # Incidencias activas (TOTAL, no solo de hoy)
-        cursor.execute(f"""
-            SELECT COUNT(*) as count 
-            FROM incidents i
-            WHERE (i.reported_by IN ({placeholders}) OR i.branch_id IN (
-                SELECT e.branch_id FROM employees e 
-                JOIN attendance_roster ar ON e.id = ar.employee_id 
-                WHERE ar.added_by_user_id IN ({placeholders})
-            ))
-            AND i.status = 'activa'
-        """, authorized_ids * 2) 
-        
-        incidencias = cursor.fetchone()['count']
+        incidencias = fetch_active_incidents(cursor, authorized_ids, count_only=True)
         
         return jsonify({'success': True, 'data': {
             'asistencias': counts.get('present', 0),
@@ -2655,32 +3393,59 @@ def get_dashboard_delays():
 def get_holidays(year):
     if request.method == 'OPTIONS':
         return '', 204
-        
+    
+    holidays = [d.isoformat() for d in holiday_calendar.holidays(year)]
+    return jsonify({'success': True, 'data': holidays})
+
+@app.route('/api/holidays', methods=['POST', 'OPTIONS'])
+def save_holiday_override():
+    """Agregar un feriado manual (is_holiday=true) o anular uno de ley (false)"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    data = request.get_json(silent=True) or {}
     try:
-        import urllib.request
-        
-        # URL de la API de días festivos
-        url = f"https://date.nager.at/api/v3/PublicHolidays/{year}/MX"
-        
-        # Configurar request con User-Agent para evitar bloqueo 403
-        req = urllib.request.Request(
-            url, 
-            data=None, 
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-        )
-        
-        with urllib.request.urlopen(req) as response:
-            data = json.loads(response.read().decode())
-            # Simplificar datos: solo devolver fechas
-            holidays = [item['date'] for item in data] 
-            return jsonify({'success': True, 'data': holidays})
-            
+        day = datetime.strptime(data.get('date') or '', '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'date requerido (YYYY-MM-DD)'}), 400
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO holidays (date, name, is_holiday)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (date) DO UPDATE SET name = EXCLUDED.name, is_holiday = EXCLUDED.is_holiday
+        """, (day, data.get('name'), bool(data.get('is_holiday', True))))
+        conn.commit()
+        holiday_calendar.invalidate(day.year)
+        return jsonify({'success': True})
     except Exception as e:
-        print(f"Error fetching holidays: {e}")
-        # En caso de error, devolver lista vacía para no romper el frontend
-        return jsonify({'success': True, 'data': []})
+        print(f"Error saving holiday: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        conn.close()
+
+@app.route('/api/holidays/<day>', methods=['DELETE', 'OPTIONS'])
+def delete_holiday_override(day):
+    """Quitar un ajuste manual y volver a la regla de ley para esa fecha"""
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        day = datetime.strptime(day, '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Fecha inválida (YYYY-MM-DD)'}), 400
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM holidays WHERE date = %s", (day,))
+        conn.commit()
+        holiday_calendar.invalidate(day.year)
+        return jsonify({'success': True})
+    finally:
+        conn.close()
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 3000))
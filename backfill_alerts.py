@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 from datetime import datetime
 import json
 
+from app import delay_alert_key
+
 load_dotenv()
 DATABASE_URL = os.getenv('DATABASE_URL')
 
@@ -89,21 +91,16 @@ def backfill_alerts():
                     ]
                 })
                 
-                # Insert Alert if not exists
+                # Insert Alert if not exists (unique index on user_id, alert_key)
+                alert_key = delay_alert_key(emp_id, target_year, target_month)
+                
                 def insert_alert(uid):
-                    searchTerm = f'"month": "{month_name}", "year": {target_year}'
                     cursor.execute("""
-                        SELECT id FROM alerts 
-                        WHERE user_id = %s AND employee_id = %s AND details LIKE %s
-                    """, (uid, emp_id, f'%{searchTerm}%'))
-                    
-                    if not cursor.fetchone():
-                        cursor.execute("""
-                            INSERT INTO alerts (user_id, employee_id, details)
-                            VALUES (%s, %s, %s)
-                        """, (uid, emp_id, alert_details))
-                        return True
-                    return False
+                        INSERT INTO alerts (user_id, employee_id, details, alert_key)
+                        VALUES (%s, %s, %s, %s)
+                        ON CONFLICT (user_id, alert_key) DO NOTHING
+                    """, (uid, emp_id, alert_details, alert_key))
+                    return cursor.rowcount > 0
 
                 if insert_alert(tutor_id): count_alerts += 1
                 if supervisor_id:
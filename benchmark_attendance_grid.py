@@ -0,0 +1,77 @@
+"""
+Benchmark del armado de la cuadrícula de asistencia de GET /api/attendance:
+búsqueda lineal por empleado (versión anterior) contra build_attendance_grid
+(índice por id) y la serialización por bloques. No usa base de datos.
+
+Uso: python benchmark_attendance_grid.py [empleados] [días]
+"""
+import json
+import sys
+import time
+from datetime import date
+
+from app import build_attendance_grid, stream_json_list, app
+
+NUM_EMPLOYEES = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+NUM_DAYS = int(sys.argv[2]) if len(sys.argv) > 2 else 31
+STATUSES = ['present', 'present', 'present', 'delay', 'absent', 'vacation', 'permission']
+
+def make_employees():
+    return [{'id': i, 'full_name': f'Colaborador {i}', 'branch_id': i % 20,
+             'branch_name': f'Sucursal {i % 20}', 'marks': {}}
+            for i in range(1, NUM_EMPLOYEES + 1)]
+
+def make_rows():
+    rows = []
+    for day in range(NUM_DAYS, 0, -1):
+        for emp_id in range(1, NUM_EMPLOYEES + 1):
+            rows.append({
+                'employee_id': emp_id,
+                'date': date(2026, 1, day),
+                'status': STATUSES[(emp_id + day) % len(STATUSES)],
+                'comment': '',
+                'arrival_time': '09:10',
+                'permission_type': '',
+                'start_date': None,
+                'end_date': None,
+            })
+    return rows
+
+def legacy_grid(employees, rows):
+    for row in rows:
+        emp_id = row['employee_id']
+        date_str = row['date'].isoformat() if hasattr(row['date'], 'isoformat') else str(row['date'])
+        for emp in employees:
+            if emp['id'] == emp_id:
+                emp['marks'][date_str] = {
+                    'status': row['status'],
+                    'comment': row['comment'],
+                    'arrival_time': row['arrival_time'],
+                    'permission_type': row['permission_type'],
+                    'start_date': row['start_date'].isoformat() if row['start_date'] and hasattr(row['start_date'], 'isoformat') else row['start_date'],
+                    'end_date': row['end_date'].isoformat() if row['end_date'] and hasattr(row['end_date'], 'isoformat') else row['end_date']
+                }
+                break
+    return employees
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<32} {(time.perf_counter() - start) * 1000:9.1f} ms")
+    return result
+
+def main():
+    rows = make_rows()
+    print(f"{NUM_EMPLOYEES} empleados x {NUM_DAYS} días = {len(rows)} registros\n")
+
+    legacy = timed("merge lineal (anterior)", lambda: legacy_grid(make_employees(), rows))
+    indexed = timed("merge con índice por id", lambda: build_attendance_grid(make_employees(), rows))
+    assert legacy == indexed, "Las dos versiones no producen la misma cuadrícula"
+
+    timed("json.dumps completo", lambda: json.dumps({'success': True, 'data': indexed}))
+    with app.test_request_context():
+        streamed = timed("stream_json_list", lambda: ''.join(stream_json_list(indexed).response))
+    assert json.loads(streamed) == {'success': True, 'data': indexed}
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Compara EXTRACT(MONTH/YEAR FROM date) contra el rango semiabierto
+(date >= inicio AND date < inicio_mes_siguiente) sobre un dataset sintético
+de varios años. Todo se crea en tablas TEMP: no toca los datos reales.
+
+Uso: python benchmark_month_range.py [empleados] [años]
+"""
+import os
+import sys
+import psycopg2
+from dotenv import load_dotenv
+
+from app import month_bounds
+
+load_dotenv()
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+NUM_EMPLOYEES = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+NUM_YEARS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+TARGET_YEAR = 2025
+TARGET_MONTH = 6
+
+QUERIES = {
+    'attendance mes (empleado)': (
+        "SELECT date, status FROM bench_attendance WHERE employee_id = 42 "
+        "AND EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s",
+        "SELECT date, status FROM bench_attendance WHERE employee_id = 42 "
+        "AND date >= %s AND date < %s",
+    ),
+    'faltas del mes': (
+        "SELECT employee_id, COUNT(*) FROM bench_attendance WHERE status = 'absent' "
+        "AND EXTRACT(MONTH FROM date) = %s AND EXTRACT(YEAR FROM date) = %s GROUP BY employee_id",
+        "SELECT employee_id, COUNT(*) FROM bench_attendance WHERE status = 'absent' "
+        "AND date >= %s AND date < %s GROUP BY employee_id",
+    ),
+    'incidencias del mes': (
+        "SELECT COUNT(*) FROM bench_incidents "
+        "WHERE EXTRACT(MONTH FROM created_at) = %s AND EXTRACT(YEAR FROM created_at) = %s",
+        "SELECT COUNT(*) FROM bench_incidents WHERE created_at >= %s AND created_at < %s",
+    ),
+}
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+    lines = [r[0] for r in cursor.fetchall()]
+    scan = next((l.strip() for l in lines if 'Scan' in l), lines[0].strip())
+    total = next((l.strip() for l in lines if l.startswith('Execution Time')), '')
+    return scan, total
+
+def main():
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+    try:
+        print(f"Generando {NUM_EMPLOYEES} empleados x {NUM_YEARS} años de asistencia...")
+        cursor.execute("""
+            CREATE TEMP TABLE bench_attendance AS
+            SELECT e AS employee_id, d::date AS date,
+                   (ARRAY['present','present','present','delay','absent','vacation','permission'])[1 + (random() * 6)::int] AS status
+            FROM generate_series(1, %s) e,
+                 generate_series(make_date(%s, 1, 1), make_date(%s, 12, 31), interval '1 day') d
+            WHERE EXTRACT(DOW FROM d) NOT IN (0, 6)
+        """, (NUM_EMPLOYEES, TARGET_YEAR - NUM_YEARS + 1, TARGET_YEAR))
+        cursor.execute("""
+            CREATE TEMP TABLE bench_incidents AS
+            SELECT g AS id, (1 + random() * %s)::int AS reported_by,
+                   make_date(%s, 1, 1) + (random() * 365 * %s) * interval '1 day' AS created_at
+            FROM generate_series(1, %s) g
+        """, (NUM_EMPLOYEES - 1, TARGET_YEAR - NUM_YEARS + 1, NUM_YEARS, NUM_EMPLOYEES * 20))
+        cursor.execute("CREATE INDEX ON bench_attendance(date)")
+        cursor.execute("CREATE INDEX ON bench_attendance(employee_id)")
+        cursor.execute("ANALYZE bench_attendance")
+        cursor.execute("ANALYZE bench_incidents")
+
+        start, end = month_bounds(TARGET_YEAR, TARGET_MONTH)
+
+        def run(label):
+            print(f"\n=== {label} ===")
+            for name, (before_sql, after_sql) in QUERIES.items():
+                before = explain(cursor, before_sql, (TARGET_MONTH, TARGET_YEAR))
+                after = explain(cursor, after_sql, (start, end))
+                print(f"- {name}")
+                print(f"    EXTRACT: {before[0]} | {before[1]}")
+                print(f"    rango:   {after[0]} | {after[1]}")
+
+        run("Índices originales (employee_id, date)")
+
+        cursor.execute("CREATE INDEX ON bench_attendance(employee_id, date)")
+        cursor.execute("CREATE INDEX ON bench_attendance(status, date)")
+        cursor.execute("CREATE INDEX ON bench_incidents(created_at)")
+        cursor.execute("ANALYZE bench_attendance")
+        cursor.execute("ANALYZE bench_incidents")
+
+        run("Con índices compuestos")
+    finally:
+        conn.rollback()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark de la exportación XLSX de /api/reports/incidents y /api/reports/absences:
+Workbook() en memoria con estilos por celda (versión anterior) contra
+ReportBook (write_only, estilos con nombre, archivo temporal). Mide tiempo y,
+en una segunda corrida, memoria pico con tracemalloc; verifica que ambos
+libros tengan los mismos valores. No usa base de datos.
+
+Uso: python benchmark_report_writer.py [filas]
+"""
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+from app import app
+from report_writer import ReportBook
+
+NUM_ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+INCIDENT_HEADERS = ['ID', 'Sucursal', 'Tipo', 'Descripción', 'Estatus', 'Fecha Registro', 'Reportado Por']
+ABSENCE_HEADERS = ['Colaborador', 'Sucursal', 'Total Faltas', 'Fechas']
+
+def incident_rows():
+    for i in range(NUM_ROWS):
+        yield {
+            'id': i + 1,
+            'sucursal': f'Sucursal {i % 40}',
+            'tipo': ['Falla de sistema', 'Faltante', 'Cliente', 'Mantenimiento'][i % 4],
+            'descripcion': f'Descripción de la incidencia número {i + 1} reportada en piso',
+            'estatus': ['activa', 'resuelta', 'en_proceso'][i % 3],
+            'fecha_registro': f'{i % 28 + 1:02d}/01/2026 10:{i % 60:02d}',
+            'reportado_por': f'tutor{i % 25}',
+        }
+
+def absence_rows():
+    for i in range(NUM_ROWS):
+        yield {
+            'full_name': f'Colaborador {i + 1}',
+            'branch_name': f'Sucursal {i % 40}' if i % 10 else None,
+            'total_faltas': i % 5 + 1,
+            'fechas': ', '.join(f'{d:02d}/01/2026' for d in range(1, i % 5 + 2)),
+        }
+
+def incident_values(row):
+    return [row['id'], row['sucursal'] or 'N/A', row['tipo'], row['descripcion'],
+            row['estatus'], row['fecha_registro'], row['reportado_por'] or 'N/A']
+
+def absence_values(row):
+    return [row['full_name'], row['branch_name'] or 'N/A', row['total_faltas'], row['fechas']]
+
+def legacy_export(title, headers, color, rows, to_values, status_col=None):
+    rows = list(rows)  # fetchall()
+    wb = Workbook()
+    ws = wb.active
+    ws.title = title
+    header_fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF", size=12)
+    border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+        cell.border = border
+    for row_idx, row in enumerate(rows, 2):
+        for col, value in enumerate(to_values(row), 1):
+            cell = ws.cell(row=row_idx, column=col, value=value)
+            cell.border = border
+            if col == status_col and value == 'activa':
+                cell.fill = PatternFill(start_color="FEE2E2", end_color="FEE2E2", fill_type="solid")
+            elif col == status_col and value == 'resuelta':
+                cell.fill = PatternFill(start_color="D1FAE5", end_color="D1FAE5", fill_type="solid")
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+def streamed_export(title, headers, color, rows, to_values, status_col=None):
+    book = ReportBook()
+    sheet = book.sheet(title, headers, color)
+    status_styles = {}
+    if status_col:
+        status_styles = {'activa': {status_col: book.fill_style("FEE2E2")},
+                         'resuelta': {status_col: book.fill_style("D1FAE5")}}
+    for row in rows:
+        values = to_values(row)
+        sheet.append(values, styles=status_styles.get(values[status_col - 1]) if status_col else None)
+    with app.test_request_context():
+        response = book.to_response('benchmark.xlsx')
+        response.direct_passthrough = False
+        data = response.get_data()
+        response.close()
+    return data
+
+def measure(label, fn):
+    # El tiempo se toma sin tracemalloc (lo hace varias veces más lento)
+    start = time.perf_counter()
+    data = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<34} {elapsed:7.2f} s   pico {peak / 1024 / 1024:8.1f} MB   {len(data) / 1024:8.0f} KB")
+    return data
+
+def sheet_values(data):
+    ws = load_workbook(BytesIO(data), read_only=True).active
+    return [tuple(r) for r in ws.iter_rows(values_only=True)]
+
+def main():
+    print(f"{NUM_ROWS} filas por reporte\n")
+    for name, title, headers, color, rows, to_values, status_col in [
+        ('incidencias', "Reporte de Incidencias", INCIDENT_HEADERS, "F59E0B", incident_rows, incident_values, 5),
+        ('faltas', "Reporte de Faltas", ABSENCE_HEADERS, "DC2626", absence_rows, absence_values, None),
+    ]:
+        legacy = measure(f"{name}: Workbook() en memoria",
+                         lambda: legacy_export(title, headers, color, rows(), to_values, status_col))
+        streamed = measure(f"{name}: ReportBook write_only",
+                           lambda: streamed_export(title, headers, color, rows(), to_values, status_col))
+        assert sheet_values(legacy) == sheet_values(streamed), f"Los libros de {name} no coinciden"
+        print()
+
+if __name__ == "__main__":
+    main()
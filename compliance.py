@@ -0,0 +1,177 @@
+"""
+Puntaje de cumplimiento (50% asistencia / 50% reportes) de los reportes de
+tutores y colaboradores.
+
+numpy no está entre las dependencias del proyecto: las matrices son filas
+bytearray (un byte por celda) y los conteos usan bytearray.count, que recorre
+la fila en C. Para un mes son a lo más ~31 días + 6 renglones por colaborador.
+"""
+
+# Códigos de la matriz de asistencia (0 = sin registro)
+ATTENDANCE_CODES = {
+    'present': 1,
+    'delay': 2,
+    'vacation': 3,
+    'permission': 4,
+    'absent': 5,
+    'incapacity': 6,
+}
+ATTENDANCE_OTHER = 7
+
+# Códigos de la matriz de reporte (0 = vacío)
+ITEM_CODES = {'check': 1, 'pending': 2, 'cross': 3}
+ITEM_OTHER = 4
+
+# Renglones del reporte mensual además de los días hábiles (faltantes)
+REPORT_GUIAS = ('1', '2')
+REPORT_TABLEROS = ('1', '2', '3', '4')
+
+
+def required_report_items(business_days):
+    """(kind, item_key) que cuentan para cumplimiento: días hábiles, 2 guías, 4 tableros"""
+    return ([('faltantes', str(b_day.day)) for b_day in business_days]
+            + [('guias', k) for k in REPORT_GUIAS]
+            + [('tableros', k) for k in REPORT_TABLEROS])
+
+
+def compliance_status(cumplimiento):
+    """Estado y color (hex) de un porcentaje de cumplimiento"""
+    if cumplimiento >= 90:
+        return "Excelente", "22C55E"
+    if cumplimiento >= 70:
+        return "Bueno", "3B82F6"
+    if cumplimiento >= 50:
+        return "Regular", "F59E0B"
+    return "Bajo", "EF4444"
+
+
+def empty_group_scores():
+    """Métricas de un grupo sin colaboradores (p. ej. tutor sin roster)"""
+    return {
+        'num_collabs': 0, 'filled_slots': 0, 'complete_reports': 0, 'incidents': 0,
+        'attendance_score': 0, 'report_score': 0, 'cumplimiento': 0, 'promedio_colaboradores': 0,
+    }
+
+
+class MonthCompliance:
+    """Asistencia, reporte e incidencias de un mes para un conjunto de colaboradores.
+
+    - attendance: una fila por colaborador, una columna por día hábil, con el
+      código de status (ATTENDANCE_CODES).
+    - items: una fila por colaborador, una columna por renglón requerido del
+      reporte (required_report_items), con el código de status (ITEM_CODES).
+
+    Los set_* ignoran colaboradores, días o renglones fuera de la matriz.
+    """
+
+    def __init__(self, employee_ids, business_days):
+        self.employee_ids = list(employee_ids)
+        self.business_days = list(business_days)
+        self._rows = {eid: idx for idx, eid in enumerate(self.employee_ids)}
+        self._days = {b_day: idx for idx, b_day in enumerate(self.business_days)}
+        self._items = {item: idx for idx, item in enumerate(required_report_items(self.business_days))}
+
+        num_rows = len(self.employee_ids)
+        self.attendance = [bytearray(len(self._days)) for _ in range(num_rows)]
+        self.items = [bytearray(len(self._items)) for _ in range(num_rows)]
+        self.incidents = [0] * num_rows
+
+    @property
+    def expected_items(self):
+        return len(self._items)
+
+    def set_attendance(self, employee_id, day, status):
+        row = self._rows.get(employee_id)
+        col = self._days.get(day)
+        if row is not None and col is not None and status:
+            self.attendance[row][col] = ATTENDANCE_CODES.get(status, ATTENDANCE_OTHER)
+
+    def set_item(self, employee_id, kind, item_key, status):
+        row = self._rows.get(employee_id)
+        col = self._items.get((kind, str(item_key)))
+        if row is not None and col is not None and status:
+            self.items[row][col] = ITEM_CODES.get(status, ITEM_OTHER)
+
+    def add_incidents(self, employee_id, count):
+        row = self._rows.get(employee_id)
+        if row is not None:
+            self.incidents[row] += count
+
+    def score(self, groups=None):
+        """Calificar todo el mes en una pasada.
+
+        groups: {nombre: {employee_id: clave}} para agregar además por tutor,
+        sucursal, etc. Devuelve (métricas por colaborador en el orden de
+        employee_ids, {nombre: {clave: métricas del grupo}}).
+        """
+        groups = groups or {}
+        num_days = len(self.business_days)
+        expected_items = self.expected_items
+        totals = {name: {} for name in groups}
+        collaborators = []
+
+        for row, employee_id in enumerate(self.employee_ids):
+            att = self.attendance[row]
+            items = self.items[row]
+
+            asistencias = att.count(1) + att.count(2)
+            vacaciones = att.count(3)
+            permisos = att.count(4)
+            valid_attendance = asistencias + vacaciones + permisos
+            report_items = items.count(1) + items.count(2)
+
+            attendance_score = (valid_attendance / num_days * 50) if num_days > 0 else 0
+            report_score = (report_items / expected_items * 50) if expected_items > 0 else 0
+            metrics = {
+                'employee_id': employee_id,
+                'asistencias': asistencias,
+                'faltas': att.count(5),
+                'vacaciones': vacaciones,
+                'permisos': permisos,
+                'incapacidades': att.count(6),
+                'filled_slots': num_days - att.count(0),
+                'report_items': report_items,
+                'report_complete': items.count(0) == 0,
+                'incidents': self.incidents[row],
+                'attendance_score': attendance_score,
+                'report_score': report_score,
+                'cumplimiento': attendance_score + report_score,
+            }
+            collaborators.append(metrics)
+
+            for name, keys in groups.items():
+                key = keys.get(employee_id)
+                if key is None:
+                    continue
+                group = totals[name].setdefault(key, {
+                    'num_collabs': 0, 'filled_slots': 0, 'complete_reports': 0,
+                    'incidents': 0, 'cumplimiento_sum': 0,
+                })
+                group['num_collabs'] += 1
+                group['filled_slots'] += metrics['filled_slots']
+                group['complete_reports'] += metrics['report_complete']
+                group['incidents'] += metrics['incidents']
+                group['cumplimiento_sum'] += metrics['cumplimiento']
+
+        return collaborators, {name: {key: self._group_scores(group, num_days)
+                                      for key, group in by_key.items()}
+                               for name, by_key in totals.items()}
+
+    @staticmethod
+    def _group_scores(group, num_days):
+        """Puntaje de captura del grupo (slots de asistencia llenos y reportes
+        completos, como el reporte de tutores) y promedio de sus colaboradores"""
+        num_collabs = group['num_collabs']
+        expected_slots = num_days * num_collabs
+        attendance_score = (group['filled_slots'] / expected_slots * 50) if expected_slots > 0 else 0
+        report_score = (group['complete_reports'] / num_collabs * 50) if num_collabs > 0 else 0
+        return {
+            'num_collabs': num_collabs,
+            'filled_slots': group['filled_slots'],
+            'complete_reports': group['complete_reports'],
+            'incidents': group['incidents'],
+            'attendance_score': attendance_score,
+            'report_score': report_score,
+            'cumplimiento': attendance_score + report_score,
+            'promedio_colaboradores': group['cumplimiento_sum'] / num_collabs if num_collabs > 0 else 0,
+        }
@@ -0,0 +1,31 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+from alert_worker import ALERT_JOBS_DDL
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+def create_alert_jobs_table():
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        print("Creando tabla alert_jobs...")
+        cursor.execute(ALERT_JOBS_DDL)
+        conn.commit()
+        print("Tabla alert_jobs creada exitosamente.")
+    except Exception as e:
+        print(f"Error creando tabla: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    create_alert_jobs_table()
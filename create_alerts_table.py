@@ -23,12 +23,16 @@ def create_alerts_table():
                 user_id INTEGER NOT NULL,
                 employee_id INTEGER NOT NULL,
                 details TEXT,
+                alert_key VARCHAR(100),
                 is_read BOOLEAN DEFAULT FALSE,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (user_id) REFERENCES users(id),
                 FOREIGN KEY (employee_id) REFERENCES employees(id)
             );
         """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_user_key ON alerts(user_id, alert_key);
+        """)
         conn.commit()
         print("Tabla alerts creada exitosamente.")
     except Exception as e:
@@ -0,0 +1,49 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# unaccent() no es IMMUTABLE (depende del diccionario), así que no puede ir en
+# un índice; este envoltorio fija el diccionario y sí puede
+UNACCENT_FUNCTION = """
+    CREATE OR REPLACE FUNCTION immutable_unaccent(value TEXT) RETURNS TEXT AS $$
+        SELECT public.unaccent('public.unaccent'::regdictionary, value)
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+"""
+
+# Búsqueda por nombre y paginación por (full_name, id) de GET /api/employees
+INDEXES = [
+    ("idx_employees_name_trgm", "employees USING gin (immutable_unaccent(lower(full_name)) gin_trgm_ops)"),
+    ("idx_employees_name_id", "employees(full_name, id)"),
+]
+
+def create_employee_search_index():
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    try:
+        print("Habilitando extensiones unaccent y pg_trgm...")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(UNACCENT_FUNCTION)
+        for name, target in INDEXES:
+            print(f"Creando índice {name}...")
+            cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}")
+        cursor.execute("ANALYZE employees")
+        print("Índices creados exitosamente.")
+    except Exception as e:
+        print(f"Error creando índices: {e}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    create_employee_search_index()
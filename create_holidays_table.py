@@ -0,0 +1,36 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+def create_holidays_table():
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        print("Creando tabla holidays...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS holidays (
+                date DATE PRIMARY KEY,
+                name VARCHAR(200),
+                is_holiday BOOLEAN NOT NULL DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        conn.commit()
+        print("Tabla holidays creada exitosamente.")
+    except Exception as e:
+        print(f"Error creando tabla: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    create_holidays_table()
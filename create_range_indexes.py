@@ -0,0 +1,41 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+# Índices para los filtros por rango de fechas (month_range_clause en app.py)
+INDEXES = [
+    ("idx_attendance_employee_date", "attendance(employee_id, date)"),
+    ("idx_attendance_status_date", "attendance(status, date)"),
+    ("idx_incidents_created", "incidents(created_at)"),
+    # Paginación por (created_at DESC, id DESC) de GET /api/incidents
+    ("idx_incidents_created_id", "incidents(created_at DESC, id DESC)"),
+]
+
+def create_range_indexes():
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    try:
+        for name, target in INDEXES:
+            print(f"Creando índice {name} en {target}...")
+            cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}")
+        cursor.execute("ANALYZE attendance")
+        cursor.execute("ANALYZE incidents")
+        print("Índices creados exitosamente.")
+    except Exception as e:
+        print(f"Error creando índices: {e}")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    create_range_indexes()
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+
+
+class PoolExhausted(Exception):
+    """No se pudo obtener una conexión libre dentro del tiempo de espera"""
+
+
+class PooledConnection:
+    """Envoltura de una conexión prestada por el pool.
+
+    Delega todo a la conexión real. Si la conexión pertenece a una petición
+    (guardada en flask.g), close() no hace nada y la devolución ocurre en el
+    teardown; fuera de una petición, close() la regresa al pool.
+    """
+
+    def __init__(self, pool, raw_conn, request_scoped=False):
+        self._pool = pool
+        self._conn = raw_conn
+        self._request_scoped = request_scoped
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def close(self):
+        if self._request_scoped:
+            return
+        self.release()
+
+    def release(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise AttributeError(f"Conexión ya devuelta al pool: {name}")
+        return getattr(self._conn, name)
+
+
+class ConnectionPool:
+    """Pool de conexiones thread-safe y seguro ante fork().
+
+    - connect_fn: función sin argumentos que abre una conexión nueva
+    - minconn: conexiones ociosas que se conservan al hacer limpieza
+    - maxconn: máximo de conexiones abiertas (prestadas + ociosas)
+    - idle_timeout: segundos que una conexión ociosa puede vivir antes de cerrarse
+    - health_check_interval: segundos de inactividad tras los cuales se valida con SELECT 1
+    - timeout: segundos de espera cuando el pool está lleno
+    """
+
+    def __init__(self, connect_fn, minconn=1, maxconn=10, idle_timeout=300,
+                 health_check_interval=30, timeout=10):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Tamaños de pool inválidos")
+        self._connect_fn = connect_fn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+
+        self._cond = threading.Condition(threading.Lock())
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = []      # [(conn, last_used_monotonic)], LIFO
+        self._in_use = set()  # id(conn)
+
+    def _check_fork(self):
+        # Tras un fork (gunicorn --preload) las conexiones heredadas comparten
+        # socket con el proceso padre: se olvidan sin cerrarlas.
+        if self._pid != os.getpid():
+            self._reset_state()
+
+    @property
+    def size(self):
+        with self._cond:
+            return len(self._idle) + len(self._in_use)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self._check_fork()
+            while True:
+                self._reap_idle()
+                while self._idle:
+                    conn, last_used = self._idle.pop()
+                    if self._is_healthy(conn, last_used):
+                        self._in_use.add(id(conn))
+                        return conn
+                    self._close_quietly(conn)
+
+                if len(self._in_use) < self.maxconn:
+                    # Reservar el lugar antes de conectar fuera del lock
+                    placeholder = object()
+                    self._in_use.add(id(placeholder))
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(
+                        f"Pool sin conexiones libres (max={self.maxconn})"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            conn = self._connect_fn()
+        except Exception:
+            with self._cond:
+                self._in_use.discard(id(placeholder))
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use.discard(id(placeholder))
+            self._in_use.add(id(conn))
+        return conn
+
+    def putconn(self, conn, discard=False):
+        with self._cond:
+            if self._pid != os.getpid():
+                # Conexión del proceso padre: no se reutiliza ni se cierra
+                self._check_fork()
+                return
+            self._in_use.discard(id(conn))
+
+            if not discard:
+                discard = not self._reset_connection(conn)
+
+            if discard or len(self._idle) + len(self._in_use) >= self.maxconn:
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+
+            self._reap_idle()
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            self._idle = []
+
+    def _reap_idle(self):
+        if not self.idle_timeout:
+            return
+        now = time.monotonic()
+        # _idle está ordenada de la más antigua a la más reciente
+        while len(self._idle) > self.minconn:
+            conn, last_used = self._idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self._idle.pop(0)
+            self._close_quietly(conn)
+
+    def _is_healthy(self, conn, last_used):
+        if getattr(conn, 'closed', 0):
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _reset_connection(conn):
+        """Deshacer cualquier transacción abierta antes de reutilizar la conexión"""
+        if getattr(conn, 'closed', 0):
+            return False
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def pool_from_env(connect_fn):
+    """Crear un pool usando DB_POOL_* del entorno"""
+    return ConnectionPool(
+        connect_fn,
+        minconn=int(os.getenv('DB_POOL_MIN', 1)),
+        maxconn=int(os.getenv('DB_POOL_MAX', 10)),
+        idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+        health_check_interval=float(os.getenv('DB_POOL_HEALTHCHECK', 30)),
+        timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    )
@@ -0,0 +1,211 @@
+import unicodedata
+from datetime import date, datetime
+
+import psycopg2.extras
+from openpyxl import load_workbook
+from openpyxl.utils.datetime import from_excel
+
+
+# Encabezado normalizado (sin acentos ni espacios extra, mayúsculas) -> campo
+HEADER_ALIASES = {
+    'NOMBRE': 'full_name',
+    'NOMBRE COMPLETO': 'full_name',
+    'FULL_NAME': 'full_name',
+    'SUCURSAL': 'branch',
+    'BRANCH': 'branch',
+    'FECHA DE INGRESO': 'hire_date',
+    'FECHA INGRESO': 'hire_date',
+    'HIRE_DATE': 'hire_date',
+    'FECHA DE NACIMIENTO': 'birth_date',
+    'FECHA NACIMIENTO': 'birth_date',
+    'BIRTH_DATE': 'birth_date',
+    'ESTATUS': 'status',
+    'STATUS': 'status',
+}
+
+VALID_STATUSES = ('active', 'inactive')
+
+STAGING_DDL = """
+    CREATE TEMP TABLE employee_import_staging (
+        row_num INTEGER PRIMARY KEY,
+        full_name VARCHAR(200) NOT NULL,
+        branch_id INTEGER,
+        hire_date DATE,
+        birth_date DATE,
+        status VARCHAR(50)
+    ) ON COMMIT DROP
+"""
+
+
+class EmployeeImportError(Exception):
+    """El archivo no se puede importar (no es XLSX, faltan columnas, etc.)"""
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.split()).upper()
+
+
+def _name_key(name):
+    """Llave para comparar nombres de sucursal/colaborador sin mayúsculas ni espacios extra"""
+    return ' '.join(str(name).split()).lower()
+
+
+def _parse_date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, (int, float)):
+        # Serial de Excel en una celda sin formato de fecha
+        return from_excel(value).date()
+    text = str(value).strip()
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f'Fecha inválida: {text!r}')
+
+
+def read_employee_rows(fileobj):
+    """Leer la primera hoja en modo read_only; genera (número de fila, {campo: valor})"""
+    try:
+        wb = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as e:
+        raise EmployeeImportError(f'No se pudo leer el archivo: {e}')
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        columns = {idx: HEADER_ALIASES.get(_normalize(cell)) for idx, cell in enumerate(header) if cell is not None}
+        if 'full_name' not in columns.values():
+            raise EmployeeImportError('El archivo no tiene columna NOMBRE')
+        for row_num, values in enumerate(rows, 2):
+            record = {field: values[idx] for idx, field in columns.items() if field and idx < len(values)}
+            if any(value not in (None, '') for value in record.values()):
+                yield row_num, record
+    finally:
+        wb.close()
+
+
+def import_employees(cursor, fileobj):
+    """Importar colaboradores de un XLSX sin hacer commit.
+
+    Las sucursales se resuelven (o se crean) con un mapa nombre -> id en
+    memoria; los colaboradores se cargan con execute_values a una tabla
+    temporal y se fusionan con un solo UPDATE + INSERT: si ya existe uno con
+    el mismo nombre se actualiza, si no se inserta. Las filas inválidas (o
+    cuyo nombre ya está repetido en employees) no detienen la importación y
+    se reportan en errors.
+    """
+    errors = []
+    records = []
+    seen_names = {}
+    for row_num, record in read_employee_rows(fileobj):
+        full_name = ' '.join(str(record.get('full_name') or '').split())
+        if not full_name:
+            errors.append({'row': row_num, 'message': 'Falta el nombre'})
+            continue
+        if len(full_name) > 200:
+            errors.append({'row': row_num, 'message': 'Nombre de más de 200 caracteres'})
+            continue
+        key = _name_key(full_name)
+        if key in seen_names:
+            errors.append({'row': row_num, 'message': f'Nombre repetido en el archivo (fila {seen_names[key]})'})
+            continue
+        try:
+            hire_date = _parse_date(record.get('hire_date'))
+            birth_date = _parse_date(record.get('birth_date'))
+        except ValueError as e:
+            errors.append({'row': row_num, 'message': str(e)})
+            continue
+        status = str(record.get('status') or '').strip().lower() or None
+        if status and status not in VALID_STATUSES:
+            errors.append({'row': row_num, 'message': f'Estatus inválido: {status!r}'})
+            continue
+        seen_names[key] = row_num
+        branch = ' '.join(str(record.get('branch') or '').split()) or None
+        records.append((row_num, full_name, branch, hire_date, birth_date, status))
+
+    result = {'total': len(records) + len(errors), 'inserted': 0, 'updated': 0,
+              'branches_created': 0, 'errors': errors, 'updated_ids': []}
+    if not records:
+        return result
+
+    # Sucursales: las existentes en un mapa; las nuevas en un solo INSERT
+    cursor.execute("SELECT id, name FROM branches")
+    branch_ids = {}
+    for branch_id, name in ((r[0], r[1]) for r in cursor.fetchall()):
+        branch_ids.setdefault(_name_key(name), branch_id)
+    new_branches = {}
+    for record in records:
+        if record[2] and _name_key(record[2]) not in branch_ids:
+            new_branches.setdefault(_name_key(record[2]), record[2])
+    if new_branches:
+        created = psycopg2.extras.execute_values(
+            cursor, "INSERT INTO branches (name) VALUES %s RETURNING id, name",
+            [(name,) for name in new_branches.values()], fetch=True
+        )
+        for r in created:
+            branch_ids[_name_key(r[1])] = r[0]
+        result['branches_created'] = len(created)
+
+    cursor.execute(STAGING_DDL)
+    psycopg2.extras.execute_values(cursor, """
+        INSERT INTO employee_import_staging (row_num, full_name, branch_id, hire_date, birth_date, status)
+        VALUES %s
+    """, [(row_num, name, branch_ids.get(_name_key(branch)) if branch else None, hire, birth, status)
+          for row_num, name, branch, hire, birth, status in records])
+
+    # Un nombre que ya está repetido en employees no identifica a nadie: esas
+    # filas se sacan de la fusión y se reportan en lugar de actualizar a todos
+    cursor.execute("""
+        DELETE FROM employee_import_staging s
+        USING (
+            SELECT lower(full_name) AS name_key, COUNT(*) AS matches
+            FROM employees
+            WHERE lower(full_name) IN (SELECT lower(full_name) FROM employee_import_staging)
+            GROUP BY lower(full_name)
+            HAVING COUNT(*) > 1
+        ) dup
+        WHERE lower(s.full_name) = dup.name_key
+        RETURNING s.row_num, dup.matches
+    """)
+    for row_num, matches in cursor.fetchall():
+        errors.append({'row': row_num, 'message': f'El nombre coincide con {matches} colaboradores; corrija los duplicados'})
+    errors.sort(key=lambda error: error['row'])
+
+    # Fusión: ambas sentencias ven la tabla antes del UPDATE, así que una
+    # fila o se actualiza o se inserta, nunca las dos
+    cursor.execute("""
+        WITH updated AS (
+            UPDATE employees e
+            SET branch_id = COALESCE(s.branch_id, e.branch_id),
+                hire_date = COALESCE(s.hire_date, e.hire_date),
+                birth_date = COALESCE(s.birth_date, e.birth_date),
+                status = COALESCE(s.status, e.status)
+            FROM employee_import_staging s
+            WHERE lower(e.full_name) = lower(s.full_name)
+            RETURNING e.id
+        ),
+        inserted AS (
+            INSERT INTO employees (full_name, branch_id, hire_date, birth_date, status)
+            SELECT s.full_name, s.branch_id, s.hire_date, s.birth_date, COALESCE(s.status, 'active')
+            FROM employee_import_staging s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM employees e WHERE lower(e.full_name) = lower(s.full_name)
+            )
+            ORDER BY s.row_num
+            RETURNING id
+        )
+        SELECT (SELECT COUNT(*) FROM inserted) AS inserted,
+               (SELECT array_agg(id) FROM updated) AS updated_ids
+    """)
+    row = cursor.fetchone()
+    result['inserted'] = row[0]
+    result['updated_ids'] = row[1] or []
+    result['updated'] = len(result['updated_ids'])
+    return result
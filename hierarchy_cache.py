@@ -0,0 +1,95 @@
+import threading
+import time
+
+
+class HierarchyCache:
+    """Caché en memoria de la jerarquía usuario -> supervisados.
+
+    Se reconstruye completa con una sola consulta a users (load_fn devuelve
+    filas con id, role y supervisor_id) cuando expira el TTL o tras invalidate().
+    """
+
+    def __init__(self, load_fn, ttl=300):
+        self._load_fn = load_fn
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Contadores de stats() aparte, para no pelear el lock de reconstrucción
+        self._stats_lock = threading.Lock()
+        # ({id: role}, {id: [ids autorizados]}); None cuando hay que reconstruir
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def _fresh_snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return snapshot
+        return None
+
+    def _rebuild(self):
+        users = {}
+        supervised = {}
+        for row in self._load_fn():
+            uid = row['id']
+            users[uid] = row['role']
+            if row['supervisor_id'] is not None:
+                supervised.setdefault(row['supervisor_id'], []).append(uid)
+
+        authorized = {}
+        for uid, role in users.items():
+            if role == 'admin':
+                # Admin ve a sus supervisados Y a sí mismo
+                authorized[uid] = supervised.get(uid, []) + [uid]
+            else:
+                # Usuario regular solo se ve a sí mismo
+                authorized[uid] = [uid]
+
+        self._snapshot = (users, authorized)
+        self._loaded_at = time.monotonic()
+        self.rebuilds += 1
+        return self._snapshot
+
+    def _count(self, name):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _get_snapshot(self):
+        snapshot = self._fresh_snapshot()
+        if snapshot is not None:
+            self._count('hits')
+            return snapshot
+        with self._lock:
+            snapshot = self._fresh_snapshot()
+            if snapshot is not None:
+                self._count('hits')
+                return snapshot
+            self._count('misses')
+            return self._rebuild()
+
+    def authorized_ids(self, user_id):
+        """IDs de usuarios autorizados según jerarquía ([] si no existe)"""
+        _, authorized = self._get_snapshot()
+        return list(authorized.get(user_id, []))
+
+    def role(self, user_id):
+        users, _ = self._get_snapshot()
+        return users.get(user_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+    def stats(self):
+        snapshot = self._snapshot
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'rebuilds': self.rebuilds,
+            'users': len(snapshot[0]) if snapshot is not None else 0,
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if snapshot is not None else None,
+            'ttl': self.ttl,
+        }
@@ -0,0 +1,112 @@
+import calendar
+import threading
+import time
+from datetime import date, timedelta
+
+
+def nth_weekday(year, month, weekday, n):
+    """n-ésimo día de la semana del mes (weekday: 0=lunes ... 6=domingo)"""
+    first = date(year, month, 1)
+    offset = (weekday - first.weekday()) % 7
+    return first + timedelta(days=offset + 7 * (n - 1))
+
+
+def statutory_holidays(year):
+    """Días de descanso obligatorio (LFT art. 74) para un año: {fecha: nombre}"""
+    holidays = {
+        date(year, 1, 1): "Año Nuevo",
+        nth_weekday(year, 2, 0, 1): "Día de la Constitución",
+        nth_weekday(year, 3, 0, 3): "Natalicio de Benito Juárez",
+        date(year, 5, 1): "Día del Trabajo",
+        date(year, 9, 16): "Día de la Independencia",
+        nth_weekday(year, 11, 0, 3): "Día de la Revolución",
+        date(year, 12, 25): "Navidad",
+    }
+    # Transmisión del Poder Ejecutivo Federal: 1 de octubre desde 2024,
+    # antes 1 de diciembre, cada seis años
+    if year >= 2024 and (year - 2024) % 6 == 0:
+        holidays[date(year, 10, 1)] = "Transmisión del Poder Ejecutivo Federal"
+    elif year < 2024 and (year - 2018) % 6 == 0:
+        holidays[date(year, 12, 1)] = "Transmisión del Poder Ejecutivo Federal"
+    return holidays
+
+
+class HolidayCalendar:
+    """Calendario de feriados calculado localmente, memoizado por año.
+
+    load_overrides(year) devuelve filas con date, name e is_holiday de la tabla
+    holidays: is_holiday=True agrega un día, False quita uno de los de ley.
+    Si la carga falla se usan solo los de ley y no se memoiza el año.
+
+    Cada año se vuelve a cargar al expirar el TTL: invalidate() solo limpia el
+    proceso que lo llama, así los demás workers ven los ajustes manuales a lo
+    más ttl segundos después.
+    """
+
+    def __init__(self, load_overrides=None, ttl=300):
+        self._load_overrides = load_overrides
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # year -> ((holidays {fecha: nombre}, {mes: [días hábiles]}), cargado en)
+        self._years = {}
+
+    def _build_year(self, year):
+        holidays = statutory_holidays(year)
+        cacheable = True
+        if self._load_overrides:
+            try:
+                for row in self._load_overrides(year):
+                    if row['is_holiday']:
+                        holidays[row['date']] = row['name'] or "Día festivo"
+                    else:
+                        holidays.pop(row['date'], None)
+            except Exception as e:
+                print(f"Error cargando feriados manuales de {year}: {e}")
+                cacheable = False
+
+        business_days = {}
+        for month in range(1, 13):
+            num_days = calendar.monthrange(year, month)[1]
+            business_days[month] = [
+                date(year, month, d) for d in range(1, num_days + 1)
+                # 0=Monday, 5=Saturday, 6=Sunday
+                if date(year, month, d).weekday() < 5 and date(year, month, d) not in holidays
+            ]
+        return (dict(sorted(holidays.items())), business_days), cacheable
+
+    def _fresh(self, year):
+        entry = self._years.get(year)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def _year(self, year):
+        cached = self._fresh(year)
+        if cached is not None:
+            return cached
+        with self._lock:
+            cached = self._fresh(year)
+            if cached is not None:
+                return cached
+            data, cacheable = self._build_year(year)
+            if cacheable:
+                self._years[year] = (data, time.monotonic())
+            return data
+
+    def holidays(self, year):
+        """Fechas feriadas del año, ordenadas"""
+        return list(self._year(year)[0])
+
+    def holiday_names(self, year):
+        return dict(self._year(year)[0])
+
+    def business_days(self, year, month):
+        """Días hábiles (lunes a viernes sin feriados) del mes"""
+        return list(self._year(year)[1][month])
+
+    def invalidate(self, year=None):
+        with self._lock:
+            if year is None:
+                self._years.clear()
+            else:
+                self._years.pop(year, None)
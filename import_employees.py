@@ -0,0 +1,41 @@
+"""
+Importar colaboradores desde un XLSX (mismo proceso que POST /api/employees/import).
+Usa la base de DATABASE_URL.
+
+Uso: python import_employees.py <archivo.xlsx> [--dry-run]
+"""
+import sys
+
+from app import app, get_db_connection, run_employee_import
+from employee_import import EmployeeImportError
+
+def main():
+    args = [a for a in sys.argv[1:] if a != '--dry-run']
+    if len(args) != 1:
+        print(__doc__)
+        return 1
+    dry_run = '--dry-run' in sys.argv
+
+    with app.app_context():
+        conn = get_db_connection()
+        try:
+            with open(args[0], 'rb') as fileobj:
+                result = run_employee_import(conn, fileobj, dry_run=dry_run)
+        except EmployeeImportError as e:
+            print(f"Error: {e}")
+            return 1
+        finally:
+            conn.close()
+
+    print(f"Filas leídas:        {result['total']}")
+    print(f"Colaboradores nuevos: {result['inserted']}")
+    print(f"Actualizados:        {result['updated']}")
+    print(f"Sucursales creadas:  {result['branches_created']}")
+    for error in result['errors']:
+        print(f"  Fila {error['row']}: {error['message']}")
+    if dry_run:
+        print("Simulación (--dry-run): no se guardó nada.")
+    return 1 if result['errors'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Estatus de incidencias.
+
+La columna incidents.status guarda solo los códigos de INCIDENT_STATUSES. Los
+valores que se usaron antes ('pending', 'EN PROCESO', 'activa', 'resuelta',
+...) se traducen con normalize_incident_status: migrate_incident_status.py
+para las filas existentes y la API para lo que todavía llegue así.
+"""
+
+# Código -> etiqueta que muestra el dashboard
+INCIDENT_STATUSES = {
+    'en_proceso': 'EN PROCESO',
+    'sin_respuesta': 'SIN RESPUESTA',
+    'concluido': 'CONCLUIDO',
+}
+DEFAULT_INCIDENT_STATUS = 'en_proceso'
+
+# Las que cuentan como "incidencias activas" en dashboard y resumen: las
+# mismas que antes ('pending', 'in_progress', 'EN PROCESO' -> en_proceso)
+ACTIVE_INCIDENT_STATUSES = ('en_proceso',)
+
+LEGACY_INCIDENT_STATUSES = {
+    'pending': 'en_proceso',
+    'open': 'en_proceso',
+    'in_progress': 'en_proceso',
+    'activa': 'en_proceso',
+    'resolved': 'concluido',
+    'resuelta': 'concluido',
+}
+
+
+def normalize_incident_status(value):
+    """Código canónico de value (código, etiqueta o valor anterior); ValueError si no se reconoce"""
+    key = '_'.join(str(value or '').split()).lower()
+    if key in INCIDENT_STATUSES:
+        return key
+    if key in LEGACY_INCIDENT_STATUSES:
+        return LEGACY_INCIDENT_STATUSES[key]
+    raise ValueError(f'Estatus de incidencia inválido: {value!r}')
+
+
+def active_incident_clause(alias='i'):
+    """Predicado SQL de incidencias activas.
+
+    Va con literales (no parámetros) y en el mismo orden que el índice parcial
+    idx_incidents_active, para que el planner pueda usarlo.
+    """
+    codes = ', '.join(f"'{code}'" for code in ACTIVE_INCIDENT_STATUSES)
+    return f"{alias}.status IN ({codes})" if alias else f"status IN ({codes})"
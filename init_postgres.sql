@@ -1,6 +1,15 @@
 -- Script para inicializar PostgreSQL en Railway
 -- Ejecutar este script en Railway después de crear la base de datos
 
+-- Extensiones para la búsqueda de colaboradores sin acentos
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- unaccent() no es IMMUTABLE; este envoltorio sí se puede indexar
+CREATE OR REPLACE FUNCTION immutable_unaccent(value TEXT) RETURNS TEXT AS $$
+    SELECT public.unaccent('public.unaccent'::regdictionary, value)
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+
 -- Crear tablas
 CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
@@ -33,11 +42,12 @@ CREATE TABLE IF NOT EXISTS incidents (
     branch_id INTEGER REFERENCES branches(id) ON DELETE SET NULL,
     reported_by INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
     type VARCHAR(100) NOT NULL,
-    status VARCHAR(50) DEFAULT 'pending',
+    status VARCHAR(50) NOT NULL DEFAULT 'en_proceso' CHECK (status IN ('en_proceso', 'sin_respuesta', 'concluido')),
     description TEXT,
     start_date DATE,
     end_date DATE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE TABLE IF NOT EXISTS attendance_roster (
@@ -59,34 +69,117 @@ CREATE TABLE IF NOT EXISTS attendance (
     start_date DATE,
     end_date DATE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(employee_id, date)
 );
 
-CREATE TABLE IF NOT EXISTS reports (
-    id SERIAL PRIMARY KEY,
+-- Reporte mensual: un renglón por día (faltantes), guía o tablero (month 0-11)
+CREATE TABLE IF NOT EXISTS report_items (
     employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
-    month INTEGER NOT NULL,
     year INTEGER NOT NULL,
-    data TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    month INTEGER NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    item_key VARCHAR(10) NOT NULL,
+    status VARCHAR(50),
+    comment TEXT,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(employee_id, month, year)
+    PRIMARY KEY (employee_id, year, month, kind, item_key)
+);
+
+-- Vista con el formato anterior (data = {faltantes: {...}, guias: {...}, tableros: {...}})
+CREATE OR REPLACE VIEW reports AS
+SELECT employee_id, month, year,
+       '{"faltantes": {}, "guias": {}, "tableros": {}}'::jsonb || jsonb_object_agg(kind, items) AS data,
+       MAX(updated_at) AS updated_at
+FROM (
+    SELECT employee_id, month, year, kind,
+           jsonb_object_agg(item_key, jsonb_build_object('status', status, 'comment', comment)) AS items,
+           MAX(updated_at) AS updated_at
+    FROM report_items
+    GROUP BY employee_id, month, year, kind
+) by_kind
+GROUP BY employee_id, month, year;
+
+-- Conteos diarios por tutor/status (mantenidos por app.py, ver rebuild_attendance_counts.py)
+CREATE TABLE IF NOT EXISTS attendance_daily_counts (
+    tutor_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    date DATE NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tutor_id, date, status)
+);
+
+-- Días de vacaciones tomados por año de servicio (mantenido por app.py, ver rebuild_vacation_ledger.py)
+CREATE TABLE IF NOT EXISTS vacation_ledger (
+    employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    service_year INTEGER NOT NULL,
+    days_taken INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (employee_id, service_year)
+);
+
+-- Cola de evaluación de retardos acumulados (alert_worker.py)
+CREATE TABLE IF NOT EXISTS alert_jobs (
+    id SERIAL PRIMARY KEY,
+    employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    latest_date DATE NOT NULL,
+    requested_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_at TIMESTAMP,
+    last_error TEXT,
+    UNIQUE (employee_id, year, month)
+);
+
+-- Ajustes manuales al calendario de feriados de ley (holidays_mx.py)
+CREATE TABLE IF NOT EXISTS holidays (
+    date DATE PRIMARY KEY,
+    name VARCHAR(200),
+    is_holiday BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Reportes XLSX generados en segundo plano (report_jobs.py)
+CREATE TABLE IF NOT EXISTS report_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    params_key VARCHAR(64) NOT NULL,
+    report_type VARCHAR(50) NOT NULL,
+    params TEXT NOT NULL,
+    requested_by INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    progress INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    file_name VARCHAR(200),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    expires_at TIMESTAMP
 );
+CREATE UNIQUE INDEX IF NOT EXISTS idx_report_jobs_inflight ON report_jobs(params_key) WHERE status IN ('queued', 'running');
 
 -- Crear índices
 CREATE INDEX IF NOT EXISTS idx_users_supervisor ON users(supervisor_id);
 CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
 CREATE INDEX IF NOT EXISTS idx_employees_branch ON employees(branch_id);
 CREATE INDEX IF NOT EXISTS idx_employees_status ON employees(status);
+CREATE INDEX IF NOT EXISTS idx_employees_name_trgm ON employees USING gin (immutable_unaccent(lower(full_name)) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_employees_name_id ON employees(full_name, id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_employees_name_lower ON employees(lower(full_name));
 CREATE INDEX IF NOT EXISTS idx_incidents_branch ON incidents(branch_id);
 CREATE INDEX IF NOT EXISTS idx_incidents_reporter ON incidents(reported_by);
 CREATE INDEX IF NOT EXISTS idx_incidents_status ON incidents(status);
+CREATE INDEX IF NOT EXISTS idx_incidents_created ON incidents(created_at);
+CREATE INDEX IF NOT EXISTS idx_incidents_created_id ON incidents(created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_incidents_active ON incidents(reported_by, created_at DESC) WHERE status IN ('en_proceso');
 CREATE INDEX IF NOT EXISTS idx_roster_added_by ON attendance_roster(added_by_user_id);
 CREATE INDEX IF NOT EXISTS idx_attendance_employee ON attendance(employee_id);
 CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance(date);
 CREATE INDEX IF NOT EXISTS idx_attendance_status ON attendance(status);
-CREATE INDEX IF NOT EXISTS idx_reports_employee ON reports(employee_id);
-CREATE INDEX IF NOT EXISTS idx_reports_month_year ON reports(month, year);
+CREATE INDEX IF NOT EXISTS idx_attendance_employee_date ON attendance(employee_id, date);
+CREATE INDEX IF NOT EXISTS idx_attendance_status_date ON attendance(status, date);
+CREATE INDEX IF NOT EXISTS idx_report_items_period ON report_items(year, month, employee_id);
 
 -- Insertar datos iniciales
 INSERT INTO branches (name, location) VALUES 
@@ -0,0 +1,86 @@
+import os
+import psycopg2
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from incident_status import (
+    DEFAULT_INCIDENT_STATUS, INCIDENT_STATUSES, active_incident_clause, normalize_incident_status,
+)
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+def migrate_incident_status():
+    """Pasar incidents.status a los códigos de incident_status.py.
+
+    Traduce los valores anteriores ('pending', 'EN PROCESO', 'activa', ...),
+    deja un CHECK con los códigos válidos y crea el índice parcial de
+    incidencias activas. Si aparece un valor desconocido no se cambia nada.
+    """
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT status, COUNT(*) FROM incidents GROUP BY status")
+        mapping, unknown = [], []
+        for status, count in cursor.fetchall():
+            if status is None:
+                mapping.append((None, DEFAULT_INCIDENT_STATUS))
+                continue
+            try:
+                code = normalize_incident_status(status)
+            except ValueError:
+                unknown.append(f"{status!r} ({count})")
+                continue
+            if code != status:
+                mapping.append((status, code))
+                print(f"  {status!r} -> {code!r} ({count} incidencias)")
+
+        if unknown:
+            print(f"Estatus sin traducción: {', '.join(unknown)}")
+            print("Agréguelos a LEGACY_INCIDENT_STATUSES en incident_status.py y vuelva a correr.")
+            conn.rollback()
+            return
+
+        if mapping:
+            print("Traduciendo estatus...")
+            psycopg2.extras.execute_values(cursor, """
+                UPDATE incidents i SET status = m.code
+                FROM (VALUES %s) AS m(old_status, code)
+                WHERE i.status IS NOT DISTINCT FROM m.old_status
+            """, mapping, template="(%s::varchar, %s::varchar)")
+
+        print("Agregando restricción de estatus...")
+        codes = ', '.join(f"'{code}'" for code in INCIDENT_STATUSES)
+        cursor.execute(f"""
+            ALTER TABLE incidents
+                ALTER COLUMN status SET DEFAULT '{DEFAULT_INCIDENT_STATUS}',
+                ALTER COLUMN status SET NOT NULL,
+                DROP CONSTRAINT IF EXISTS incidents_status_check,
+                ADD CONSTRAINT incidents_status_check CHECK (status IN ({codes}))
+        """)
+        conn.commit()
+
+        # CREATE INDEX CONCURRENTLY no puede correr dentro de una transacción
+        conn.autocommit = True
+        print("Creando índice idx_incidents_active...")
+        cursor.execute(f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_incidents_active
+            ON incidents(reported_by, created_at DESC) WHERE {active_incident_clause(None)}
+        """)
+        cursor.execute("ANALYZE incidents")
+        print("Migración completada.")
+    except Exception as e:
+        print(f"Error en migración: {e}")
+        if not conn.autocommit:
+            conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_incident_status()
@@ -0,0 +1,109 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+REPORT_ITEMS_DDL = """
+    CREATE TABLE IF NOT EXISTS report_items (
+        employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        item_key VARCHAR(10) NOT NULL,
+        status VARCHAR(50),
+        comment TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (employee_id, year, month, kind, item_key)
+    );
+    CREATE INDEX IF NOT EXISTS idx_report_items_period ON report_items(year, month, employee_id);
+"""
+
+REPORTS_VIEW_DDL = """
+    CREATE OR REPLACE VIEW reports AS
+    SELECT employee_id, month, year,
+           '{"faltantes": {}, "guias": {}, "tableros": {}}'::jsonb || jsonb_object_agg(kind, items) AS data,
+           MAX(updated_at) AS updated_at
+    FROM (
+        SELECT employee_id, month, year, kind,
+               jsonb_object_agg(item_key, jsonb_build_object('status', status, 'comment', comment)) AS items,
+               MAX(updated_at) AS updated_at
+        FROM report_items
+        GROUP BY employee_id, month, year, kind
+    ) by_kind
+    GROUP BY employee_id, month, year;
+"""
+
+def migrate_report_items():
+    """Pasar los blobs de reports.data a renglones de report_items.
+
+    La tabla reports se renombra a reports_blobs (respaldo) y en su lugar queda
+    una vista con el mismo formato, así GET /api/reports y /api/reports/data
+    siguen funcionando igual.
+    """
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT table_type FROM information_schema.tables WHERE table_name = 'reports'")
+        row = cursor.fetchone()
+        if row and row[0] == 'VIEW':
+            print("reports ya es una vista sobre report_items, nada que hacer.")
+            return
+
+        print("Creando tabla report_items...")
+        cursor.execute(REPORT_ITEMS_DDL)
+
+        if row:
+            # Igual que migrate_reports_jsonb.py: un blob inválido no aborta la migración
+            cursor.execute("""
+                CREATE FUNCTION pg_temp.try_jsonb(value TEXT) RETURNS JSONB AS $$
+                BEGIN
+                    IF value IS NULL OR btrim(value) = '' THEN
+                        RETURN NULL;
+                    END IF;
+                    RETURN value::jsonb;
+                EXCEPTION WHEN others THEN
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql IMMUTABLE;
+            """)
+
+            print("Copiando renglones de los reportes existentes...")
+            cursor.execute("""
+                INSERT INTO report_items (employee_id, year, month, kind, item_key, status, comment, updated_at)
+                SELECT r.employee_id, r.year, r.month, kinds.key, items.key,
+                       items.value->>'status', items.value->>'comment',
+                       COALESCE(r.updated_at, CURRENT_TIMESTAMP)
+                FROM reports r
+                CROSS JOIN LATERAL jsonb_each(pg_temp.try_jsonb(r.data::text)) kinds
+                CROSS JOIN LATERAL jsonb_each(
+                    CASE WHEN jsonb_typeof(kinds.value) = 'object' THEN kinds.value ELSE '{}'::jsonb END
+                ) items
+                WHERE jsonb_typeof(pg_temp.try_jsonb(r.data::text)) = 'object'
+                AND jsonb_typeof(items.value) = 'object'
+                ON CONFLICT (employee_id, year, month, kind, item_key) DO NOTHING
+            """)
+            print(f"  {cursor.rowcount} renglones copiados")
+
+            print("Respaldando tabla reports como reports_blobs...")
+            cursor.execute("ALTER TABLE reports RENAME TO reports_blobs")
+
+        print("Creando vista reports...")
+        cursor.execute(REPORTS_VIEW_DDL)
+        conn.commit()
+        print("Migración completada.")
+    except Exception as e:
+        print(f"Error en migración: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_report_items()
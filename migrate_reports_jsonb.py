@@ -0,0 +1,61 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+def migrate_reports_jsonb():
+    """Convertir reports.data de TEXT a JSONB (los blobs inválidos quedan en NULL)"""
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'reports' AND column_name = 'data'
+        """)
+        row = cursor.fetchone()
+        if row and row[0] == 'jsonb':
+            print("reports.data ya es JSONB, nada que hacer.")
+            return
+
+        # Conversión tolerante: un blob que no es JSON válido no aborta la migración
+        cursor.execute("""
+            CREATE FUNCTION pg_temp.try_jsonb(value TEXT) RETURNS JSONB AS $$
+            BEGIN
+                IF value IS NULL OR btrim(value) = '' THEN
+                    RETURN NULL;
+                END IF;
+                RETURN value::jsonb;
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql IMMUTABLE;
+        """)
+
+        cursor.execute("""
+            SELECT id, LEFT(data, 80) FROM reports
+            WHERE data IS NOT NULL AND btrim(data) <> '' AND pg_temp.try_jsonb(data) IS NULL
+        """)
+        invalid = cursor.fetchall()
+        for report_id, preview in invalid:
+            print(f"  Reporte {report_id} con JSON inválido, queda en NULL: {preview!r}")
+
+        print("Convirtiendo reports.data a JSONB...")
+        cursor.execute("ALTER TABLE reports ALTER COLUMN data TYPE JSONB USING pg_temp.try_jsonb(data)")
+        conn.commit()
+        print(f"Migración completada ({len(invalid)} reportes inválidos en NULL).")
+    except Exception as e:
+        print(f"Error en migración: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    migrate_reports_jsonb()
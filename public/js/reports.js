@@ -138,6 +138,13 @@ async function loadReportes() {
     await fetchAndRenderReports();
 }
 
+// Datos del mes en pantalla: los cambios se aplican aquí y se re-dibuja sin volver a pedirlos
+let reportsState = null; // { month, year, employees, holidays }
+
+function emptyReportData() {
+    return { faltantes: {}, guias: {}, tableros: {} };
+}
+
 async function fetchAndRenderReports() {
     try {
         const userStr = sessionStorage.getItem('user');
@@ -154,20 +161,38 @@ async function fetchAndRenderReports() {
 
         // Backend devuelve 'employees', no 'data'
         if (!result.success || !result.employees || result.employees.length === 0) {
+            reportsState = null;
             document.getElementById('reportsBody').innerHTML = '<tr><td style="padding: 2rem; text-align: center;">No hay colaboradores en la lista. Agrega colaboradores en la sección de Asistencias primero.</td></tr>';
             return;
         }
 
+        // Parse existing data
+        result.employees.forEach(emp => {
+            emp.reportData = emp.report_data ? JSON.parse(emp.report_data) : emptyReportData();
+        });
+        reportsState = { month: currentMonth, year: currentYear, employees: result.employees, holidays };
+        // Cambios aún no confirmados por el servidor
+        pendingReportChanges.forEach(applyReportChange);
+        renderReports();
+    } catch (e) {
+        console.error(e);
+        document.getElementById('reportsBody').innerHTML = '<tr><td style="padding:2rem;">Error cargando datos.</td></tr>';
+    }
+}
+
+function renderReports() {
+    if (!reportsState) return;
+    const { employees, holidays } = reportsState;
+    try {
         const daysInMonth = new Date(currentYear, currentMonth + 1, 0).getDate();
         let html = '';
         const branches = new Set();
 
-        result.employees.forEach(emp => {
+        employees.forEach(emp => {
             if (emp.branch_name) branches.add(emp.branch_name);
             const branchAttr = `data-branch="${emp.branch_name || ''}"`;
 
-            // Parse existing data
-            const reportData = emp.report_data ? JSON.parse(emp.report_data) : { faltantes: {}, guias: {}, tableros: {} };
+            const reportData = emp.reportData;
 
             // --- ROW 1: Employee Header ---
             html += `
@@ -376,37 +401,107 @@ function closeReportComment(save) {
     pendingAction = null;
 }
 
-async function saveReportUpdate(type, empId, key, status, comment) {
-    try {
-        await fetch(`${API_BASE_URL}/reports`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                employee_id: empId,
-                month: currentMonth,
-                year: currentYear,
-                type: type,
-                key: key,
-                status: status,
-                comment: comment
-            })
-        });
-        fetchAndRenderReports(); // Optimize: Local update? For now full refresh is safer
-    } catch (e) {
-        console.error(e);
-        showToast('Error al guardar cambio', 'error');
+// --- Guardado por lotes ---
+// Cada clic se aplica en pantalla y se encola; los cambios se mandan juntos a
+// /reports/batch REPORT_FLUSH_DELAY ms después del último clic.
+const REPORT_FLUSH_DELAY = 800;
+let pendingReportChanges = [];
+let reportFlushTimer = null;
+let reportFlushInFlight = null;
+
+function applyReportChange(change) {
+    if (!reportsState || reportsState.month !== change.month || reportsState.year !== change.year) return;
+    const emp = reportsState.employees.find(e => e.id === change.employee_id);
+    if (!emp) return;
+    const section = emp.reportData[change.type] || (emp.reportData[change.type] = {});
+    if (change.status === 'empty') {
+        delete section[change.key];
+    } else {
+        section[change.key] = { status: change.status, comment: change.comment };
     }
 }
 
+function saveReportUpdate(type, empId, key, status, comment) {
+    const change = {
+        employee_id: empId,
+        month: currentMonth,
+        year: currentYear,
+        type: type,
+        key: String(key),
+        status: status,
+        comment: comment
+    };
+    // Solo cuenta el último cambio de cada celda
+    pendingReportChanges = pendingReportChanges.filter(c => !(
+        c.employee_id === change.employee_id && c.month === change.month && c.year === change.year &&
+        c.type === change.type && c.key === change.key
+    ));
+    pendingReportChanges.push(change);
+    applyReportChange(change);
+    renderReports();
+
+    clearTimeout(reportFlushTimer);
+    reportFlushTimer = setTimeout(flushReportChanges, REPORT_FLUSH_DELAY);
+}
+
+async function flushReportChanges() {
+    clearTimeout(reportFlushTimer);
+    reportFlushTimer = null;
+    // Un lote a la vez: lo que llegue mientras tanto sale en el siguiente
+    if (reportFlushInFlight) await reportFlushInFlight;
+    if (pendingReportChanges.length === 0) return;
+
+    const changes = pendingReportChanges;
+    pendingReportChanges = [];
+    reportFlushInFlight = (async () => {
+        try {
+            const res = await fetch(`${API_BASE_URL}/reports/batch`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ changes })
+            });
+            const result = await res.json();
+            if (!result.success) throw new Error(result.message || 'Error al guardar');
+
+            // Documentos del servidor + cambios que siguen en cola
+            (result.reports || []).forEach(rep => {
+                if (!reportsState || reportsState.month !== rep.month || reportsState.year !== rep.year) return;
+                const emp = reportsState.employees.find(e => e.id === rep.employee_id);
+                if (emp) emp.reportData = rep.data || emptyReportData();
+            });
+            pendingReportChanges.forEach(applyReportChange);
+            renderReports();
+        } catch (e) {
+            console.error(e);
+            showToast('Error al guardar cambio', 'error');
+            fetchAndRenderReports(); // Volver a lo que tiene el servidor
+        } finally {
+            reportFlushInFlight = null;
+        }
+    })();
+    await reportFlushInFlight;
+}
+
+// Si se cierra la pestaña con cambios en cola, mandarlos de todos modos
+window.addEventListener('pagehide', () => {
+    if (pendingReportChanges.length === 0) return;
+    const body = new Blob([JSON.stringify({ changes: pendingReportChanges })], { type: 'application/json' });
+    if (navigator.sendBeacon(`${API_BASE_URL}/reports/batch`, body)) {
+        pendingReportChanges = [];
+    }
+});
+
 // Load specific month data
-function loadReportsMonthData(month, year) {
+async function loadReportsMonthData(month, year) {
+    await flushReportChanges();
     currentMonth = month;
     currentYear = year;
     loadReportes();
 }
 
 // Load current month
-function loadCurrentReportsMonth() {
+async function loadCurrentReportsMonth() {
+    await flushReportChanges();
     const today = new Date();
     currentMonth = today.getMonth();
     currentYear = today.getFullYear();
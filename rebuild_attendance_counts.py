@@ -0,0 +1,51 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+def rebuild_attendance_counts():
+    """Crear (si falta) y recalcular desde cero attendance_daily_counts"""
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        print("Creando tabla attendance_daily_counts...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS attendance_daily_counts (
+                tutor_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                date DATE NOT NULL,
+                status VARCHAR(50) NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (tutor_id, date, status)
+            );
+        """)
+
+        # Bloquear escrituras de asistencia/roster mientras se recalcula
+        cursor.execute("LOCK TABLE attendance, attendance_roster IN SHARE MODE")
+        cursor.execute("DELETE FROM attendance_daily_counts")
+        cursor.execute("""
+            INSERT INTO attendance_daily_counts (tutor_id, date, status, count)
+            SELECT ar.added_by_user_id, a.date, a.status, COUNT(*)
+            FROM attendance a
+            JOIN attendance_roster ar ON a.employee_id = ar.employee_id
+            WHERE ar.added_by_user_id IS NOT NULL
+            GROUP BY ar.added_by_user_id, a.date, a.status
+        """)
+        rows = cursor.rowcount
+        conn.commit()
+        print(f"Contadores recalculados: {rows} filas.")
+    except Exception as e:
+        print(f"Error recalculando contadores: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    rebuild_attendance_counts()
@@ -0,0 +1,56 @@
+import os
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL')
+
+def rebuild_vacation_ledger():
+    """Crear (si falta) y recalcular desde cero vacation_ledger"""
+    if not DATABASE_URL:
+        print("DATABASE_URL no encontrada en .env")
+        return
+
+    conn = psycopg2.connect(DATABASE_URL)
+    cursor = conn.cursor()
+
+    try:
+        print("Creando tabla vacation_ledger...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS vacation_ledger (
+                employee_id INTEGER NOT NULL REFERENCES employees(id) ON DELETE CASCADE,
+                service_year INTEGER NOT NULL,
+                days_taken INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (employee_id, service_year)
+            );
+        """)
+
+        # Bloquear escrituras de asistencia/empleados mientras se recalcula
+        cursor.execute("LOCK TABLE attendance, employees IN SHARE MODE")
+        cursor.execute("DELETE FROM vacation_ledger")
+        # Año de servicio = años cumplidos a la fecha (igual que service_year_sql en app.py)
+        cursor.execute("""
+            INSERT INTO vacation_ledger (employee_id, service_year, days_taken)
+            SELECT e.id,
+                   CASE WHEN e.hire_date IS NULL OR a.date < e.hire_date THEN 0
+                        ELSE date_part('year', age(a.date, e.hire_date))::int END,
+                   COUNT(*)
+            FROM attendance a
+            JOIN employees e ON e.id = a.employee_id
+            WHERE a.status = 'vacation'
+            AND EXTRACT(ISODOW FROM a.date) < 6
+            GROUP BY 1, 2
+        """)
+        rows = cursor.rowcount
+        conn.commit()
+        print(f"Saldos recalculados: {rows} filas.")
+    except Exception as e:
+        print(f"Error recalculando saldos de vacaciones: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    rebuild_vacation_ledger()
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+class ReportCache:
+    """Caché en disco de los XLSX generados por /api/reports/*.
+
+    La llave combina tipo de reporte, mes, año, usuario que lo pide, filtros y
+    un token de versión de los datos: si los datos cambian el token cambia y la
+    entrada vieja simplemente deja de usarse hasta que la expulsa el LRU.
+
+    El orden LRU es el mtime de cada archivo (un acierto lo actualiza), así
+    varios workers de gunicorn pueden compartir el mismo directorio.
+    """
+
+    SUFFIX = '.xlsx'
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # max_bytes=0 deshabilita la caché
+        self.enabled = max_bytes > 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(report_type, year, month, scope, filters, version):
+        """Llave estable (sha256) a partir de los parámetros del reporte"""
+        raw = json.dumps([report_type, year, month, scope, filters, version], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def open(self, key):
+        """Archivo abierto del reporte en caché, o None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            # Se abre antes de tocarlo: aunque otro worker lo expulse, el
+            # descriptor sigue siendo válido
+            fileobj = open(path, 'rb')
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return fileobj
+
+    def store(self, key, write_fn):
+        """Guardar el reporte con write_fn(fileobj) y devolverlo abierto para lectura.
+
+        Se escribe a un temporal en el mismo directorio y se renombra, así
+        nadie lee un archivo a medias. Sin llave o con la caché deshabilitada
+        devuelve un TemporaryFile.
+        """
+        if key is None or not self.enabled:
+            output = tempfile.TemporaryFile(suffix=self.SUFFIX)
+            write_fn(output)
+            output.seek(0)
+            return output
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                write_fn(tmp)
+            path = self._path(key)
+            os.replace(tmp_path, path)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        fileobj = open(path, 'rb')
+        self.stores += 1
+        self._evict()
+        return fileobj
+
+    def _entries(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(self.SUFFIX) and entry.is_file():
+                        st = entry.stat()
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _evict(self):
+        """Borrar los menos usados hasta quedar dentro de max_bytes"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except OSError:
+                    pass
+                total -= size
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        entries = self._entries() if self.enabled else []
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'files': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes,
+        }
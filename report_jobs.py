@@ -0,0 +1,223 @@
+import json
+import os
+import shutil
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+REPORT_JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS report_jobs (
+        id VARCHAR(32) PRIMARY KEY,
+        params_key VARCHAR(64) NOT NULL,
+        report_type VARCHAR(50) NOT NULL,
+        params TEXT NOT NULL,
+        requested_by INTEGER REFERENCES users(id) ON DELETE CASCADE,
+        status VARCHAR(20) NOT NULL DEFAULT 'queued',
+        progress INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        file_name VARCHAR(200),
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP,
+        expires_at TIMESTAMP
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_report_jobs_inflight
+        ON report_jobs(params_key) WHERE status IN ('queued', 'running');
+"""
+
+JOB_COLUMNS = """
+    id, report_type, params, requested_by, status, progress, error, file_name,
+    created_at, updated_at, finished_at, expires_at
+"""
+
+
+class ReportJobQueue:
+    """Reportes XLSX generados en segundo plano, con estado en la tabla report_jobs.
+
+    - submit() registra el trabajo y lo manda a un pool de hilos acotado
+      (workers); si ya hay uno en cola/corriendo con los mismos parámetros
+      (params_key) devuelve ese en lugar de crear otro.
+    - El estado y el progreso viven en la base, así cualquier worker de
+      gunicorn puede responder el polling; el archivo queda en directory.
+    - Los archivos terminados caducan a los ttl segundos. Un trabajo sin
+      avance en stale_after segundos (proceso reiniciado) se marca con error.
+
+    runner(conn, report_type, params, progress) genera el reporte y devuelve
+    (archivo abierto, nombre de descarga); progress(pct) actualiza el avance.
+    """
+
+    def __init__(self, get_connection, runner, directory, workers=2, ttl=3600, stale_after=900):
+        self._get_connection = get_connection
+        self._runner = runner
+        self.directory = directory
+        self.workers = workers
+        self.ttl = ttl
+        self.stale_after = stale_after
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _pool(self):
+        with self._lock:
+            # Los hilos no sobreviven a un fork: se crea otro pool en el hijo
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='report-job')
+                self._pid = os.getpid()
+            return self._executor
+
+    def path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.xlsx')
+
+    # ---------- API ----------
+
+    def submit(self, report_type, params, params_key, requested_by):
+        """Encolar un reporte; devuelve (trabajo, creado). creado=False si se reutilizó uno en curso"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            self._expire(cursor)
+            job = self._in_flight(cursor, params_key)
+            if job is None:
+                cursor.execute(f"""
+                    INSERT INTO report_jobs (id, params_key, report_type, params, requested_by)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (params_key) WHERE status IN ('queued', 'running') DO NOTHING
+                    RETURNING {JOB_COLUMNS}
+                """, (uuid.uuid4().hex, params_key, report_type, json.dumps(params), requested_by))
+                row = cursor.fetchone()
+                created = row is not None
+                # Otra petición igual ganó la carrera: usar la suya
+                job = dict(row) if created else self._in_flight(cursor, params_key)
+            else:
+                created = False
+            conn.commit()
+        finally:
+            conn.close()
+
+        if created:
+            self.submitted += 1
+            self._pool().submit(self._run, job['id'])
+        else:
+            self.deduplicated += 1
+        return job, created
+
+    def get(self, job_id):
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            self._expire(cursor)
+            conn.commit()
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM report_jobs WHERE id = %s", (job_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def open_file(self, job):
+        """Archivo del trabajo terminado, o None si ya no existe"""
+        try:
+            return open(self.path(job['id']), 'rb')
+        except OSError:
+            return None
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'deduplicated': self.deduplicated,
+            'completed': self.completed,
+            'failed': self.failed,
+            'workers': self.workers,
+        }
+
+    # ---------- internos ----------
+
+    def _in_flight(self, cursor, params_key):
+        cursor.execute(f"""
+            SELECT {JOB_COLUMNS} FROM report_jobs
+            WHERE params_key = %s AND status IN ('queued', 'running')
+        """, (params_key,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+    def _expire(self, cursor):
+        """Marcar trabajos colgados y borrar los caducados (fila y archivo)"""
+        cursor.execute("""
+            UPDATE report_jobs
+            SET status = 'error', error = 'El trabajo se interrumpió', updated_at = CURRENT_TIMESTAMP,
+                finished_at = CURRENT_TIMESTAMP, expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+            WHERE status IN ('queued', 'running')
+            AND updated_at < CURRENT_TIMESTAMP - %s * INTERVAL '1 second'
+        """, (self.ttl, self.stale_after))
+        cursor.execute("DELETE FROM report_jobs WHERE expires_at < CURRENT_TIMESTAMP RETURNING id")
+        for row in cursor.fetchall():
+            try:
+                os.remove(self.path(row['id']))
+            except OSError:
+                pass
+
+    def _set_progress(self, conn, job_id, pct):
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE report_jobs SET progress = %s, updated_at = CURRENT_TIMESTAMP WHERE id = %s",
+            (pct, job_id)
+        )
+        conn.commit()
+
+    def _run(self, job_id):
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        tmp_path = self.path(job_id) + '.tmp'
+        try:
+            cursor.execute("""
+                UPDATE report_jobs
+                SET status = 'running', progress = 10, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND status = 'queued'
+                RETURNING report_type, params
+            """, (job_id,))
+            job = cursor.fetchone()
+            conn.commit()
+            if job is None:
+                return
+
+            fileobj, download_name = self._runner(
+                conn, job['report_type'], json.loads(job['params']),
+                lambda pct: self._set_progress(conn, job_id, pct)
+            )
+            os.makedirs(self.directory, exist_ok=True)
+            with fileobj, open(tmp_path, 'wb') as out:
+                shutil.copyfileobj(fileobj, out)
+            os.replace(tmp_path, self.path(job_id))
+
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE report_jobs
+                SET status = 'done', progress = 100, file_name = %s, updated_at = CURRENT_TIMESTAMP,
+                    finished_at = CURRENT_TIMESTAMP, expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE id = %s
+            """, (download_name, self.ttl, job_id))
+            conn.commit()
+            self.completed += 1
+        except Exception as e:
+            conn.rollback()
+            self.failed += 1
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            print(f"Error generando reporte en segundo plano (job {job_id}): {e}")
+            traceback.print_exc()
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE report_jobs
+                SET status = 'error', error = %s, updated_at = CURRENT_TIMESTAMP,
+                    finished_at = CURRENT_TIMESTAMP, expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 second'
+                WHERE id = %s
+            """, (getattr(e, 'message', str(e)), self.ttl, job_id))
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,144 @@
+import itertools
+import tempfile
+
+from flask import send_file
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+_cursor_ids = itertools.count(1)
+
+
+class ReportError(Exception):
+    """Error esperado al generar un reporte (se responde con status)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+_THIN = Side(style='thin')
+_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+_CENTER = Alignment(horizontal='center')
+_CENTER_BOTH = Alignment(horizontal='center', vertical='center')
+
+
+def _solid(color):
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+class ReportBook:
+    """Libro XLSX en modo write_only para los reportes de /api/reports/*.
+
+    Las filas se escriben a disco conforme se agregan (openpyxl no guarda
+    las celdas en memoria) y los estilos son NamedStyle registrados una vez
+    por libro; cada celda solo referencia el nombre.
+    """
+
+    def __init__(self):
+        self.wb = Workbook(write_only=True)
+        self._styles = set()
+
+    def _style(self, name, **attrs):
+        if name not in self._styles:
+            self.wb.add_named_style(NamedStyle(name=name, **attrs))
+            self._styles.add(name)
+        return name
+
+    @property
+    def cell_style(self):
+        """Celda de datos con borde delgado"""
+        return self._style('report_cell', border=_BORDER)
+
+    def header_style(self, color, size=12):
+        return self._style(f'report_header_{color}_{size}', fill=_solid(color),
+                           font=Font(bold=True, color="FFFFFF", size=size),
+                           alignment=_CENTER_BOTH, border=_BORDER)
+
+    def badge_style(self, color):
+        """Celda de estado: fondo de color, texto blanco en negritas"""
+        return self._style(f'report_badge_{color}', fill=_solid(color),
+                           font=Font(color="FFFFFF", bold=True),
+                           alignment=_CENTER, border=_BORDER)
+
+    def fill_style(self, color):
+        """Celda de datos con fondo de color"""
+        return self._style(f'report_fill_{color}', fill=_solid(color), border=_BORDER)
+
+    def sheet(self, title, headers, header_color, widths=None, banner=None, header_size=12):
+        """Crear hoja con título opcional (fila 1 combinada) y encabezados.
+
+        widths: anchos por columna en orden; None deja el ancho por omisión.
+        """
+        ws = self.wb.create_sheet(title)
+        # En modo write_only los anchos y celdas combinadas van antes de las filas
+        for idx, width in enumerate(widths or [], 1):
+            if width:
+                ws.column_dimensions[get_column_letter(idx)].width = width
+
+        sheet = ReportSheet(self, ws)
+        if banner:
+            ws.merged_cells.add(f'A1:{get_column_letter(len(headers))}1')
+            sheet.append([banner], style=self._style(
+                'report_banner', font=Font(bold=True, size=14), alignment=_CENTER))
+            sheet.append([])
+        sheet.append(headers, style=self.header_style(header_color, header_size))
+        return sheet
+
+    def save(self, fileobj):
+        self.wb.save(fileobj)
+
+    def to_response(self, download_name):
+        """Guardar en un archivo temporal y enviarlo por bloques"""
+        output = tempfile.TemporaryFile(suffix='.xlsx')
+        try:
+            self.save(output)
+            output.seek(0)
+        except Exception:
+            output.close()
+            raise
+        return send_report(output, download_name)
+
+
+def send_report(fileobj, download_name):
+    """Enviar un XLSX abierto; send_file lo cierra al terminar la respuesta"""
+    return send_file(fileobj, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=download_name)
+
+
+class ReportSheet:
+    """Hoja de un ReportBook; append() escribe una fila completa"""
+
+    def __init__(self, book, ws):
+        self.book = book
+        self.ws = ws
+        self.rows = 0
+
+    def append(self, values, styles=None, style=None):
+        """Agregar fila con el estilo style (por omisión, datos con borde).
+
+        styles: {columna (1..n): nombre de estilo} para las celdas que cambian.
+        """
+        style = style or self.book.cell_style
+        cells = []
+        for col, value in enumerate(values, 1):
+            cell = WriteOnlyCell(self.ws, value)
+            cell.style = styles.get(col, style) if styles else style
+            cells.append(cell)
+        self.ws.append(cells)
+        self.rows += 1
+
+
+def iter_query(conn, sql, params=None, itersize=2000):
+    """Recorrer un SELECT con cursor del lado del servidor (bloques de itersize filas)"""
+    cursor = conn.cursor(name=f'report_export_{next(_cursor_ids)}')
+    cursor.itersize = itersize
+    try:
+        cursor.execute(sql, params)
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
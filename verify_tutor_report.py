@@ -0,0 +1,116 @@
+"""
+Compara las cifras del reporte de tutores (GET /api/reports/tutors):
+la versión anterior (4 consultas por tutor, blobs JSON de la vista reports)
+contra compute_tutor_report_rows (consultas agrupadas sobre report_items). Usa la base de DATABASE_URL y no escribe nada.
+
+Uso: python verify_tutor_report.py <año> <mes 1-12> [supervisor_id]
+"""
+import sys
+import time
+
+from app import app, get_db_connection, get_report_context, month_range_clause, \
+    load_report_data, compute_tutor_report_rows
+
+def is_report_complete(report_data, business_days):
+    """Reporte lleno: todos los días hábiles, 2 guías y 4 tableros con algún status"""
+    try:
+        data = load_report_data(report_data)
+        faltantes = data.get('faltantes', {})
+        for b_day in business_days:
+            if not faltantes.get(str(b_day.day), {}).get('status'):
+                return False
+        guias = data.get('guias', {})
+        for k in ['1', '2']:
+            if not guias.get(k, {}).get('status'):
+                return False
+        tableros = data.get('tableros', {})
+        for k in ['1', '2', '3', '4']:
+            if not tableros.get(k, {}).get('status'):
+                return False
+        return True
+    except Exception:
+        return False
+
+def legacy_tutor_rows(cursor, tutors, business_days, target_year, target_month):
+    month_sql, month_params = month_range_clause('date', target_year, target_month)
+    incident_month_sql, _ = month_range_clause('i.created_at', target_year, target_month)
+    rows = []
+    for tutor in tutors:
+        cursor.execute("SELECT employee_id FROM attendance_roster WHERE added_by_user_id = %s", (tutor['id'],))
+        collabs = [r['employee_id'] for r in cursor.fetchall()]
+        num_collabs = len(collabs)
+
+        filled_slots = 0
+        complete_reports_count = 0
+        if collabs:
+            placeholders = ','.join(['%s' for _ in collabs])
+            cursor.execute(f"""
+                SELECT employee_id, date, status FROM attendance
+                WHERE employee_id IN ({placeholders})
+                AND {month_sql}
+            """, collabs + month_params)
+            att_map = {(rec['employee_id'], rec['date']): rec['status'] for rec in cursor.fetchall()}
+            for cid in collabs:
+                for b_day in business_days:
+                    if att_map.get((cid, b_day)):
+                        filled_slots += 1
+
+            cursor.execute(f"""
+                SELECT employee_id, data as report_data FROM reports
+                WHERE employee_id IN ({placeholders})
+                AND month = %s AND year = %s
+            """, collabs + [target_month - 1, target_year])
+            report_records = {r['employee_id']: r['report_data'] for r in cursor.fetchall()}
+            for cid in collabs:
+                rep_data_str = report_records.get(cid)
+                if rep_data_str and is_report_complete(rep_data_str, business_days):
+                    complete_reports_count += 1
+
+        cursor.execute(f"""
+            SELECT COUNT(*) as count FROM incidents i
+            JOIN attendance_roster ar ON i.reported_by = ar.employee_id
+            WHERE ar.added_by_user_id = %s
+            AND {incident_month_sql}
+        """, [tutor['id']] + month_params)
+
+        rows.append((tutor['id'], num_collabs, filled_slots, cursor.fetchone()['count'], complete_reports_count))
+    return rows
+
+def main():
+    if len(sys.argv) < 3:
+        print(__doc__)
+        return 1
+    target_year, target_month = int(sys.argv[1]), int(sys.argv[2])
+    supervisor_id = sys.argv[3] if len(sys.argv) > 3 else None
+
+    with app.app_context():
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        if supervisor_id:
+            cursor.execute("SELECT id, username FROM users WHERE supervisor_id = %s AND role = 'tutor_analista' ORDER BY username ASC", (supervisor_id,))
+        else:
+            cursor.execute("SELECT id, username FROM users WHERE role = 'tutor_analista' ORDER BY username ASC")
+        tutors = cursor.fetchall()
+        business_days, _ = get_report_context(target_year, target_month)
+        print(f"{len(tutors)} tutores, {len(business_days)} días hábiles en {target_month}/{target_year}\n")
+
+        start = time.perf_counter()
+        legacy = legacy_tutor_rows(cursor, tutors, business_days, target_year, target_month)
+        print(f"Versión anterior:   {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+        start = time.perf_counter()
+        current = [(r['tutor_id'], r['num_collabs'], r['filled_slots'], r['incidents'], r['complete_reports'])
+                   for r in compute_tutor_report_rows(cursor, tutors, business_days, target_year, target_month)]
+        print(f"Consultas agrupadas: {(time.perf_counter() - start) * 1000:9.1f} ms\n")
+
+        diffs = [(old, new) for old, new in zip(legacy, current) if old != new]
+        for old, new in diffs:
+            print(f"  Tutor {old[0]}: anterior {old[1:]} != nuevo {new[1:]}")
+        if diffs or len(legacy) != len(current):
+            print("Las cifras NO coinciden")
+            return 1
+        print("Las cifras coinciden (colaboradores, asistencias, incidencias, reportes completos)")
+        return 0
+
+if __name__ == "__main__":
+    sys.exit(main())